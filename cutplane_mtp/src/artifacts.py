@@ -0,0 +1,125 @@
+###############################################################################
+##                                                                           ##
+## This code was written and is being maintained by Matias Villagra,         ##
+## PhD Student in Operations Research @ Columbia, supervised by              ##
+## Daniel Bienstock.                                                         ##
+##                                                                           ##
+## For code readability, we make references to equations in:                 ##
+## [1] D. Bienstock, and M. Villagra, Accurate Linear Cutting-Plane          ##
+## Relaxations for ACOPF, arXiv:2312.04251v2, 2024                           ##
+##                                                                           ##
+## Please report any bugs or issues to: mjv2153@columbia.edu                 ##
+##                                                                           ##
+## Jul 2024                                                                  ##
+###############################################################################
+
+# Writes the files produced during a round (summary lines, cut files, .lp
+# dumps) on a background thread, so that the solver does not wait for them.
+# Tasks run in the order they are submitted and must only use data that is
+# not modified afterwards, i.e., snapshots taken by the caller. The queue is
+# bounded: when it is full, submitting waits for the writer
+
+import atexit
+import queue
+import threading
+from gurobipy import Env
+
+
+# Appends a line to a text file, e.g., summary_ws.log
+
+def appendfile(filename,text):
+
+    with open(filename, "a+") as thefile:
+        thefile.write(text)
+
+
+class ArtifactWriter:
+
+    # With 'maxsize' 0 tasks are run right away, by the caller
+
+    def __init__(self, maxsize = 4):
+        self.maxsize = maxsize
+        self.errors  = []
+        self.env     = None
+        # Held while the environment of the model snapshots is in use
+        self.envlock = threading.Lock()
+
+        if maxsize > 0:
+            self.queue  = queue.Queue(maxsize = maxsize)
+            self.thread = threading.Thread(target = self.work, daemon = True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def work(self):
+
+        while True:
+            task = self.queue.get()
+            try:
+                if task is None:
+                    return
+                fn, args = task
+                fn(*args)
+            except BaseException as e:
+                # Raised by 'flush'
+                self.errors.append(e)
+            finally:
+                self.queue.task_done()
+
+    def submit(self, fn, *args):
+
+        if self.maxsize > 0:
+            self.queue.put((fn, args))
+        else:
+            fn(*args)
+
+    # Waits for all the submitted tasks; re-raises the first failure
+
+    def flush(self):
+
+        if self.maxsize > 0:
+            self.queue.join()
+
+        if self.errors:
+            error, self.errors = self.errors[0], []
+            raise error
+
+    def close(self):
+
+        if self.maxsize > 0 and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+        if self.env is not None:
+            self.env.dispose()
+            self.env = None
+
+    # Copy of a model that can be written while the model is solved. Copies
+    # live in their own environment, since an environment should not be
+    # used by two threads at once
+
+    def snapshotmodel(self, themodel):
+
+        themodel.update()
+
+        with self.envlock:
+            if self.env is None:
+                self.env = Env(empty = True)
+                self.env.setParam('OutputFlag', 0)
+                self.env.start()
+            copy           = themodel.copy(env = self.env)
+            copy.ModelName = themodel.ModelName
+            copy.update()
+
+        return copy
+
+    def writemodel(self, copy, filename):
+
+        with self.envlock:
+            copy.write(filename)
+            copy.dispose()
+
+    # Writes a snapshot of a model to 'filename' in the background
+
+    def submitmodel(self, themodel, filename):
+
+        self.submit(self.writemodel, self.snapshotmodel(themodel), filename)
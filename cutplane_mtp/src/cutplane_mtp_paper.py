@@ -17,8 +17,13 @@ import sys
 from log import danoLogger
 from gurobipy import *
 import numpy as np
+import scipy.sparse as sp
 from myutils import *
 import reader
+import modelcache
+from cutpool import CutPool
+import separation
+import artifacts
 import time
 import math
 from cuts_mtp_paper import *
@@ -29,43 +34,188 @@ import platform
 
 def gocutplane(log, all_data):
 
-  #################### LOADING CASE PARAMETERS ################################
-  
-  formulation_start = time.time()
-  themodel          = Model("Cutplane")
-  buses             = all_data['buses']
-  numbuses          = all_data['numbuses']
-  branches          = all_data['branches']
-  numbranches       = all_data['numbranches']
-  gens              = all_data['gens']
-  IDtoCountmap      = all_data['IDtoCountmap']
-  FeasibilityTol    = all_data['FeasibilityTol']
-  threshold         = all_data['threshold']
-  T                 = all_data['T']
-  casename          = all_data['casename']
-  casetype          = all_data['casetype']
-  loadsfilename     = all_data['loadsfilename']
-  rampfilename      = all_data['rampfilename']
+  cutplane_readdata(log,all_data)
+
+  if not cutplane_setup(log,all_data):
+    return None
+
+  themodel = all_data['themodel']
+
+  ########################## CUTPLANE MAIN LOOP ###############################
+
+  all_data['round']                  = 1
+  all_data['runtime']                = time.time() - all_data['T0']
+  all_data['round_time']             = time.time()
+  all_data['cumulative_solver_time'] = 0
+  all_data['ftol_counter']           = 0
+  oldobj                             = 1
+  gap                                = 1e20
+
   
+  while ((all_data['round'] <= all_data['max_rounds']) and 
+         (all_data['runtime'] <= all_data['max_time']) and 
+         (all_data['ftol_counter'] <= all_data['ftol_iterates'])):
+    
+      
+    ############################ SOLVING MODEL ################################
+
+    cutplane_optimize(log,all_data)
+
+    ########################### STORING SOLUTION ##############################
+
+    log.joint(' Storing current solution ...\n')
+
+    storesolution(log,all_data)
+        
+    log.joint(' done storing values\n')
+     
+    ########################## CHECK OBJ IMPROVEMENT ##########################
+
+    # Here we check the objective had a relative improvement (wrt the 
+    # previous objective) of at least 'ftol'. If this is not the case
+    # then we increase the 'ftol_counter', else we reset it to 0
+
+    if ((all_data['objval'] - oldobj)/oldobj) < all_data['ftol']:
+      all_data['ftol_counter'] += 1
+    else:
+      all_data['ftol_counter'] = 0
+
+    oldobj              = all_data['objval']
+    all_data['runtime'] = time.time() - all_data['T0']
+
+    ########################### ROUND STATISTICS ##############################
+
+    cutplane_stats(log,all_data)
+
+    ######################### SUMMARY EXPERIMENTS #############################
+
+    # Here we log some statistics of the current round
+
+    all_data['runtime'] = time.time() - all_data['T0']
+
+    log.joint("\n writing casename, opt stauts, obj and " +
+              "runtime to summary_ws.log\n")
+
+    numcutsadded = ( all_data['ID_jabr_cuts'] + all_data['ID_i2_cuts']
+                     + all_data['ID_limit_cuts'] )
+    numcuts      = ( all_data['num_jabr_cuts'] + all_data['num_i2_cuts']
+                     + all_data['num_limit_cuts'] )
+    
+    all_data['writer'].submit(artifacts.appendfile, "summary_ws.log",
+                              ' case ' + all_data['casename'] + ' opt_status ' 
+                              + str(all_data['optstatus']) + ' obj ' 
+                              + str(all_data['objval']) + ' runtime ' 
+                              + str(all_data['runtime']) + ' iterations ' 
+                              + str(all_data['round']) + ' rndcuts '
+                              + str((all_data['round']-1)) + ' numcutsadded '
+                              + str(numcutsadded) + ' numcuts '
+                              + str(numcuts) +  '\n')
+
+    ############################ GET DUALS #################################
+
+    # This function gets the dual variables associated to the active power 
+    # balance constraints
+
+    if all_data['getduals'] and (themodel.status != GRB.status.NUMERIC):
+      getduals(log,all_data)
+    
+    ############################ TERMINATION #################################
+
+    if (all_data['round'] >= all_data['max_rounds']):
+
+      writesol_and_lps(log,all_data)
+
+      summary_ws = open("summary_ws.log","a+") 
+      summary_ws.write(' rounds limit reached!\n\n')
+      summary_ws.close()
+      log.joint(' rounds limit reached!\n')
+      log.joint(' bye\n')
+      return 0
+          
+    if all_data['runtime'] > all_data['max_time']:
+
+      writesol_and_lps(log,all_data)
+
+      summary_ws = open("summary_ws.log","a+")
+      summary_ws.write(' time limit reached!\n\n')
+      summary_ws.close()
+      log.joint(' time limit reached!\n')
+      log.joint(' bye\n')
+      return 0
+
+    if (all_data['ftol_counter'] > all_data['ftol_iterates']):
+
+      writesol_and_lps(log,all_data)
+     
+      summary_ws = open("summary_ws.log","a+") 
+      summary_ws.write(' poor consecutive obj improvement limit reached!\n\n')
+      summary_ws.close()
+      log.joint(' poor consecutive obj improvement limit reached\n')
+      log.joint(' bye\n')
+      return 0
+
+    ############################### CUTS ######################################
+
+    # Cut computations and management
+    cutplane_cuts(log,all_data)
+
+    # The model would not change, so solving it again is pointless
+    if all_data['NO_cuts_added']:
+
+      writesol_and_lps(log,all_data)
+
+      summary_ws = open("summary_ws.log","a+") 
+      summary_ws.write(' no more cuts to add!\n\n')
+      summary_ws.close()
+      log.joint(' no more cuts to add\n')
+      log.joint(' bye\n')
+      return 0
+
+    # Cut statistics
+    cutplane_cutstats(log,all_data)
+    
+    themodel.update()
+
+    log.joint(' model updated\n')
+    log.joint('\n')
+
+    ############################### WRITE CUTS ################################
+
+    # This function writes all the current cuts to a .txt file
+    if all_data['writecuts']:
+      write_cuts(log,all_data)
+
+    ############################### WRITE LPS #################################
+    
+    # If this parameter is turned on then we write to a .lp file our 
+    # current relaxation
+
+    if all_data['writelps']:
+      name = 'post_cuts' + '_' + str(all_data['round']) + '.lp'
+      namemodel(log,all_data)
+      all_data['writer'].submitmodel(themodel,name)
+      log.joint(' model with new cuts queued for writing to .lp file\n')
+
+        
+    ###########################################################################
+                                              
+    all_data['round']      += 1
+    all_data['round_time']  = time.time()
+
+
+# Reads the multi-period loads and ramping rates, and the AC solution if
+# 'ampl_sol' is on
+
+def cutplane_readdata(log,all_data):
+
+  loadsfilename = all_data['loadsfilename']
+  rampfilename  = all_data['rampfilename']
+
   ############################ LOAD SOLUTION ##################################
 
   if all_data['ampl_sol']:
     getsol_ampl_mtp(log,all_data)
 
-  ################################ VARIABLES ##################################
-
-  cvar    = {}
-  svar    = {}
-  Pvar_f  = {}
-  Qvar_f  = {}
-  Pvar_t  = {}
-  Qvar_t  = {}
-  Pinjvar = {}
-  Qinjvar = {}
-  GenPvar = {}
-  GenQvar = {}
-  GenTvar = {}
-
   # Loading file with multi-period loads
   log.joint('Name of mtp file ' + loadsfilename + '\n')
   try:
@@ -90,8 +240,287 @@ def gocutplane(log, all_data):
     log.joint(" File with ramping rates could not be found in '../data/ramprates/'")
     log.joint(" Please provide it\n")
     exit(0)
- 
+
+
+# Builds the relaxation, initializes the data structures for cuts, sets
+# the solver parameters and adds the precomputed cuts. Returns False if
+# the run ends here, i.e., after fixing or writing an AC solution
+
+def cutplane_setup(log,all_data):
+
+  #################### LOADING CASE PARAMETERS ################################
+  
+  formulation_start = time.time()
+  themodel          = Model("Cutplane")
+  T                 = all_data['T']
+  
+  all_data['themodel'] = themodel
+
+  ################## VARIABLES, OBJECTIVE AND CORE CONSTRAINTS ################
+
+  # By default the model is built one variable and one constraint at a
+  # time. If 'matrix_formulation' is turned on, the same model is built
+  # with a handful of calls to the matrix API of gurobipy
+
+  # If 'modelcache' is set, a model formulated on the same inputs by a
+  # previous run is loaded from the cache instead. Only the matrix 
+  # formulation is cached
+  cachekey = None
+  cached   = None
+
+  if all_data['modelcache']:
+    if all_data['matrix_formulation'] and not all_data['loss_inequalities']:
+      cachekey = modelcache.cachekey(log,all_data)
+      cached   = modelcache.loadmodel(log,all_data,cachekey)
+    else:
+      log.joint(' modelcache requires matrix_formulation and no loss' 
+                + ' inequalities, ignoring it\n')
+
+  if cached:
+    constrcount = formulation_cached(log,all_data,cached)
+  elif all_data['matrix_formulation']:
+    constrcount = formulation_matrix(log,all_data)
+  else:
+    constrcount = formulation_loops(log,all_data)
+
+  # The cached model already has the constraints below
+  if cached is None:
+
+    # Definition i2 variables
+    if all_data['i2']:
+      constrcount += i2_def(log,all_data)
+
+    # Active power loss-inequalities
+    # Refer to equation (11) in [1]
+    if all_data['loss_inequalities']:    
+      constrcount += loss_inequalities(log,all_data)
+
+    # Jabr inequalities
+    # Refer to equation (1k) in [1]
+    if all_data['jabr_inequalities']:
+      constrcount += jabr_inequalities(log,all_data)
+
+    # i2 inequalities
+    # Refer to equation (1k) in [1]
+    if all_data['i2_inequalities']:
+      constrcount += i2_inequalities(log,all_data)
+
+    # Limit constraints
+    # Refer to equation (1k) in [1]
+    if all_data['limit_inequalities']:
+      constrcount += limit_inequalities(log,all_data)
+  
+  log.joint('  %d constraints added\n'%constrcount)
+    
+  themodel.update()
+
+  # Names are needed in the cache, so that later runs can write .lp files
+  if cachekey and cached is None:
+    namemodel(log,all_data)
+    modelcache.savemodel(log,all_data,cachekey)
+
+  # The epigraph is added after caching, so the cached model is the same
+  # with and without 'linear_objective'
+  if all_data['linear_objective']:
+    objective_epigraph(log,all_data)
+
+  formulation_end = time.time()
+
+  all_data['formulation_time'] = formulation_end - formulation_start
+  all_data['numvars']          = themodel.NumVars
+  all_data['numconstrs']       = themodel.NumConstrs
+  
+  log.joint(' Formulation time: %g\n' % all_data['formulation_time'])
+  log.joint(' numvars ' + str(all_data['numvars']) + ' numconstrs ' + str(all_data['numconstrs']) + '\n')
   
+  # Write model to a .lp file
+  if all_data['writelps']:
+    log.joint(' writing to lpfile ' + all_data['lpfilename'] + '\n')  
+    namemodel(log,all_data)
+    themodel.write(all_data['lpfilename'])
+
+  
+  ###################### INIT DATA STRUCTURES FOR CUTS ########################
+
+  # The cut pool collects information of all of the cuts computed
+  # throughout our cutting-plane procedure that are still in the model
+
+  # In 'hash' mode, normals are rounded to a grid fine enough that normals in
+  # the same cell are parallel, see 'parallel_hash'
+  if all_data['parallel_check_mode'] == 'hash':
+    all_data['cutpool'] = CutPool(hashstep = (all_data['threshold_dotprod'] / 2)**0.5)
+  else:
+    all_data['cutpool'] = CutPool()
+
+  # Cuts found in a round, added to the model at once by 'flush_cuts'
+  all_data['cutqueue'] = []
+
+  # Cuts added so far for every time-period and branch, and the ones whose
+  # cuts were replaced by the exact inequality, see 'hybrid_cones'
+  if all_data['hybrid']:
+    nbranch = len(all_data['branches'])
+    all_data['hybridcounts'] = {family: np.zeros((T,nbranch), dtype = int)
+                                for family in (JABR, I2)}
+    all_data['hybridcones']  = {family: np.zeros((T,nbranch), dtype = bool)
+                                for family in (JABR, I2)}
+    all_data['hybrid_replaced'] = {JABR: 0, I2: 0}
+
+  # Solve times, iterations and rows added of every method, for 
+  # 'solve_strategy adaptive'
+  all_data['methodhistory']        = {}
+  all_data['methodchoice']         = None
+  all_data['cutchanges_lastsolve'] = 0
+
+  # Files written in each round are written while the next one is solved
+  all_data['writer'] = artifacts.ArtifactWriter(all_data['artifact_queue'])
+
+  ######################## FIXING/WRITING AN AC SOLUTION ######################
+
+  # The following functions use ac AC solution previously loaded via 'ampl_sol'
+  # fixflows: This function fixes the flows (active and reactive power) up to 
+  # some given tolerance using an AC solution 
+  # fixcs: fixes c and s variables using an AC solution 
+  # writeACsol: writes to a .lp file an AC solution up to some given
+  # tolerance
+
+  if all_data['fixflows']:
+    fixflows(log,all_data)
+    if all_data['fixcs'] == 0:
+      return False
+
+  if all_data['fixcs']:
+    fixcs(log,all_data)
+    return False
+
+  if all_data['writeACsol']:
+    writeACsol(log,all_data)
+    return False
+
+  ########################### SOLVER PARAMETERS ###############################
+
+  # By default we run Gurobi with the barrier algorithm and crossover disabled
+
+  themodel.Params.Method    = all_data['solver_method']
+  themodel.Params.Crossover = all_data['crossover'] 
+  themodel.Params.LogFile   = all_data['mylogfile']
+  themodel.Params.TimeLimit = all_data['max_time']
+
+  if all_data['solver_method'] == 2:
+    themodel.Params.BarHomogeneous = 1
+    themodel.Params.BarConvTol     = all_data['barconvtol']
+    themodel.Params.FeasibilityTol = all_data['feastol']
+    themodel.Params.OptimalityTol  = all_data['opttol']
+    
+  themodel.Params.NumericFocus = 1
+  themodel.Params.OutPutFlag = 1
+  
+  ######################### READING AND LOADING CUTS ##########################
+
+  # This procedure adds previously computed cuts to the current optimization
+  # instance, or keeps them aside with 'lazycuts', see 'load_cuts'
+
+  if all_data['addcuts']:
+
+    t0_cuts = time.time()
+
+    load_cuts(log,all_data)
+
+    themodel.update()
+
+    t1_cuts = time.time()
+
+    all_data['addcuts_time'] = t1_cuts - t0_cuts
+
+    log.joint(' pre-computed cuts added and model updated\n')
+
+    log.joint(' reading and loading cuts time = '
+              + str(all_data['addcuts_time']) + '\n')
+
+    if all_data['writelps']:
+      namemodel(log,all_data)
+      themodel.write(all_data['casename']+'_precomputed_cuts.lp')
+      log.joint(' model with precomputed written to .lp file\n\n')
+
+  return True
+
+
+###############################################################################
+
+# Other Functions
+
+# Writes down solutions, retrieves duals variables of active power balance 
+# constraints, and writes to an .lp file our last linearly-constrained 
+# relaxation
+
+def writesol_and_lps(log,all_data):
+
+  themodel = all_data['themodel']
+  casename = all_data['casename']
+  casetype = all_data['casetype']
+  T        = all_data['T']
+
+  # Files of the previous rounds still being written are finished first
+  all_data['writer'].flush()
+
+  if all_data['tolerance_schedule']:
+    cutplane_polish(log,all_data)
+
+  # We write down our current solution to two files: the first
+  # function creates a readable .txt where variables are sorted 
+  # by type and index (i.e., voltages, power flows, generation); 
+  # while the second function creates a .sol file where variables
+  # are written (in arbitrary order) in the format: 
+  # 'variable name' = 'variable value'
+  if all_data['writesol']:
+    writesol(log,all_data)
+    writesol_allvars(log,all_data)
+
+  # We print the duals associated to the active power balance
+  # constraints and we write them down to a table
+  if all_data['getduals'] and (themodel.status != GRB.status.NUMERIC):
+    print_duals(log,all_data)
+    print_duals_table(log,all_data)
+  
+  # If this parameter is turned on, then we write to an .lp file
+  # our last linearly-constrained relaxation
+  if all_data['writelastLP']:
+    log.joint(' writing down last lp...\n')        
+    namemodel(log,all_data)
+    themodel.write(casename + '_' + str(T) + '_' + casetype + "_last.lp")
+
+  return 0
+
+
+# Builds variables, objective and the flow-definition, balance, injection
+# and ramping constraints one variable and one constraint at a time
+
+def formulation_loops(log,all_data):
+
+  themodel     = all_data['themodel']
+  buses        = all_data['buses']
+  branches     = all_data['branches']
+  gens         = all_data['gens']
+  IDtoCountmap = all_data['IDtoCountmap']
+  network      = all_data['network']
+  T            = all_data['T']
+  Pd           = all_data['Pd']
+  rampru       = all_data['rampru']
+  ramprd       = all_data['ramprd']
+
+  ################################ VARIABLES ##################################
+
+  cvar    = {}
+  svar    = {}
+  Pvar_f  = {}
+  Qvar_f  = {}
+  Pvar_t  = {}
+  Qvar_t  = {}
+  Pinjvar = {}
+  Qinjvar = {}
+  GenPvar = {}
+  GenQvar = {}
+  GenTvar = {}
+
   for k in range(T):
     cvar[k]    = {}
     svar[k]    = {}
@@ -170,52 +599,17 @@ def gocutplane(log, all_data):
                                           + str(gen.nodeID) + "_" + str(k))
         varcount += 1
 
-  # Branch-related variables
+  # Branch-related variables. Branch parameters are read from the arrays of
+  # all_data['network'], by branch index
+  csbounds = computecsbounds(log,all_data).tolist()
+
   for branch in branches.values():
     branchcount = branch.count
     f           = branch.f
     t           = branch.t
     count_of_f  = IDtoCountmap[f]
     count_of_t  = IDtoCountmap[t]
-    maxprod     = buses[count_of_f].Vmax*buses[count_of_t].Vmax
-    minprod     = buses[count_of_f].Vmin*buses[count_of_t].Vmin
-
-    ubound      = maxprod
-    lbound      = -maxprod
-    maxanglerad = branch.maxangle_rad
-    minanglerad = branch.minangle_rad
-
-    # Bounds for c variables                                                                                                                                          
-    if maxanglerad <= 0.5*math.pi:
-      # In this case minangle <= 0                                                                                                                   
-      if minanglerad >= -0.5*math.pi:
-        lbound = minprod*min(math.cos(maxanglerad), math.cos(minanglerad))
-      elif minanglerad >= -math.pi:
-        lbound = maxprod*math.cos(minangle_rad)  # Which is negative                                                                               
-      elif minanglerad >= -1.5*math.pi:
-        lbound = -maxprod
-      else:
-        lbound = -maxprod
-
-    elif maxanglerad <= math.pi:
-      if minanglerad >= -0.5*math.pi:
-        lbound = maxprod*math.cos(maxanglerad)
-      elif minanglerad >= -math.pi:
-        lbound = maxprod*min(math.cos(maxanglerad), math.cos(minanglerad))
-      elif minanglerad >= -1.5*math.pi:
-        lbound = -maxprod
-      else:
-        lbound = -maxprod
-
-    elif maxanglerad <= 1.5*math.pi:
-      lbound = -maxprod    
-
-    elif maxanglerad <= 2*math.pi:
-      lbound = -maxprod
-
-    else:
-      ubound = maxprod
-      lbound = -maxprod
+    clbound, cubound, slbound, subound = csbounds[branch.index]
 
     for k in range(T):
       # cvar[k][branch]: represents the linearization of the product 
@@ -223,74 +617,34 @@ def gocutplane(log, all_data):
       # and 'j' denotes the 'to' bus, for branch 'branch' in period 'k', 
       # c.f. equation (3) in [1].
 
-      cvar[k][branch] = themodel.addVar(obj = 0.0, lb = lbound, ub = ubound, 
+      cvar[k][branch] = themodel.addVar(obj = 0.0, lb = clbound, ub = cubound, 
                                         name = "c_" + str(branchcount) + "_" 
                                         + str(f) + "_" + str(t) + "_" + str(k))
       varcount += 1
       
-    # s variables
-    if maxanglerad <= math.pi/2:
-      ubound = maxprod*math.sin(maxanglerad)
-
-      if  minanglerad >= -0.5*math.pi:
-        lbound = maxprod*math.sin(minanglerad)
-      elif  minanglerad >= -math.pi:
-        lbound = -maxprod
-      elif  minanglerad >= -1.5*math.pi:
-        ubound = maxprod*max( math.sin(maxanglerad), math.sin(minanglerad))
-        lbound = -maxprod
-      else:
-        ubound = maxprod
-        lbound = -maxprod
-
-    elif maxanglerad <= math.pi:
-      ubound = maxprod
-
-      if minanglerad >= -0.5*math.pi:
-        lbound = maxprod*math.sin(minanglerad)
-      elif minanglerad >= -math.pi:
-        lbound = -maxprod
-      elif minanglerad >= -1.5*math.pi:
-        lbound = -maxprod
-      else:
-        lbound = -maxprod
-
-    elif maxanglerad <= 1.5*math.pi:
-      ubound = maxprod
-
-      if minanglerad >= -0.5*math.pi:
-        lbound = maxprod*min(math.sin(maxanglerad), math.sin(minanglerad))
-      elif minanglerad >= -math.pi:
-        lbound = -maxprod
-      elif minanglerad >= -1.5*math.pi:
-        lbound = -maxprod
-      else:
-        lbound = -maxprod
-    else:
-      ubound = maxprod
-      lbound = -maxprod
-
     for k in range(T):
       # svar[k][branch]: represents the linearization of the product 
       # v_i * v_j * sin(theta_i - theta_j), where 'i' denotes the 'from' bus
       # and 'j' denotes the 'to' bus, for branch 'branch' in period 'k', 
       # c.f. equation (3) in [1].
 
-      svar[k][branch] = themodel.addVar(obj = 0.0, lb = lbound, ub = ubound, 
+      svar[k][branch] = themodel.addVar(obj = 0.0, lb = slbound, ub = subound, 
                                         name = "s_" + str(branchcount) + "_" 
                                         + str(f) + "_" + str(t) + "_" + str(k))
 
       varcount += 1
     
   # Flow variables
+  limit = network.limit.tolist()
+
   for branch in branches.values():
     f = branch.f
     t = branch.t
     count_of_f = IDtoCountmap[f]
     count_of_t = IDtoCountmap[t]
 
-    ubound = branch.limit 
-    lbound = -branch.limit
+    ubound = limit[branch.index]
+    lbound = -limit[branch.index]
 
     for k in range(T):
       # Pvar_f[k][branch]: given a branch 'branch' with 'from' bus 'f' and 'to'
@@ -330,6 +684,9 @@ def gocutplane(log, all_data):
     for k in range(T):
       i2var_f[k] = {}
       
+    ratios = network.ratio.tolist()
+    ys     = network.y.tolist()
+    bcs    = network.bc.tolist()
 
     for branch in branches.values():
       branchcount = branch.count
@@ -337,11 +694,11 @@ def gocutplane(log, all_data):
       t           = branch.t
       count_of_f  = IDtoCountmap[f]
       count_of_t  = IDtoCountmap[t]
-      ratio       = branch.ratio
-      y           = branch.y
+      ratio       = ratios[branch.index]
+      y           = ys[branch.index]
       g           = y.real
       b           = y.imag
-      bshunt      = branch.bc
+      bshunt      = bcs[branch.index]
 
       alpha            = ( g*g + b*b + bshunt * (b + (bshunt/4)) ) / (ratio**4)
       alphadic[branch] = alpha
@@ -352,7 +709,7 @@ def gocutplane(log, all_data):
 
       if alpha < all_data['rho_threshold']:
         bus_f        = buses[count_of_f]
-        upperbound_f = branch.limit**2 / (bus_f.Vmin * bus_f.Vmin)
+        upperbound_f = limit[branch.index]**2 / (bus_f.Vmin * bus_f.Vmin)
         
         for k in range(T):
           # i2var_f[k][branch]: represents the current squared at branch
@@ -378,6 +735,9 @@ def gocutplane(log, all_data):
 
   if all_data['i2']:
     all_data['i2var_f']   = i2var_f
+  all_data['GenQvar']     = GenQvar
+  all_data['Pinjvar']     = Pinjvar
+  all_data['Qinjvar']     = Qinjvar
 
   ############################## OBJECTIVE ####################################
 
@@ -418,7 +778,7 @@ def gocutplane(log, all_data):
   themodel.setObjective(constexpr + lincostexpr + qcostexpr)
   
   themodel.update()
-  
+
   ############################# CONSTRAINTS ###################################
 
   log.joint(' Creating the constraints...\n')
@@ -429,9 +789,19 @@ def gocutplane(log, all_data):
   # Definition of Flow variables
   log.joint('  Active power flow variables definition\n')
 
+  Gff = network.Gff.tolist()
+  Gft = network.Gft.tolist()
+  Bft = network.Bft.tolist()
+  Gtt = network.Gtt.tolist()
+  Gtf = network.Gtf.tolist()
+  Btf = network.Btf.tolist()
+  Bff = network.Bff.tolist()
+  Btt = network.Btt.tolist()
+
   for branch in branches.values():
     f = branch.f
     t = branch.t
+    j = branch.index
     count_of_f = IDtoCountmap[f]
     count_of_t = IDtoCountmap[t]
 
@@ -441,9 +811,9 @@ def gocutplane(log, all_data):
       # the time-period
       constrname = "Pdef_"+str(branch.count)+"_"+str(f)+"_"+str(t)+"_"+str(k)
       expr = LinExpr()
-      expr += branch.Gff*cvar[k][buses[count_of_f]]
-      expr += branch.Gft*cvar[k][branch]
-      expr += branch.Bft*svar[k][branch]
+      expr += Gff[j]*cvar[k][buses[count_of_f]]
+      expr += Gft[j]*cvar[k][branch]
+      expr += Bft[j]*svar[k][branch]
     
       themodel.addConstr(expr == Pvar_f[k][branch], name = constrname)
 
@@ -453,9 +823,9 @@ def gocutplane(log, all_data):
       # where 'k' denotes the time-period
       constrname = "Pdef_"+str(branch.count)+"_"+str(t)+"_"+str(f)+"_"+str(k)
       expr = LinExpr()
-      expr += branch.Gtt*cvar[k][buses[count_of_t]]
-      expr += branch.Gtf*cvar[k][branch]
-      expr += -branch.Btf*svar[k][branch]
+      expr += Gtt[j]*cvar[k][buses[count_of_t]]
+      expr += Gtf[j]*cvar[k][branch]
+      expr += -Btf[j]*svar[k][branch]
 
       themodel.addConstr(expr == Pvar_t[k][branch], name = constrname)
     
@@ -470,6 +840,7 @@ def gocutplane(log, all_data):
   for branch in branches.values():
     f = branch.f
     t = branch.t
+    j = branch.index
     count_of_f = IDtoCountmap[f]
     count_of_t = IDtoCountmap[t]
 
@@ -479,9 +850,9 @@ def gocutplane(log, all_data):
       # the time-period
       constrname = "Qdef_"+str(branch.count)+"_"+str(f)+"_"+str(t)+"_"+str(k)
       expr = LinExpr()
-      expr += -branch.Bff*cvar[k][buses[count_of_f]]
-      expr += -branch.Bft*cvar[k][branch]
-      expr += +branch.Gft*svar[k][branch]
+      expr += -Bff[j]*cvar[k][buses[count_of_f]]
+      expr += -Bft[j]*cvar[k][branch]
+      expr += +Gft[j]*svar[k][branch]
 
       themodel.addConstr(expr == Qvar_f[k][branch], name = constrname)
 
@@ -491,9 +862,9 @@ def gocutplane(log, all_data):
       # where 'k' denotes the time-period
       constrname = "Qdef_"+str(branch.count)+"_"+str(t)+"_"+str(f)+"_"+str(k)
       expr = LinExpr()
-      expr += -branch.Btt*cvar[k][buses[count_of_t]]
-      expr += -branch.Btf*cvar[k][branch]
-      expr += -branch.Gtf*svar[k][branch]
+      expr += -Btt[j]*cvar[k][buses[count_of_t]]
+      expr += -Btf[j]*cvar[k][branch]
+      expr += -Gtf[j]*svar[k][branch]
 
       themodel.addConstr(expr == Qvar_t[k][branch], name = constrname)
 
@@ -503,7 +874,8 @@ def gocutplane(log, all_data):
 
   # Flow balance constraints
   log.joint('  active power injection constraints\n')
-  count = 0
+  count   = 0
+  PBaldef = {k: {} for k in range(T)}
 
   for bus in buses.values():
     for k in range(T):
@@ -519,11 +891,13 @@ def gocutplane(log, all_data):
                                or ( len(bus.tobranchids) != 0 ) ) ):
         expr += bus.Gs*cvar[k][bus]
 
-      themodel.addConstr(expr == Pinjvar[k][bus], name = constrname)
+      PBaldef[k][bus] = themodel.addConstr(expr == Pinjvar[k][bus], name = constrname)
 
       constrcount += 1
       count       += 1
   
+  all_data['PBaldef'] = PBaldef
+
   log.joint('   %d active power injection constraints added\n'%count)
   log.joint('  reactive power injection constraints\n')
   count = 0
@@ -613,392 +987,577 @@ def gocutplane(log, all_data):
       themodel.addConstr(GenPvar[k+1][gen] - GenPvar[k][gen] - rpu * abs_gen[k][gen] <= 0, name = constrname_rup)
       themodel.addConstr(GenPvar[k][gen] - rpd * abs_gen[k][gen] - GenPvar[k+1][gen] <= 0, name = constrname_rdown)
 
-      themodel.addConstr(GenPvar[k][gen] - abs_gen[k][gen] <= 0, name = constrname_rup + '_1')
-      themodel.addConstr(- GenPvar[k][gen] - abs_gen[k][gen] <= 0, name = constrname_rup + '_2')      
+      themodel.addConstr(GenPvar[k][gen] - abs_gen[k][gen] <= 0, name = constrname_rup + '_1')
+      themodel.addConstr(- GenPvar[k][gen] - abs_gen[k][gen] <= 0, name = constrname_rup + '_2')      
+
+      count += 4
+
+  constrcount += count
+  log.joint('   %d ramping constraints added\n'%count)
+  all_data['abs_gen'] = abs_gen
+
+  return constrcount
+
+
+# Builds the same variables, objective and flow-definition, balance, injection
+# and ramping constraints as 'formulation_loops', but every variable block is
+# created with one addMVar call and every constraint family is put together as
+# a sparse matrix over all time-periods and added with one addMConstr call.
+# Variables are laid out block by block, period-major, i.e., the variable of
+# element 'i' in period 'k' of block 'block' is column
+# layout[block][0] + k * n + i where n is the number of elements of the block
+
+def formulation_matrix(log,all_data):
+
+  themodel     = all_data['themodel']
+  buses        = all_data['buses']
+  branches     = all_data['branches']
+  gens         = all_data['gens']
+  IDtoCountmap = all_data['IDtoCountmap']
+  T            = all_data['T']
+  Pd           = all_data['Pd']
+  rampru       = all_data['rampru']
+  ramprd       = all_data['ramprd']
+  network      = all_data['network']
+
+  buslist      = list(buses.values())
+  branchlist   = list(branches.values())
+  genlist      = list(gens.values())
+  nbus         = len(buslist)
+  nbranch      = len(branchlist)
+  ngen         = len(genlist)
+
+  # Position of the 'from' and 'to' bus of every branch, and of the bus of 
+  # every generator, as built by the reader
+  fidx   = network.fidx
+  tidx   = network.tidx
+  genbus = all_data['gen_busidx']
+
+  log.joint(' %d Time periods\n' %T)      
+  log.joint(' Creating variables (matrix formulation)...\n')
+
+  ############################## BOUNDS #######################################
+
+  Vmax       = network.Vmax
+  Vmin       = network.Vmin
+  cbus_lb    = np.tile(Vmin * Vmin, (T,1))
+  cbus_ub    = np.tile(Vmax * Vmax, (T,1))
+
+  # Loads are taken after computing the injection bounds since isolated 
+  # buses get their loads zeroed
+  Pinj_ub, Pinj_lb, Qinj_ub, Qinj_lb, Pdarray = computebalbounds_arrays(log,
+                                                                        all_data,
+                                                                        buslist)
+  Qdarray    = all_data['busQd']
+  
+  status     = np.array([gen.status for gen in genlist], dtype = float)
+  GenP_lb    = np.tile(np.array([gen.Pmin for gen in genlist]) * status, (T,1))
+  GenP_ub    = np.tile(np.array([gen.Pmax for gen in genlist]) * status, (T,1))
+  GenQ_lb    = np.array([gen.Qmin for gen in genlist]) * status
+  GenQ_ub    = np.array([gen.Qmax for gen in genlist]) * status
+  refgen     = all_data['busnodetype'][genbus] == 3
+  GenQ_lb[refgen] = -GRB.INFINITY
+  GenQ_ub[refgen] = GRB.INFINITY
+  GenQ_lb    = np.tile(GenQ_lb, (T,1))
+  GenQ_ub    = np.tile(GenQ_ub, (T,1))
+
+  csbounds   = computecsbounds(log,all_data)
+  cbr_lb     = np.tile(csbounds[:,0], (T,1))
+  cbr_ub     = np.tile(csbounds[:,1], (T,1))
+  sbr_lb     = np.tile(csbounds[:,2], (T,1))
+  sbr_ub     = np.tile(csbounds[:,3], (T,1))
+
+  limit      = network.limit
+  flow_lb    = np.tile(-limit, (T,1))
+  flow_ub    = np.tile(limit, (T,1))
+
+  # Refer to section 4.5 in [1], variable i2 is only defined for branches 
+  # whose 'alpha' coeff in equation (18) in [1] is less than 'rho_threshold'
+  if all_data['i2']:
+    all_data['i2coeffs'] = network.i2coeffs()
+    alpha    = all_data['i2coeffs'][0]
+    all_data['alphadic'] = dict(zip(branchlist, alpha.tolist()))
+    i2idx    = np.flatnonzero(alpha < all_data['rho_threshold'])
+    goodi2   = [branchlist[j] for j in i2idx]
+    ni2      = len(goodi2)
+    i2_lb    = np.zeros((T,ni2))
+    i2_ub    = np.tile(limit[i2idx]**2 / Vmin[network.fidx[i2idx]]**2, (T,1))
+  else:
+    i2idx    = np.zeros(0, dtype = int)
+    goodi2   = []
+    ni2      = 0
+    i2_lb    = i2_ub = np.zeros((T,0))
+
+  all_data['i2idx'] = i2idx
+
+  abs_lb     = np.zeros((T-1,ngen))
+  abs_ub     = np.full((T-1,ngen), GRB.INFINITY)
+
+  ############################# VARIABLES #####################################
+
+  varblocks = [('cbus', cbus_lb, cbus_ub), ('Pinj', Pinj_lb, Pinj_ub),
+               ('Qinj', Qinj_lb, Qinj_ub), ('GenP', GenP_lb, GenP_ub),
+               ('GenQ', GenQ_lb, GenQ_ub), ('cbr', cbr_lb, cbr_ub),
+               ('sbr', sbr_lb, sbr_ub), ('Pf', flow_lb, flow_ub),
+               ('Pt', flow_lb, flow_ub), ('Qf', flow_lb, flow_ub),
+               ('Qt', flow_lb, flow_ub), ('i2', i2_lb, i2_ub),
+               ('const', np.ones((1,1)), np.ones((1,1))),
+               ('abs_gen', abs_lb, abs_ub)]
+
+  layout   = {}
+  varlists = {}
+  varcount = 0
+
+  for block, lb, ub in varblocks:
+    layout[block]   = (varcount, lb.shape[1])
+    varlists[block] = themodel.addMVar(lb.size, lb = lb.ravel(), 
+                                       ub = ub.ravel()).tolist()
+    varcount       += lb.size
+
+  themodel.update()
+
+  busnames    = [str(bus.nodeID) for bus in buslist]
+  ftnames     = [str(branch.count) + "_" + str(branch.f) + "_" + str(branch.t)
+                 for branch in branchlist]
+  tfnames     = [str(branch.count) + "_" + str(branch.t) + "_" + str(branch.f)
+                 for branch in branchlist]
+  gennames    = [str(gen.count) + "_" + str(gen.nodeID) for gen in genlist]
+  i2names     = [str(branch.count) + "_" + str(branch.f) + "_" + str(branch.t)
+                 for branch in goodi2]
+
+  varnames = {
+    'cbus'    : lambda: ["c_" + n + "_" + n + "_" + str(k) for k in range(T) for n in busnames],
+    'Pinj'    : lambda: ["IP_" + n + "_" + str(k) for k in range(T) for n in busnames],
+    'Qinj'    : lambda: ["IQ_" + n + "_" + str(k) for k in range(T) for n in busnames],
+    'GenP'    : lambda: ["GP_" + n + "_" + str(k) for k in range(T) for n in gennames],
+    'GenQ'    : lambda: ["GQ_" + n + "_" + str(k) for k in range(T) for n in gennames],
+    'cbr'     : lambda: ["c_" + n + "_" + str(k) for k in range(T) for n in ftnames],
+    'sbr'     : lambda: ["s_" + n + "_" + str(k) for k in range(T) for n in ftnames],
+    'Pf'      : lambda: ["P_" + n + "_" + str(k) for k in range(T) for n in ftnames],
+    'Pt'      : lambda: ["P_" + n + "_" + str(k) for k in range(T) for n in tfnames],
+    'Qf'      : lambda: ["Q_" + n + "_" + str(k) for k in range(T) for n in ftnames],
+    'Qt'      : lambda: ["Q_" + n + "_" + str(k) for k in range(T) for n in tfnames],
+    'i2'      : lambda: ["i2_" + n + "_" + str(k) for k in range(T) for n in i2names],
+    'const'   : lambda: ["constant"],
+    'abs_gen' : lambda: ["abs_gen_" + str(gen.count) + "_" + str(k) for k in range(T-1)
+                 for gen in genlist]
+  }
+
+  for block in varlists.keys():
+    if len(varlists[block]):
+      namevars(all_data, varlists[block], varnames[block])
+
+  log.joint('   %d variables added\n' %varcount)
+
+  indexmaps(log,all_data,varlists,goodi2)
+  all_data['varlayout'] = layout
+
+  ############################## OBJECTIVE ####################################
+
+  # Refer to section 2.1 in [1]
+  log.joint(' Creating the objective...\n')
+
+  constobjval = 0
+  for gen in genlist:
+    if gen.status > 0:
+      constobjval += gen.costvector[gen.costdegree]
+
+  lincoeff  = np.array([gen.costvector[gen.costdegree-1] for gen in genlist])
+  quadcoeff = np.array([gen.costvector[0] if gen.costdegree == 2 else 0 
+                        for gen in genlist])
 
-      count += 4
-  
-  # Definition i2 variables
-  if all_data['i2']:
-    constrcount += i2_def(log,all_data)
-
-  # Active power loss-inequalities
-  # Refer to equation (11) in [1]
-  if all_data['loss_inequalities']:    
-    constrcount += loss_inequalities(log,all_data)
-
-  # Jabr inequalities
-  # Refer to equation (1k) in [1]
-  if all_data['jabr_inequalities']:
-    constrcount += jabr_inequalities(log,all_data)
-
-  # i2 inequalities
-  # Refer to equation (1k) in [1]
-  if all_data['i2_inequalities']:
-    constrcount += i2_inequalities(log,all_data)
-
-  # Limit constraints
-  # Refer to equation (1k) in [1]
-  if all_data['limit_inequalities']:
-    constrcount += limit_inequalities(log,all_data)
-  
-  log.joint('  %d constraints added\n'%constrcount)
-    
-  themodel.update()
+  objc      = np.zeros(varcount)
+  objc[layout['const'][0]] = T * constobjval
+  GenPcols  = blockcolumns(layout,'GenP',np.arange(T)[:,None],
+                           np.arange(ngen)[None,:]).ravel()
+  objc[GenPcols] = np.tile(lincoeff, T)
+  quadcols  = GenPcols[np.tile(quadcoeff, T) != 0]
+  objQ      = sp.csr_matrix((np.tile(quadcoeff, T)[np.tile(quadcoeff, T) != 0],
+                             (quadcols, quadcols)), shape = (varcount,varcount))
 
-  formulation_end = time.time()
+  themodel.setMObjective(objQ, objc, 0.0)
 
-  all_data['formulation_time'] = formulation_end - formulation_start
-  all_data['numvars']          = themodel.NumVars
-  all_data['numconstrs']       = themodel.NumConstrs
-  
-  log.joint(' Formulation time: %g\n' % all_data['formulation_time'])
-  log.joint(' numvars ' + str(all_data['numvars']) + ' numconstrs ' + str(all_data['numconstrs']) + '\n')
-  
-  # Write model to a .lp file
-  if all_data['writelps']:
-    log.joint(' writing to lpfile ' + all_data['lpfilename'] + '\n')  
-    themodel.write(all_data['lpfilename'])
+  log.joint('   %d terms in the objective\n' 
+            %(1 + T * ngen + len(quadcols)))
 
-  
-  ###################### INIT DATA STRUCTURES FOR CUTS ########################
+  themodel.update()
 
-  # These dictionaries will collect information of all of the cuts
-  # computed throughout our cutting-plane procedure
+  ############################# CONSTRAINTS ###################################
 
-  if all_data['jabrcuts']:
-    jabr_cuts_info = all_data['jabr_cuts_info']
-    for k in range(T):
-      jabr_cuts_info[k] = {}
-      for branch in branches.values():
-        jabr_cuts_info[k][branch] = {}
+  log.joint(' Creating the constraints...\n')
 
-  if all_data['i2cuts']:
-    i2_cuts_info = all_data['i2_cuts_info']
-    for k in range(T):
-      i2_cuts_info[k] = {}
-      for branch in branches.values():
-        i2_cuts_info[k][branch] = {}
+  constrcount = 0
 
-  if all_data['limitcuts']:
-    limit_cuts_info = all_data['limit_cuts_info']
-    for k in range(T):
-      limit_cuts_info[k] = {}
-      for branch in branches.values():
-        limit_cuts_info[k][branch] = {}
+  kk = np.repeat(np.arange(T), nbranch)
+  jj = np.tile(np.arange(nbranch), T)
+  rows = np.arange(T * nbranch)
+
+  Gff = network.Gff
+  Gft = network.Gft
+  Bff = network.Bff
+  Bft = network.Bft
+  Gtt = network.Gtt
+  Gtf = network.Gtf
+  Btt = network.Btt
+  Btf = network.Btf
+
+  cff  = blockcolumns(layout,'cbus',kk,fidx[jj])
+  ctt  = blockcolumns(layout,'cbus',kk,tidx[jj])
+  cft  = blockcolumns(layout,'cbr',kk,jj)
+  sft  = blockcolumns(layout,'sbr',kk,jj)
+  nrow = T * nbranch
+  ones = np.ones(nrow)
+
+  # Definition of Flow variables, refer to equations (6a)-(6d) in [1]
+  # Pft_k = Gff cff_k + Gft cft_k + Bft sft_k 
+  # Ptf_k = Gtt ctt_k + Gtf cft_k - Btf sft_k
+  log.joint('  Active power flow variables definition\n')
 
-  ######################## FIXING/WRITING AN AC SOLUTION ######################
+  A = sparsematrix([(rows, cff, Gff[jj]), (rows, cft, Gft[jj]), 
+                    (rows, sft, Bft[jj]), 
+                    (rows, blockcolumns(layout,'Pf',kk,jj), -ones),
+                    (nrow + rows, ctt, Gtt[jj]), (nrow + rows, cft, Gtf[jj]),
+                    (nrow + rows, sft, -Btf[jj]),
+                    (nrow + rows, blockcolumns(layout,'Pt',kk,jj), -ones)],
+                   2*nrow, varcount)
+  names = lambda: (["Pdef_" + ftnames[j] + "_" + str(k) for k in range(T) for j in range(nbranch)]
+           + ["Pdef_" + tfnames[j] + "_" + str(k) for k in range(T) for j in range(nbranch)])
+  constrcount += len(addmatrixconstrs(all_data, A, GRB.EQUAL, np.zeros(2*nrow), names))
+  log.joint('   %d active power flow definition constraints added\n'%(2*nrow))
+
+  # Qft_k = -Bff cff_k - Bft cft_k + Gft sft_k 
+  # Qtf_k = -Btt ctt_k - Btf cft_k - Gtf sft_k
+  log.joint('  reactive power flow variables definition\n')
 
-  # The following functions use ac AC solution previously loaded via 'ampl_sol'
-  # fixflows: This function fixes the flows (active and reactive power) up to 
-  # some given tolerance using an AC solution 
-  # fixcs: fixes c and s variables using an AC solution 
-  # writeACsol: writes to a .lp file an AC solution up to some given
-  # tolerance
+  A = sparsematrix([(rows, cff, -Bff[jj]), (rows, cft, -Bft[jj]), 
+                    (rows, sft, Gft[jj]), 
+                    (rows, blockcolumns(layout,'Qf',kk,jj), -ones),
+                    (nrow + rows, ctt, -Btt[jj]), (nrow + rows, cft, -Btf[jj]),
+                    (nrow + rows, sft, -Gtf[jj]),
+                    (nrow + rows, blockcolumns(layout,'Qt',kk,jj), -ones)],
+                   2*nrow, varcount)
+  names = lambda: (["Qdef_" + ftnames[j] + "_" + str(k) for k in range(T) for j in range(nbranch)]
+           + ["Qdef_" + tfnames[j] + "_" + str(k) for k in range(T) for j in range(nbranch)])
+  constrcount += len(addmatrixconstrs(all_data, A, GRB.EQUAL, np.zeros(2*nrow), names))
+  log.joint('   %d reactive power flow definition constraints added\n'%(2*nrow))
+
+  # Flow balance constraints, refer to equations (1b) and (1c) in [1]. 
+  # Branch terms come from the incidence matrices built by the reader, 
+  # expanded block-diagonally over periods. Bus shunts only enter the 
+  # balance of buses with at least one branch
+  kb      = np.repeat(np.arange(T), nbus)
+  ib      = np.tile(np.arange(nbus), T)
+  IT      = sp.identity(T, format = 'csr')
+  Cf      = sp.kron(IT, all_data['Cf']).tocoo()
+  Ct      = sp.kron(IT, all_data['Ct']).tocoo()
+  Cg      = sp.kron(IT, all_data['Cg']).tocoo()
+  degree  = all_data['busdegree']
+  Gs      = all_data['busGs'] * (degree > 0)
+  Bs      = all_data['busBs'] * (degree > 0)
+  nbrow   = T * nbus
+  busrows = np.arange(nbrow)
+  cbuscol = blockcolumns(layout,'cbus',kb,ib)
 
-  if all_data['fixflows']:
-    fixflows(log,all_data)
-    if all_data['fixcs'] == 0:
-      return None
+  log.joint('  active power injection constraints\n')
+  A = sparsematrix([(Cf.row, layout['Pf'][0] + Cf.col, Cf.data),
+                    (Ct.row, layout['Pt'][0] + Ct.col, Ct.data),
+                    (busrows, cbuscol, Gs[ib]),
+                    (busrows, blockcolumns(layout,'Pinj',kb,ib), -np.ones(nbrow))],
+                   nbrow, varcount)
+  names = lambda: ["PBaldef" + busnames[i] + "_" + str(k) for k in range(T) for i in range(nbus)]
+  constrs      = addmatrixconstrs(all_data, A, GRB.EQUAL, np.zeros(nbrow), names)
+  constrcount += len(constrs)
+  all_data['PBaldef'] = {k: dict(zip(buslist, constrs[k*nbus:(k+1)*nbus])) 
+                         for k in range(T)}
+  log.joint('   %d active power injection constraints added\n'%nbrow)
 
-  if all_data['fixcs']:
-    fixcs(log,all_data)
-    return None
+  log.joint('  reactive power injection constraints\n')
+  A = sparsematrix([(Cf.row, layout['Qf'][0] + Cf.col, Cf.data),
+                    (Ct.row, layout['Qt'][0] + Ct.col, Ct.data),
+                    (busrows, cbuscol, -Bs[ib]),
+                    (busrows, blockcolumns(layout,'Qinj',kb,ib), -np.ones(nbrow))],
+                   nbrow, varcount)
+  names = lambda: ["QBaldef" + busnames[i] + "_" + str(k) for k in range(T) for i in range(nbus)]
+  constrcount += len(addmatrixconstrs(all_data, A, GRB.EQUAL, np.zeros(nbrow), names))
+  log.joint('   %d reactive power injection constraints added\n'%nbrow)
+
+  # Definition of Bus-injection variables, i.e., total generation at a bus
+  # minus its load, see RHS of equations (1b) and (1c) in [1]
+  log.joint('  Adding injection definition constraints...\n')
 
-  if all_data['writeACsol']:
-    writeACsol(log,all_data)
-    return None
+  A = sparsematrix([(busrows, blockcolumns(layout,'Pinj',kb,ib), np.ones(nbrow)),
+                    (Cg.row, layout['GenP'][0] + Cg.col, -Cg.data),
+                    (nbrow + busrows, blockcolumns(layout,'Qinj',kb,ib), np.ones(nbrow)),
+                    (nbrow + Cg.row, layout['GenQ'][0] + Cg.col, -Cg.data)],
+                   2*nbrow, varcount)
+  rhs   = np.concatenate((-Pdarray.ravel(), -np.tile(Qdarray, T)))
+  names = lambda: (["Bus_PInj_" + busnames[i] + "_" + str(k) for k in range(T) for i in range(nbus)]
+           + ["Bus_QInj_" + busnames[i] + "_" + str(k) for k in range(T) for i in range(nbus)])
+  constrcount += len(addmatrixconstrs(all_data, A, GRB.EQUAL, rhs, names))
+  log.joint('   %d power injection definitions added\n'%(2*nbrow))
+
+  # Ramping up and down constraints, refer to equations (2a) and (2b) in [1]
+  log.joint('  Adding ramping constraints...\n')
 
-  ########################### SOLVER PARAMETERS ###############################
+  if T > 1:
+    kr    = np.repeat(np.arange(T-1), ngen)
+    gr    = np.tile(np.arange(ngen), T-1)
+    nrrow = (T-1) * ngen
+    rrows = np.arange(nrrow)
+    rpu   = np.array([[rampru[k][gen] for gen in genlist] for k in range(T-1)]).ravel()
+    rpd   = np.array([[ramprd[k][gen] for gen in genlist] for k in range(T-1)]).ravel()
+    Pnow  = blockcolumns(layout,'GenP',kr,gr)
+    Pnext = blockcolumns(layout,'GenP',kr+1,gr)
+    absc  = blockcolumns(layout,'abs_gen',kr,gr)
+    oner  = np.ones(nrrow)
+
+    A = sparsematrix([(rrows, Pnext, oner), (rrows, Pnow, -oner), 
+                      (rrows, absc, -rpu),
+                      (nrrow + rrows, Pnow, oner), (nrrow + rrows, absc, -rpd),
+                      (nrrow + rrows, Pnext, -oner),
+                      (2*nrrow + rrows, Pnow, oner), (2*nrrow + rrows, absc, -oner),
+                      (3*nrrow + rrows, Pnow, -oner), (3*nrrow + rrows, absc, -oner)],
+                     4*nrrow, varcount)
+    rampnames = [gennames[g] + "_" + str(k) + "_" + str(k+1) for k in range(T-1)
+                 for g in range(ngen)]
+    names = lambda: (["rup_" + n for n in rampnames] + ["rdown_" + n for n in rampnames]
+             + ["rup_" + n + "_1" for n in rampnames] 
+             + ["rup_" + n + "_2" for n in rampnames])
+    constrcount += len(addmatrixconstrs(all_data, A, GRB.LESS_EQUAL, 
+                                        np.zeros(4*nrrow), names))
+    log.joint('   %d ramping constraints added\n'%(4*nrrow))
+
+  return constrcount
+
+
+# Builds the model saved by 'modelcache.savemodel' after a previous run of
+# 'formulation_matrix' on the same inputs, together with the dictionaries
+# pointing to its variables and active power balance constraints
+
+def formulation_cached(log,all_data,cached):
+
+  themodel   = all_data['themodel']
+  buslist    = list(all_data['buses'].values())
+  branchlist = list(all_data['branches'].values())
+  T          = all_data['T']
+  nbus       = len(buslist)
+  meta       = cached['meta']
+
+  log.joint(' %d Time periods\n' %T)
+  log.joint(' Loading the model from the cache...\n')
+
+  # Isolated buses get their loads zeroed, as in 'formulation_matrix'
+  computebalbounds_arrays(log,all_data,buslist)
+
+  allvars = themodel.addMVar(len(cached['lb']), lb = cached['lb'],
+                             ub = cached['ub']).tolist()
+  themodel.update()
+  constrs = themodel.addMConstr(cached['A'], None, cached['sense'],
+                                cached['rhs']).tolist()
+  themodel.setMObjective(cached['Q'], cached['obj'], meta['objcon'])
 
-  # By default we run Gurobi with the barrier algorithm and crossover disabled
+  log.joint('   %d variables added\n' %len(allvars))
 
-  themodel.Params.Method    = all_data['solver_method']
-  themodel.Params.Crossover = all_data['crossover'] 
-  themodel.Params.LogFile   = all_data['mylogfile']
-  themodel.Params.TimeLimit = all_data['max_time']
+  # Blocks are stored in the order they were created, each one ends where
+  # the next one starts
+  layout   = {block: tuple(value) for block, value in meta['layout'].items()}
+  offsets  = [value[0] for value in layout.values()] + [len(allvars)]
+  varlists = {}
+  for b, block in enumerate(layout.keys()):
+    varlists[block] = allvars[offsets[b]:offsets[b+1]]
 
-  if all_data['solver_method'] == 2:
-    themodel.Params.BarHomogeneous = 1
-    themodel.Params.BarConvTol     = all_data['barconvtol']
-    themodel.Params.FeasibilityTol = all_data['feastol']
-    themodel.Params.OptimalityTol  = all_data['opttol']
-    
-  themodel.Params.NumericFocus = 1
-  themodel.Params.OutPutFlag = 1
-  
-  ######################### READING AND LOADING CUTS ##########################
+  i2idx  = np.array(meta['i2idx'], dtype = int)
+  goodi2 = [branchlist[j] for j in i2idx]
 
-  # This procedure adds previously computed cuts to the current optimization
-  # instance. The function 'add_cuts_ws' is used if multiple cutting-plane
-  # rounds want to be run after loading the cuts, and 'add_cuts' if only one 
-  # iteration is needed
+  if all_data['i2']:
+    all_data['i2coeffs'] = all_data['network'].i2coeffs()
+    all_data['alphadic'] = dict(zip(branchlist, all_data['i2coeffs'][0].tolist()))
 
-  if all_data['addcuts']:
+  indexmaps(log,all_data,varlists,goodi2)
+  all_data['varlayout'] = layout
+  all_data['i2idx']     = i2idx
 
-    t0_cuts = time.time()
+  pbalrows = cached['pbalrows']
+  all_data['PBaldef'] = {k: dict(zip(buslist, [constrs[r] for r in 
+                                               pbalrows[k*nbus:(k+1)*nbus]]))
+                         for k in range(T)}
 
-    if all_data['max_rounds'] > 1:
-      add_cuts_ws(log,all_data)
-    else:
-      add_cuts(log,all_data)
+  namevars(all_data, allvars, lambda: cached['varnames'].tolist())
+  nameconstrs(all_data, constrs, lambda: cached['constrnames'].tolist())
 
-    themodel.update()
+  return len(constrs)
 
-    t1_cuts = time.time()
 
-    all_data['addcuts_time'] = t1_cuts - t0_cuts
+# Builds dictionaries indexed by time-period and bus/branch/gen, as in 
+# 'formulation_loops', pointing to the variables of each block of a model
+# built by 'formulation_matrix'
 
-    log.joint(' pre-computed cuts added and model updated\n')
+def indexmaps(log,all_data,varlists,goodi2):
 
-    log.joint(' reading and loading cuts time = '
-              + str(all_data['addcuts_time']) + '\n')
+  T          = all_data['T']
+  buslist    = list(all_data['buses'].values())
+  branchlist = list(all_data['branches'].values())
+  genlist    = list(all_data['gens'].values())
+  nbus       = len(buslist)
+  nbranch    = len(branchlist)
+  ngen       = len(genlist)
+  ni2        = len(goodi2)
 
-    if all_data['writelps']:
-      themodel.write(all_data['casename']+'_precomputed_cuts.lp')
-      log.joint(' model with precomputed written to .lp file\n\n')
-  
-  ########################## CUTPLANE MAIN LOOP ###############################
+  cvar    = {}
+  svar    = {}
+  Pvar_f  = {}
+  Qvar_f  = {}
+  Pvar_t  = {}
+  Qvar_t  = {}
+  Pinjvar = {}
+  Qinjvar = {}
+  GenPvar = {}
+  GenQvar = {}
+  GenTvar = {}
+  abs_gen = {}
+  i2var_f = {}
 
-  all_data['round']                  = 1
-  all_data['runtime']                = time.time() - all_data['T0']
-  all_data['round_time']             = time.time()
-  all_data['cumulative_solver_time'] = 0
-  all_data['ftol_counter']           = 0
-  oldobj                             = 1
-  gap                                = 1e20
+  for k in range(T):
+    cvar[k]    = dict(zip(buslist, varlists['cbus'][k*nbus:(k+1)*nbus]))
+    cvar[k].update(zip(branchlist, varlists['cbr'][k*nbranch:(k+1)*nbranch]))
+    svar[k]    = dict(zip(branchlist, varlists['sbr'][k*nbranch:(k+1)*nbranch]))
+    Pvar_f[k]  = dict(zip(branchlist, varlists['Pf'][k*nbranch:(k+1)*nbranch]))
+    Pvar_t[k]  = dict(zip(branchlist, varlists['Pt'][k*nbranch:(k+1)*nbranch]))
+    Qvar_f[k]  = dict(zip(branchlist, varlists['Qf'][k*nbranch:(k+1)*nbranch]))
+    Qvar_t[k]  = dict(zip(branchlist, varlists['Qt'][k*nbranch:(k+1)*nbranch]))
+    Pinjvar[k] = dict(zip(buslist, varlists['Pinj'][k*nbus:(k+1)*nbus]))
+    Qinjvar[k] = dict(zip(buslist, varlists['Qinj'][k*nbus:(k+1)*nbus]))
+    GenPvar[k] = dict(zip(genlist, varlists['GenP'][k*ngen:(k+1)*ngen]))
+    GenQvar[k] = dict(zip(genlist, varlists['GenQ'][k*ngen:(k+1)*ngen]))
+    GenTvar[k] = {}
+    i2var_f[k] = dict(zip(goodi2, varlists['i2'][k*ni2:(k+1)*ni2]))
+    if k < T-1:
+      abs_gen[k] = dict(zip(genlist, varlists['abs_gen'][k*ngen:(k+1)*ngen]))
 
-  
-  while ((all_data['round'] <= all_data['max_rounds']) and 
-         (all_data['runtime'] <= all_data['max_time']) and 
-         (all_data['ftol_counter'] <= all_data['ftol_iterates'])):
-    
-      
-    ############################ SOLVING MODEL ################################
+  all_data['cvar']        = cvar
+  all_data['svar']        = svar
+  all_data['GenPvar']     = GenPvar
+  all_data['GenQvar']     = GenQvar
+  all_data['GenTvar']     = GenTvar
+  all_data['Pvar_f']      = Pvar_f
+  all_data['Pvar_t']      = Pvar_t
+  all_data['Qvar_f']      = Qvar_f
+  all_data['Qvar_t']      = Qvar_t
+  all_data['Pinjvar']     = Pinjvar
+  all_data['Qinjvar']     = Qinjvar
+  all_data['abs_gen']     = abs_gen
 
-    cutplane_optimize(log,all_data)
+  if all_data['i2']:
+    all_data['i2var_f']   = i2var_f
 
-    ########################### STORING SOLUTION ##############################
 
-    log.joint(' Storing current solution ...\n')
+# Returns the model columns of elements 'i' in periods 'k' of a block of 
+# variables created by 'formulation_matrix'
 
-    all_data['Pfvalues']   = {}
-    all_data['Qfvalues']   = {}
-    all_data['Ptvalues']   = {}
-    all_data['Qtvalues']   = {}
-    all_data['cvalues']    = {}
-    all_data['svalues']    = {}
-    all_data['GenPvalues'] = {}
-    all_data['GenQvalues'] = {}
-    
-    for k in range(T):
-      Pfvalues   = {}
-      Qfvalues   = {}
-      Ptvalues   = {}
-      Qtvalues   = {}
-      cvalues    = {}
-      svalues    = {}
-      GenPvalues = {}
-      GenQvalues = {}
-
-      for bus in buses.values():
-        cvalues[bus] = cvar[k][bus].X
-      
-      for branch in branches.values():
-        Pfvalues[branch]   = Pvar_f[k][branch].X
-        Qfvalues[branch]   = Qvar_f[k][branch].X
-        Ptvalues[branch]   = Pvar_t[k][branch].X
-        Qtvalues[branch]   = Qvar_t[k][branch].X
-        cvalues[branch]    = cvar[k][branch].X
-        svalues[branch]    = svar[k][branch].X
-
-      for gen in gens.values():
-        GenPvalues[gen] = GenPvar[k][gen].X
-        GenQvalues[gen] = GenQvar[k][gen].X        
-
-      all_data['Pfvalues'][k]   = Pfvalues
-      all_data['Qfvalues'][k]   = Qfvalues
-      all_data['Ptvalues'][k]   = Ptvalues
-      all_data['Qtvalues'][k]   = Qtvalues
-      all_data['cvalues'][k]    = cvalues
-      all_data['svalues'][k]    = svalues
-      all_data['GenPvalues'][k] = GenPvalues
-      all_data['GenQvalues'][k] = GenQvalues      
-      
-    
-    if all_data['i2']:
-      all_data['i2fvalues'] = {}
-      for k in range(T):
-        i2fvalues = {}
-        for branch in branches.values():   # check, loop over selected br
-          alpha = all_data['alphadic'][branch]
-          if alpha < all_data['rho_threshold']:
-            i2fvalues[branch] = i2var_f[k][branch].X
-        all_data['i2fvalues'][k] = i2fvalues
-        
-    log.joint(' done storing values\n')
-     
-    ########################## CHECK OBJ IMPROVEMENT ##########################
+def blockcolumns(layout,block,k,i):
 
-    # Here we check the objective had a relative improvement (wrt the 
-    # previous objective) of at least 'ftol'. If this is not the case
-    # then we increase the 'ftol_counter', else we reset it to 0
+  offset, n = layout[block]
 
-    if ((all_data['objval'] - oldobj)/oldobj) < all_data['ftol']:
-      all_data['ftol_counter'] += 1
-    else:
-      all_data['ftol_counter'] = 0
+  return offset + k * n + i
 
-    oldobj              = all_data['objval']
-    all_data['runtime'] = time.time() - all_data['T0']
 
-    ########################### ROUND STATISTICS ##############################
+# Puts together a sparse matrix from a list of (rows, columns, values)
+# triplets; repeated entries are summed and zeros are dropped
 
-    cutplane_stats(log,all_data)
+def sparsematrix(triplets,nrows,ncols):
 
-    ######################### SUMMARY EXPERIMENTS #############################
+  rows = np.concatenate([triplet[0] for triplet in triplets])
+  cols = np.concatenate([triplet[1] for triplet in triplets])
+  vals = np.concatenate([triplet[2] for triplet in triplets]).astype(float)
 
-    # Here we log some statistics of the current round
+  A = sp.csr_matrix((vals, (rows, cols)), shape = (nrows,ncols))
+  A.eliminate_zeros()
 
-    all_data['runtime'] = time.time() - all_data['T0']
+  return A
 
-    log.joint("\n writing casename, opt stauts, obj and " +
-              "runtime to summary_ws.log\n")
 
-    summary_ws   = open("summary_ws.log","a+") 
-    numcutsadded = ( all_data['ID_jabr_cuts'] + all_data['ID_i2_cuts']
-                     + all_data['ID_limit_cuts'] )
-    numcuts      = ( all_data['num_jabr_cuts'] + all_data['num_i2_cuts']
-                     + all_data['num_limit_cuts'] )
-    
-    summary_ws.write(' case ' + all_data['casename'] + ' opt_status ' 
-                     + str(all_data['optstatus']) + ' obj ' 
-                     + str(all_data['objval']) + ' runtime ' 
-                     + str(all_data['runtime']) + ' iterations ' 
-                     + str(all_data['round']) + ' rndcuts '
-                     + str((all_data['round']-1)) + ' numcutsadded '
-                     + str(numcutsadded) + ' numcuts '
-                     + str(numcuts) +  '\n')
+# Adds the constraints A x (sense) rhs over all the variables of the model,
+# names them, and returns the list of constraints added
 
-    summary_ws.close()
+def addmatrixconstrs(all_data,A,sense,rhs,names):
 
-    ############################ GET DUALS #################################
+  if A.shape[0] == 0:
+    return []
 
-    # This function gets the dual variables associated to the active power 
-    # balance constraints
+  constrs = all_data['themodel'].addMConstr(A, None, sense, rhs).tolist()
+  nameconstrs(all_data, constrs, names)
 
-    if all_data['getduals'] and (themodel.status != GRB.status.NUMERIC):
-      getduals(log,all_data)
-    
-    ############################ TERMINATION #################################
+  return constrs
 
-    if (all_data['round'] >= all_data['max_rounds']):
 
-      writesol_and_lps(log,all_data)
+# Adds the quadratic constraints
+#    sum_j vals[i,j] x[lcols[i,j]] x[rcols[i,j]] <= rhs[i]
+# where 'lcols', 'rcols' and 'vals' are (m, width) arrays, names them and
+# returns them. gurobipy has no bulk call for quadratic constraints faster
+# than building each expression with a single addTerms call
 
-      summary_ws = open("summary_ws.log","a+") 
-      summary_ws.write(' rounds limit reached!\n\n')
-      summary_ws.close()
-      log.joint(' rounds limit reached!\n')
-      log.joint(' bye\n')
-      return 0
-          
-    if all_data['runtime'] > all_data['max_time']:
+def addquadconstrs(all_data,lcols,rcols,vals,rhs,names):
 
-      writesol_and_lps(log,all_data)
+  themodel = all_data['themodel']
+  allvars  = themodel.getVars()
+  constrs  = []
 
-      summary_ws = open("summary_ws.log","a+")
-      summary_ws.write(' time limit reached!\n\n')
-      summary_ws.close()
-      log.joint(' time limit reached!\n')
-      log.joint(' bye\n')
-      return 0
+  for lrow, rrow, vrow, r in zip(lcols.tolist(), rcols.tolist(), vals.tolist(),
+                                 rhs.tolist()):
+    expr = QuadExpr()
+    expr.addTerms(vrow, [allvars[c] for c in lrow], [allvars[c] for c in rrow])
+    constrs.append(themodel.addQConstr(expr, GRB.LESS_EQUAL, r))
 
-    if (all_data['ftol_counter'] > all_data['ftol_iterates']):
+  nameqconstrs(all_data, constrs, names)
 
-      writesol_and_lps(log,all_data)
-     
-      summary_ws = open("summary_ws.log","a+") 
-      summary_ws.write(' poor consecutive obj improvement limit reached!\n\n')
-      summary_ws.close()
-      log.joint(' poor consecutive obj improvement limit reached\n')
-      log.joint(' bye\n')
-      return 0
+  return constrs
 
-    ############################### CUTS ######################################
 
-    # Cut computations and management
-    cutplane_cuts(log,all_data)
+# Sets the names of a list of variables (constraints) computed by function
+# 'names'. Unless 'names' is turned on in the config file, they are only
+# computed when an .lp file is written or the model is cached, see
+# 'namemodel'
 
-    # Cut statistics
-    cutplane_cutstats(log,all_data)
-    
-    themodel.update()
+def namevars(all_data,varlist,names):
 
-    log.joint(' model updated\n')
-    log.joint('\n')
+  if all_data['names']:
+    all_data['themodel'].setAttr("VarName", varlist, names())
+  else:
+    all_data['lazynames'].append(("VarName", varlist, names))
 
-    ############################### WRITE CUTS ################################
 
-    # This function writes all the current cuts to a .txt file
-    if all_data['writecuts']:
-      write_cuts(log,all_data)
+def nameconstrs(all_data,constrlist,names):
 
-    ############################### WRITE LPS #################################
-    
-    # If this parameter is turned on then we write to a .lp file our 
-    # current relaxation
+  if all_data['names']:
+    all_data['themodel'].setAttr("ConstrName", constrlist, names())
+  else:
+    all_data['lazynames'].append(("ConstrName", constrlist, names))
 
-    if all_data['writelps']:
-      name = 'post_cuts' + '_' + str(all_data['round']) + '.lp'
-      themodel.write(name)
-      log.joint(' model with new cuts written to .lp file\n')
 
-        
-    ###########################################################################
-                                              
-    all_data['round']      += 1
-    all_data['round_time']  = time.time()
+def nameqconstrs(all_data,qconstrlist,names):
 
+  if all_data['names']:
+    all_data['themodel'].setAttr("QCName", qconstrlist, names())
+  else:
+    all_data['lazynames'].append(("QCName", qconstrlist, names))
 
-###############################################################################
 
-# Other Functions
+# Names every variable and constraint added unnamed so far, plus the cuts
+# in the model, before writing an .lp file
 
-# Writes down solutions, retrieves duals variables of active power balance 
-# constraints, and writes to an .lp file our last linearly-constrained 
-# relaxation
+def namemodel(log,all_data):
 
-def writesol_and_lps(log,all_data):
+  if all_data['names']:
+    return
 
   themodel = all_data['themodel']
-  casename = all_data['casename']
-  casetype = all_data['casetype']
-  T        = all_data['T']
-
-  # We write down our current solution to two files: the first
-  # function creates a readable .txt where variables are sorted 
-  # by type and index (i.e., voltages, power flows, generation); 
-  # while the second function creates a .sol file where variables
-  # are written (in arbitrary order) in the format: 
-  # 'variable name' = 'variable value'
-  if all_data['writesol']:
-    writesol(log,all_data)
-    writesol_allvars(log,all_data)
 
-  # We print the duals associated to the active power balance
-  # constraints and we write them down to a table
-  if all_data['getduals'] and (themodel.status != GRB.status.NUMERIC):
-    print_duals(log,all_data)
-    print_duals_table(log,all_data)
-  
-  # If this parameter is turned on, then we write to an .lp file
-  # our last linearly-constrained relaxation
-  if all_data['writelastLP']:
-    log.joint(' writing down last lp...\n')        
-    themodel.write(casename + '_' + str(T) + '_' + casetype + "_last.lp")
+  for attr, objs, names in all_data['lazynames']:
+    themodel.setAttr(attr, objs, names())
 
-  return 0
+  all_data['lazynames'] = []
+
+  name_cuts(log,all_data)
 
 
 # Fixes the flows of some previously computed AC solution up to some
@@ -1060,6 +1619,7 @@ def fixflows(log,all_data):
       Qvar_t[k][branch].setAttr("lb",lbound_Qt)
 
   themodel.update()
+  namemodel(log,all_data)
   themodel.write('fixflows.lp')
   log.joint('check fixflows.lp\n')  
 
@@ -1113,31 +1673,73 @@ def fixcs(log,all_data):
       svar[k][branch].setAttr("lb",lbound_s)
 
   themodel.update()
+  namemodel(log,all_data)
   themodel.write('fixCS.lp')
   log.joint('check fixCS.lp\n')
 
-# Computes bounds for active and reactive power injections 
+# Computes bounds for the c and s variables of all branches, c.f. equation
+# (3) in [1], using the voltage limits at both ends and the angle limits.
+# Returns an array with columns clbound, cubound, slbound, subound, in
+# branch index order
+
+def computecsbounds(log, all_data):
+
+  network     = all_data['network']
+  maxprod     = network.Vmax[network.fidx]*network.Vmax[network.tidx]
+  minprod     = network.Vmin[network.fidx]*network.Vmin[network.tidx]
+  maxanglerad = network.maxangle_rad
+  minanglerad = network.minangle_rad
+  cosmax      = np.cos(maxanglerad)
+  cosmin      = np.cos(minanglerad)
+  sinmax      = np.sin(maxanglerad)
+  sinmin      = np.sin(minanglerad)
+
+  maxle90     = maxanglerad <= 0.5*math.pi
+  maxle180    = maxanglerad <= math.pi
+  maxle270    = maxanglerad <= 1.5*math.pi
+  minge90     = minanglerad >= -0.5*math.pi
+  minge180    = minanglerad >= -math.pi
+  minge270    = minanglerad >= -1.5*math.pi
+
+  # Bounds for c variables; if maxangle <= 90 then minangle <= 0 and the
+  # cosine of minangle is negative in the second case
+  clbound = np.select([maxle90 & minge90, maxle90 & minge180, maxle90,
+                       maxle180 & minge90, maxle180 & minge180],
+                      [minprod*np.minimum(cosmax, cosmin), maxprod*cosmin,
+                       -maxprod, maxprod*cosmax,
+                       maxprod*np.minimum(cosmax, cosmin)],
+                      -maxprod)
+  cubound = maxprod
+
+  # s variables
+  slbound = np.select([maxle90 & minge90, maxle180 & minge90,
+                       maxle270 & minge90],
+                      [maxprod*sinmin, maxprod*sinmin,
+                       maxprod*np.minimum(sinmax, sinmin)],
+                      -maxprod)
+  subound = np.select([maxle90 & minge180, maxle90 & minge270],
+                      [maxprod*sinmax, maxprod*np.maximum(sinmax, sinmin)],
+                      maxprod)
+
+  return np.stack((clbound, cubound, slbound, subound), axis = 1)
+
+
+# Computes bounds for active and reactive power injections; generation
+# bounds are taken from the per-bus aggregates built by the reader
 
 def computebalbounds(log, all_data, bus, k):
 
-  # We first get max/min generation
-  baseMVA = all_data['baseMVA']
-  gens = all_data['gens']
   Pd   = all_data['Pd']
+  i    = bus.index
 
-  Pubound = Plbound = 0
-  Qubound = Qlbound = 0
+  Pubound = all_data['busPmax'][i]
+  Plbound = all_data['busPmin'][i]
+  Qubound = all_data['busQmax'][i]
+  Qlbound = all_data['busQmin'][i]
 
-  for gencounter in bus.genidsbycount:
-    if gens[gencounter].status:
-      Pubound += gens[gencounter].Pmax
-      Plbound += gens[gencounter].Pmin
-      Qubound += gens[gencounter].Qmax
-      Qlbound += gens[gencounter].Qmin
-
-      if bus.nodetype == 3:
-        Qubound = + GRB.INFINITY
-        Qlbound = - GRB.INFINITY
+  if bus.nodetype == 3 and all_data['busactivegens'][i] > 0:
+    Qubound = + GRB.INFINITY
+    Qlbound = - GRB.INFINITY
         
   Pubound -= Pd[k][bus]
   Plbound -= Pd[k][bus]
@@ -1152,6 +1754,38 @@ def computebalbounds(log, all_data, bus, k):
   return Pubound, Plbound, Qubound, Qlbound
 
 
+# Same as 'computebalbounds' but for all buses and periods at once; returns
+# (T, numbuses) arrays of bounds and the (T, numbuses) array of active loads,
+# where the loads of isolated buses have been zeroed
+
+def computebalbounds_arrays(log, all_data, buslist):
+
+  T        = all_data['T']
+  Pd       = all_data['Pd']
+  nodetype = all_data['busnodetype']
+  isolated = nodetype == 4
+  refQ     = (nodetype == 3) & (all_data['busactivegens'] > 0)
+
+  for k in range(T):
+    for i in np.flatnonzero(isolated):
+      Pd[k][buslist[i]] = 0
+
+  Pdarray = np.array([[Pd[k][bus] for bus in buslist] for k in range(T)])
+  Pdarray = Pdarray.reshape(T,len(buslist))
+
+  Pubound = all_data['busPmax'] - Pdarray
+  Plbound = all_data['busPmin'] - Pdarray
+  Qubound = np.where(refQ, GRB.INFINITY, all_data['busQmax'] - all_data['busQd'])
+  Qlbound = np.where(refQ, -GRB.INFINITY, all_data['busQmin'] - all_data['busQd'])
+  Qubound = np.tile(Qubound, (T,1))
+  Qlbound = np.tile(Qlbound, (T,1))
+
+  Pubound[:,isolated] = Plbound[:,isolated] = 0
+  Qubound[:,isolated] = Qlbound[:,isolated] = 0
+
+  return Pubound, Plbound, Qubound, Qlbound, Pdarray
+
+
 # Writes to an .lp file, up to some given tolerance, an AC solution 
 
 def writeACsol(log,all_data):
@@ -1296,13 +1930,14 @@ def loss_inequalities(log,all_data):
      else:
        log.joint('   AC solution satisfies loss inequality at branch ' + str(branchcount) + ' with slack ' + str(violation) + '\n')
 
-    counter_loss                 += 1
-    all_data['loss_cuts'][branch] = (0,0,FeasibilityTol)
+    counter_loss += 1
 
     lossexp    = LinExpr()
     constrname = "loss_ineq_"+str(branch.count)+"_"+str(f)+"_"+str(t)
     lossexp   += Pvar_f[branch] + Pvar_t[branch]
-    themodel.addConstr(lossexp >= 0, name = constrname)
+    constr     = themodel.addConstr(lossexp >= 0, name = constrname)
+
+    all_data['loss_cuts'][branch] = (0,0,FeasibilityTol,constr)
 
   all_data['num_loss_cuts']         = counter_loss
   all_data['num_loss_cuts_dropped'] = 0
@@ -1316,11 +1951,9 @@ def loss_inequalities(log,all_data):
 
 def jabr_inequalities(log,all_data):
 
-  themodel       = all_data['themodel']
   branches       = all_data['branches']
   buses          = all_data['buses']
-  cvar           = all_data['cvar']
-  svar           = all_data['svar']
+  network        = all_data['network']
   IDtoCountmap   = all_data['IDtoCountmap']
   FeasibilityTol = all_data['FeasibilityTol']
   T              = all_data['T']
@@ -1336,16 +1969,15 @@ def jabr_inequalities(log,all_data):
   maxbranch    = -1
   maxbusf      = -1
   maxbust      = -1
-  counter_jabr = 0
 
-  for branch in branches.values():
-    branchcount = branch.count
-    f           = branch.f
-    t           = branch.t
-    count_of_f  = IDtoCountmap[f]
-    count_of_t  = IDtoCountmap[t]
+  if all_data['ampl_sol'] and all_data['jabr_validity']:
+    for branch in branches.values():
+      branchcount = branch.count
+      f           = branch.f
+      t           = branch.t
+      count_of_f  = IDtoCountmap[f]
+      count_of_t  = IDtoCountmap[t]
 
-    if all_data['ampl_sol'] and all_data['jabr_validity']:
       sol_c         = all_data['sol_cvalues'][branch]
       sol_s         = all_data['sol_svalues'][branch]
       sol_cbusf     = all_data['sol_cvalues'][buses[count_of_f]]
@@ -1368,88 +2000,105 @@ def jabr_inequalities(log,all_data):
       else:
         log.joint('   AC solution satisfies loss inequality at branch ' + str(branchcount) + ' with slack ' + str(relviolation) + '\n')
 
-    for k in range(T):
-      
-      trigexp       = QuadExpr()
-      constrname    = "jabr_"+str(branchcount)+"_"+str(f)+"_"+str(t)+"_"+str(k)
-      trigexp      += cvar[k][branch]*cvar[k][branch] + svar[k][branch]*svar[k][branch] - cvar[k][buses[count_of_f]]*cvar[k][buses[count_of_t]]
-
-      themodel.addConstr(trigexp <= 0, name = constrname)
-      counter_jabr += 1
-    
-  if all_data['ampl_sol'] and all_data['jabr_validity']:
     log.joint('  max violation of Jabr-inequalities by AC solution ' + str(maxviolation) + ' at branch ' + str(maxbranch) + ' f ' + str(maxbusf) + ' t ' + str(maxbust) + '\n')
     log.joint('  number of violated Jabr-inequalities ' + str(violated) + '\n')
     breakexit('  check Jabr violation')
 
+  # cft_k^2 + sft_k^2 - cff_k ctt_k <= 0, for every branch and then period
+  cols = blockcols(all_data)
+  jj   = np.repeat(np.arange(len(branches)), T)
+  kk   = np.tile(np.arange(T), len(branches))
+  cft  = cols['cbr'][kk,jj]
+  sft  = cols['sbr'][kk,jj]
+  cff  = cols['cbus'][kk,network.fidx[jj]]
+  ctt  = cols['cbus'][kk,network.tidx[jj]]
+
+  names = lambda: ["jabr_" + str(branch.count) + "_" + str(branch.f) + "_" + str(branch.t)
+                   + "_" + str(k) for branch in branches.values() for k in range(T)]
+  counter_jabr = len(addquadconstrs(all_data, np.stack((cft, sft, cff), axis = 1),
+                                    np.stack((cft, sft, ctt), axis = 1),
+                                    np.tile([1.0, 1.0, -1.0], (len(jj),1)),
+                                    np.zeros(len(jj)), names))
+
   log.joint('   %d Jabr inequalities added\n'%counter_jabr) 
 
   return counter_jabr
 
-# Defines the i2 variable, see equations (19a), (19b) and (29) in [1]
+# Defines the i2 variable, see equations (19a), (19b) and (29) in [1].
+# Branches without an i2 variable get the two linear inequalities bounding
+# the right-hand side of (29) instead. All of the rows are put together as a
+# sparse matrix, in the order of a loop over branches and then time-periods,
+# and added with a single addMConstr call
 
 def i2_def(log,all_data):
 
   themodel       = all_data['themodel']
-  branches       = all_data['branches']
-  buses          = all_data['buses']
-  i2var_f        = all_data['i2var_f']
-  cvar           = all_data['cvar']
-  svar           = all_data['svar']
-  IDtoCountmap   = all_data['IDtoCountmap']
+  branchlist     = list(all_data['branches'].values())
+  network        = all_data['network']
   T              = all_data['T']
-  alphadic       = all_data['alphadic']
-  
-  counter_i2def  = 0
-  counter_i2con  = 0
+  nbranch        = len(branchlist)
+
+  # Coefficients of equation (18) in [1] of every branch, kept for the
+  # separation of i2-envelope cuts together with the positions of the
+  # branches with an i2 variable
+  i2coeffs  = network.i2coeffs()
+  all_data['i2coeffs'] = i2coeffs
+  all_data['i2idx']    = np.flatnonzero(i2coeffs[0] < all_data['rho_threshold'])
+  alpha, beta, gamma, zeta = i2coeffs
   
   log.joint('  i2 variables definition and i2 linear inequalities\n')
 
-  for branch in branches.values():
-    expr_f      = LinExpr()
-    branchcount = branch.count
-    f           = branch.f
-    t           = branch.t
-    count_of_f  = IDtoCountmap[f]
-    count_of_t  = IDtoCountmap[t]
-    ratio       = branch.ratio
-    y           = branch.y
-    g           = y.real
-    b           = y.imag
-    bshunt      = branch.bc
-    angle       = branch.angle_rad
-    bus_f       = buses[count_of_f]
-    bus_t       = buses[count_of_t]
-    
-    alpha = alphadic[branch]
-    beta  = ( g*g + b*b ) / (ratio**2)
-    gamma = ( math.cos(angle) * ( - 2 * (g*g + b*b) - b * bshunt ) + math.sin(angle) * ( - g * bshunt) ) / (ratio**3)
-    zeta  = ( math.sin(angle) * ( - 2 * (g*g + b*b) - b * bshunt ) - math.cos(angle) * ( - g* bshunt) ) / (ratio**3)
-
-    
-    if alpha < all_data['rho_threshold']:
-      for k in range(T):
-        constrname_f = 'i2def_'+str(branch.count)+"_"+str(f) + "_" + str(t) + "_" + str(k)
-        expr_f = alpha * cvar[k][bus_f] + beta * cvar[k][bus_t] + gamma * cvar[k][branch] + zeta * svar[k][branch]
-
-        themodel.addConstr(expr_f == i2var_f[k][branch],name = constrname_f) 
-        counter_i2def += 1
-    else:
-      upperbound_f = branch.limit**2 / (bus_f.Vmin * bus_f.Vmin)
-      newalpha     = 1
-      newbeta      = beta/alpha
-      newgamma     = gamma/alpha
-      newzeta      = zeta/alpha
-      RHS          = upperbound_f / alpha
- 
-      for k in range(T):
-        uppconstrname_f = 'uppi2_'+str(branchcount)+"_"+str(f) + "_" + str(t) + "_" + str(k)
-        lowconstrname_f = 'lowi2_'+str(branchcount)+"_"+str(f) + "_" + str(t) + "_" + str(k)
-
-        expr_f = cvar[k][bus_f] + newbeta * cvar[k][bus_t] + newgamma * cvar[k][branch] + newzeta * svar[k][branch]
-        themodel.addConstr(expr_f <= RHS, name = uppconstrname_f)
-        themodel.addConstr(expr_f >= 0,   name = lowconstrname_f)
-        counter_i2con += 2
+  themodel.update()
+  cols   = blockcols(all_data)
+
+  # One row per branch and period with an i2 variable, two otherwise
+  hasi2  = alpha < all_data['rho_threshold']
+  i2pos  = np.cumsum(hasi2) - 1
+  jj     = np.repeat(np.arange(nbranch), T)
+  kk     = np.tile(np.arange(T), nbranch)
+  reps   = np.where(hasi2[jj], 1, 2)
+  rowj   = np.repeat(jj, reps)
+  rowk   = np.repeat(kk, reps)
+  first  = np.cumsum(reps) - reps
+  defs   = first[hasi2[jj]]
+  upper  = first[~hasi2[jj]]
+  nrows  = len(rowj)
+  rows   = np.arange(nrows)
+
+  # i2 definition rows are
+  #   alpha cff + beta ctt + gamma cft + zeta sft - i2 = 0
+  # and the other ones are scaled by 1 / alpha
+  #   0 <= cff + beta/alpha ctt + gamma/alpha cft + zeta/alpha sft <= RHS
+  scale  = np.where(hasi2[rowj], 1.0, alpha[rowj])
+
+  A = sparsematrix([(rows, cols['cbus'][rowk,network.fidx[rowj]], alpha[rowj] / scale),
+                    (rows, cols['cbus'][rowk,network.tidx[rowj]], beta[rowj] / scale),
+                    (rows, cols['cbr'][rowk,rowj], gamma[rowj] / scale),
+                    (rows, cols['sbr'][rowk,rowj], zeta[rowj] / scale),
+                    (defs, cols['i2'][rowk[defs],i2pos[rowj[defs]]], -np.ones(len(defs)))],
+                   nrows, themodel.NumVars)
+
+  sense  = np.full(nrows, GRB.EQUAL)
+  sense[upper]     = GRB.LESS_EQUAL
+  sense[upper + 1] = GRB.GREATER_EQUAL
+  rhs    = np.zeros(nrows)
+  jup    = rowj[upper]
+  rhs[upper]       = (network.limit[jup]**2 / network.Vmin[network.fidx[jup]]**2
+                      / alpha[jup])
+
+  prefix = np.where(hasi2[rowj], 'i2def_', 'uppi2_')
+  prefix[upper + 1] = 'lowi2_'
+
+  def names():
+    brnames = [str(branch.count) + "_" + str(branch.f) + "_" + str(branch.t) + "_"
+               for branch in branchlist]
+    return [p + brnames[j] + str(k) for p, j, k in zip(prefix.tolist(), rowj.tolist(),
+                                                      rowk.tolist())]
+
+  addmatrixconstrs(all_data, A, sense, rhs, names)
+
+  counter_i2def = len(defs)
+  counter_i2con = 2 * len(upper)
      
   log.joint('   %d i2 definition constraints added\n'%counter_i2def) 
   log.joint('   %d i2 linear constraints added\n'%counter_i2con)
@@ -1457,19 +2106,17 @@ def i2_def(log,all_data):
   return counter_i2def + counter_i2con
 
 
-# Adds the i2 rotated cone inequalities, see equation (9) in [1]
+# Adds the i2 rotated cone inequalities, see equation (9) in [1], for the
+# branches with an i2 variable
 
 def i2_inequalities(log,all_data):
 
-  themodel       = all_data['themodel']
   branches       = all_data['branches']
   buses          = all_data['buses']
-  cvar           = all_data['cvar']
-  i2var_f        = all_data['i2var_f']
-  Pvar_f         = all_data['Pvar_f']
-  Qvar_f         = all_data['Qvar_f']
+  network        = all_data['network']
   IDtoCountmap   = all_data['IDtoCountmap']
   FeasibilityTol = all_data['FeasibilityTol']
+  T              = all_data['T']
 
   if all_data['ampl_sol'] and all_data['i2_validity']:
     log.joint('  adding and checking validity of i2 inequalities wrt a solution\n')
@@ -1487,16 +2134,14 @@ def i2_inequalities(log,all_data):
   maxPf        = -1
   maxQf        = -1
 
-  counter_i2   = 0
-
-  for branch in branches.values():
-    branchcount = branch.count
-    f           = branch.f
-    t           = branch.t
-    count_of_f  = IDtoCountmap[f]
-    count_of_t  = IDtoCountmap[t]
+  if all_data['ampl_sol'] and all_data['i2_validity']:
+    for branch in branches.values():
+      branchcount = branch.count
+      f           = branch.f
+      t           = branch.t
+      count_of_f  = IDtoCountmap[f]
+      count_of_t  = IDtoCountmap[t]
 
-    if all_data['ampl_sol'] and all_data['i2_validity']:
       sol_Pf        = all_data['sol_Pfvalues'][branch]
       sol_Qf        = all_data['sol_Qfvalues'][branch]
       sol_c         = all_data['sol_cvalues'][branch]
@@ -1526,18 +2171,30 @@ def i2_inequalities(log,all_data):
       else:
         log.joint('   AC solution satisfies i2 inequality at branch ' + str(branchcount) + ' with slack ' + str(relviolation) + '\n')
 
-    counter_i2 += 1
-    trigexp     = QuadExpr()
-    constrname  = "i2_"+str(branchcount)+"_"+str(f)+"_"+str(t)
-    trigexp    += Pvar_f[branch]**2 + Qvar_f[branch]**2 - cvar[buses[count_of_f]] * i2var_f[branch]
-    themodel.addConstr(trigexp <= 0, name = constrname)
-
-  if all_data['ampl_sol'] and all_data['i2_validity']:
     log.joint('  max violation of i2 inequalities by AC solution ' + str(maxviolation) + ' at branch ' + str(maxbranch) + ' f ' + str(maxbusf) + ' t ' + str(maxbust) + '\n')
     log.joint('  values (AC solution) ' + ' Pft ' + str(maxPf) + ' Qft ' + str(maxQf) + ' cff ' + str(maxcff) + ' i2ft ' + str(maxi2f) + '\n' )
     log.joint('  number of violated i2 inequalities ' + str(violated) + '\n')
     breakexit('  check i2 violation')
 
+  # Pft_k^2 + Qft_k^2 - cff_k i2_k <= 0, for every branch and then period
+  branchlist = list(branches.values())
+  i2idx      = all_data['i2idx']
+  cols       = blockcols(all_data)
+  jj         = np.repeat(np.arange(len(i2idx)), T)
+  kk         = np.tile(np.arange(T), len(i2idx))
+  bb         = i2idx[jj]
+  Pft        = cols['Pf'][kk,bb]
+  Qft        = cols['Qf'][kk,bb]
+  cff        = cols['cbus'][kk,network.fidx[bb]]
+
+  names = lambda: ["i2_" + str(branchlist[j].count) + "_" + str(branchlist[j].f) + "_"
+                   + str(branchlist[j].t) + "_" + str(k) for j in i2idx.tolist()
+                   for k in range(T)]
+  counter_i2 = len(addquadconstrs(all_data, np.stack((Pft, Qft, cff), axis = 1),
+                                  np.stack((Pft, Qft, cols['i2'][kk,jj]), axis = 1),
+                                  np.tile([1.0, 1.0, -1.0], (len(jj),1)),
+                                  np.zeros(len(jj)), names))
+
   log.joint('   %d i2 inequalities added\n'%counter_i2) 
 
   return counter_i2  
@@ -1546,39 +2203,89 @@ def i2_inequalities(log,all_data):
 
 def limit_inequalities(log,all_data):
 
-  themodel       = all_data['themodel']
   branches       = all_data['branches']
-  Pvar_f         = all_data['Pvar_f']
-  Pvar_t         = all_data['Pvar_t']
-  Qvar_f         = all_data['Qvar_f']
-  Qvar_t         = all_data['Qvar_t']
   T              = all_data['T']
-  
-  counter_limit  = 0
 
   log.joint('  limit inequalities\n')
 
-  for branch in branches.values():
-    branchcount = branch.count
-    f           = branch.f
-    t           = branch.t
+  # Pft_k^2 + Qft_k^2 <= limit^2 and Ptf_k^2 + Qtf_k^2 <= limit^2, for every
+  # branch and then period
+  cols  = blockcols(all_data)
+  jj    = np.repeat(np.arange(len(branches)), T)
+  kk    = np.tile(np.arange(T), len(branches))
+  flows = np.stack((cols['Pf'][kk,jj], cols['Qf'][kk,jj],
+                    cols['Pt'][kk,jj], cols['Qt'][kk,jj]), axis = 1).reshape(-1,2)
+  rhs   = np.repeat(all_data['network'].limit[jj]**2, 2)
+
+  names = lambda: [name for branch in branches.values() for k in range(T)
+                   for name in ("limit_f_" + str(branch.count) + "_" + str(branch.f) + "_"
+                                + str(branch.t) + "_" + str(k),
+                                "limit_t_" + str(branch.count) + "_" + str(branch.t) + "_"
+                                + str(branch.f) + "_" + str(k))]
+  counter_limit = len(addquadconstrs(all_data, flows, flows, np.ones(flows.shape),
+                                     rhs, names))
 
-    for k in range(T):
-      constrname = "limit_f_"+str(branchcount)+"_"+str(f)+"_"+str(t)+"_"+str(k)
-      limexp = QuadExpr()
-      limexp += Pvar_f[k][branch]*Pvar_f[k][branch] + Qvar_f[k][branch]*Qvar_f[k][branch]
-      themodel.addConstr(limexp <= branch.limit**2, name = constrname)
+  log.joint('   %d limit inequalities added\n'%counter_limit) 
 
-      constrname = "limit_t_"+str(branchcount)+"_"+str(t)+"_"+str(f)+"_"+str(k)
-      limexp = QuadExpr()
-      limexp += Pvar_t[k][branch]*Pvar_t[k][branch] + Qvar_t[k][branch]*Qvar_t[k][branch]
-      themodel.addConstr(limexp <= branch.limit**2, name = constrname)
+  return counter_limit
 
-      counter_limit += 2
+# Replaces every quadratic generation cost a GenP_k^2 in the objective, see
+# section 2.1 in [1], by a variable z_k bounded by the epigraph constraint
+# z_k >= a GenP_k^2. The epigraph is outer approximated by its tangents at
+# Pmin, Pmax and their midpoint; if 'objective_cuts' is on, more tangents are
+# separated every round. Without quadratic constraints the relaxation is then
+# an LP. Negative quadratic costs are rejected
 
-  log.joint('   %d limit inequalities added\n'%counter_limit) 
+def objective_epigraph(log,all_data):
 
-  return counter_limit
+  themodel  = all_data['themodel']
+  T         = all_data['T']
+  genlist   = list(all_data['gens'].values())
+
+  quadcoeff = np.array([gen.costvector[0] if gen.costdegree == 2 else 0 
+                        for gen in genlist])
+
+  # A negative quadratic cost is concave, it has no epigraph to outer
+  # approximate by tangents
+  for j in np.flatnonzero(quadcoeff < 0).tolist():
+    log.stateandquit(' linear objective: generator ' + str(genlist[j].count)
+                     + ' has negative quadratic cost ' + str(quadcoeff[j]))
+
+  gidx      = np.flatnonzero(quadcoeff > 0)
+  nq        = len(gidx)
+
+  objective = themodel.getObjective()
+  if isinstance(objective, QuadExpr):
+    objective = objective.getLinExpr()
+  themodel.setObjective(objective)
+  themodel.update()
+
+  # Period-major, as in 'blockvars'
+  zvar = list(themodel.addVars(T * nq, lb = 0.0, obj = 1.0).values())
+  themodel.update()
+
+  namevars(all_data,zvar,
+           lambda: ["GPcost_" + str(genlist[j].count) + "_" + str(k)
+                    for k in range(T) for j in gidx.tolist()])
+
+  GenPvars = blockvars(all_data)['GenP'][0]
+  lb       = np.array(themodel.getAttr('LB', GenPvars)).reshape(T,len(genlist))[:,gidx]
+  ub       = np.array(themodel.getAttr('UB', GenPvars)).reshape(T,len(genlist))[:,gidx]
+
+  all_data['epigraph'] = {'zvar'      : zvar,
+                          'zcols'     : np.array([var.index for var in zvar],
+                                                 dtype = int).reshape(T,nq),
+                          'GenPcols'  : blockcols(all_data)['GenP'][:,gidx],
+                          'gens'      : gidx,
+                          'quadcoeff' : quadcoeff[gidx]}
+
+  kk, qq  = np.nonzero(np.ones((T,nq), dtype = bool))
+  counter = 0
+  for points in (lb, 0.5 * (lb + ub), ub):
+    counter += objective_tangents(all_data,kk,qq,points[kk,qq],0)
+
+  log.joint('  linear objective: %d epigraph variables, %d tangents\n' 
+            % (T * nq, counter))
 
 # Prints round statistics of the cutting-plane algorithm
 
@@ -1595,14 +2302,21 @@ def cutplane_stats(log,all_data):
             + ' solver method = ' + str(themodel.params.method) + '\n')
   if themodel.params.method == 2:
     log.joint(' crossover ' + str(themodel.params.crossover) + '\n')
+  if all_data['methodchoice'] is not None:
+    method, reason, predicted = all_data['methodchoice']
+    thisround = all_data['methodhistory'][method]['rounds'][-1]
+    log.joint(' adaptive method = ' + METHODNAMES[method] + ' (' + reason 
+              + ') predicted time = ' + str(predicted) + ' solve time = '
+              + str(thisround[1]) + ' iterations = ' + str(thisround[2])
+              + ' rows added = ' + str(thisround[3]) + '\n')
   log.joint(' BarConvTol = ' + str(themodel.params.BarConvTol) 
             + ' FeasTol = ' + str(themodel.params.FeasibilityTol) 
             + ' OptTol = ' + str(themodel.params.OptimalityTol) + '\n') 
 
   if all_data['optstatus'] == 2 or all_data['optstatus'] == 13:
     log.joint(' max (unscaled/scaled) dual constraint error =\n'
-              + '  ' + str(themodel.DualResidual) + ' / '
-              + str(themodel.DualSResidual) + '\n')
+              + '  ' + str(all_data['dinfs']) + ' / '
+              + str(all_data['dinfs_scaled']) + '\n')
 
   if all_data['addcuts'] and all_data['round'] == 1:
     log.joint(' -- precomputed cuts --\n')
@@ -1777,6 +2491,14 @@ def cutplane_cutstats(log,all_data):
     log.joint(' objective-cuts = %g\n' % all_data['num_objective_cuts'])
     log.joint(' objective-cuts threshold = %g\n' % all_data['threshold_objcuts'])    
 
+  if all_data['hybrid']:
+    log.joint(' -- hybrid --\n')
+    for family in (JABR, I2):
+      log.joint(' ' + FAMILYNAMES[family] + ' inequalities = %d\n'
+                % np.count_nonzero(all_data['hybridcones'][family]))
+      log.joint('  cuts replaced (overall) = %d\n' 
+                % all_data['hybrid_replaced'][family])
+
   log.joint(' ---\n')
   log.joint(' total number of cuts = ' + str(all_data['num_jabr_cuts']
                                              + all_data['num_i2_cuts']
@@ -1785,7 +2507,7 @@ def cutplane_cutstats(log,all_data):
   log.joint(' ************************************************************\n\n') 
 
 
-# Prints cut statistics of the current round of our cutting-plane procedure
+# Computes the cuts of the current round of our cutting-plane procedure
 
 def cutplane_cuts(log,all_data):
 
@@ -1793,6 +2515,133 @@ def cutplane_cuts(log,all_data):
 
   t0_cuts = time.time()
 
+  # If no cuts are added or dropped the model is unchanged, so instead of 
+  # solving it again we separate again, against the same solution, at the
+  # thresholds lowered by the families with no violations. We stop once
+  # cuts appear or no threshold can be lowered anymore, in which case
+  # 'NO_cuts_added' is set
+
+  all_data['NO_cuts_added'] = 0
+  separations               = 0
+
+  # Kernels only depend on the solution, not on the thresholds
+  t0_kernels = time.time()
+  separation.run_kernels(log,all_data)
+  log.joint(' time spent on violation kernels ' + str(time.time() - t0_kernels)
+            + '\n')
+
+  while True:
+    changes    = cutchanges(all_data)
+    thresholds = cutthresholds(all_data)
+
+    cutplane_separate(log,all_data)
+    separations += 1
+
+    if cutchanges(all_data) != changes:
+      break
+
+    if cutthresholds(all_data) == thresholds:
+      all_data['NO_cuts_added'] = 1
+      rejected = cutrejected(all_data)
+      if rejected:
+        log.joint(' no cuts added, all violated ' + ', '.join(rejected)
+                  + '-envelope cuts rejected as parallel to cuts in the pool\n')
+      if all(threshold <= all_data['tolerance'] for threshold in thresholds):
+        log.joint(' no cuts added and all thresholds at tolerance\n')
+      break
+
+    log.joint(' no cuts added, separating again at the lowered thresholds\n')
+
+  flush_cuts(log,all_data)
+
+  if all_data['hybrid']:
+    hybrid_cones(log,all_data)
+
+  t1_cuts = time.time()
+
+  log.joint('\n separation passes ' + str(separations) + '\n')
+  log.joint(' time spent on cuts ' + str(t1_cuts - t0_cuts) + '\n')
+
+
+# Number of cuts added or dropped so far
+
+def cutchanges(all_data):
+
+  changes = (all_data['ID_jabr_cuts'] + all_data['ID_i2_cuts'] 
+             + all_data['ID_limit_cuts'])
+
+  if all_data['linear_objective']:
+    changes += all_data['num_objective_cuts']
+
+  if all_data['jabrcuts']:
+    changes += all_data['total_jabr_dropped']
+  if all_data['i2cuts']:
+    changes += all_data['total_i2_dropped']
+  if all_data['limitcuts']:
+    changes += all_data['total_limit_dropped']
+
+  return changes
+
+
+# Current violation thresholds of the cut families
+
+def cutthresholds(all_data):
+
+  thresholds = []
+
+  if all_data['jabrcuts']:
+    thresholds.append(all_data['threshold'])
+  if all_data['i2cuts']:
+    thresholds.append(all_data['threshold_i2'])
+  if all_data['limitcuts']:
+    thresholds.append(all_data['threshold_limit'])
+
+  return thresholds
+
+
+# Thresholds of the cut families with violations above their threshold in
+# the last separation, or not yet separated
+
+def cutactivethresholds(all_data):
+
+  thresholds = []
+
+  if all_data['jabrcuts'] and not all_data.get('NO_jabrs_violated', 0):
+    thresholds.append(all_data['threshold'])
+  if all_data['i2cuts'] and not all_data.get('NO_i2_cuts_violated', 0):
+    thresholds.append(all_data['threshold_i2'])
+  if all_data['limitcuts'] and not all_data.get('NO_limit_cuts_violated', 0):
+    thresholds.append(all_data['threshold_limit'])
+
+  return thresholds
+
+
+# Cut families with violations above their threshold in the last
+# separation. If none of their cuts was added, all were rejected by
+# 'parallel_check'
+
+def cutrejected(all_data):
+
+  rejected = []
+
+  if all_data['jabrcuts'] and not all_data['NO_jabrs_violated']:
+    rejected.append(FAMILYNAMES[JABR])
+  if all_data['i2cuts'] and not all_data['NO_i2_cuts_violated']:
+    rejected.append(FAMILYNAMES[I2])
+  if all_data['limitcuts'] and not all_data['NO_limit_cuts_violated']:
+    rejected.append(FAMILYNAMES[LIMIT])
+
+  return rejected
+
+
+# Runs the separation of every cut family once, lowering the threshold of
+# the families with no violations. Lazy precomputed cuts are activated first
+
+def cutplane_separate(log,all_data):
+
+  # Precomputed cuts kept aside by 'load_cuts' that are now violated
+  activate_cuts(log,all_data)
+
   t0_jabr = time.time()
 
   if all_data['jabrcuts']:
@@ -1836,10 +2685,11 @@ def cutplane_cuts(log,all_data):
   t1_lim = time.time()
   log.joint(' time spent on lim-cuts ' + str(t1_lim - t0_lim) + '\n')
 
-  
-  t1_cuts = time.time()
-
-  log.joint('\n time spent on cuts ' + str(t1_cuts - t0_cuts) + '\n')
+  if all_data['linear_objective'] and all_data['objective_cuts']:
+    t0_obj = time.time()
+    objective_cuts(log,all_data)
+    log.joint(' time spent on objective-cuts ' + str(time.time() - t0_obj) 
+              + '\n')
 
 
 # Calls our cut management heuristics
@@ -1871,12 +2721,58 @@ def cutplane_cutmanagement(log,all_data):
             + '\n')
 
 
+# Stores the current solution. The values of every block of variables are
+# fetched with a single query into a (T, n) array, kept in 
+# all_data['solarrays'], and dictionaries indexed by time-period and
+# bus/branch/gen are built from them
+
+def storesolution(log,all_data):
+
+  themodel   = all_data['themodel']
+  T          = all_data['T']
+
+  solarrays = {}
+  solviews  = {}
+
+  for block, (varlist, objs) in blockvars(all_data).items():
+    values           = np.array(themodel.getAttr('X', varlist)).reshape(T,len(objs))
+    solarrays[block] = values
+    solviews[block]  = [dict(zip(objs, values[k].tolist())) for k in range(T)]
+
+  all_data['solarrays'] = solarrays
+
+  all_data['Pfvalues']   = {}
+  all_data['Qfvalues']   = {}
+  all_data['Ptvalues']   = {}
+  all_data['Qtvalues']   = {}
+  all_data['cvalues']    = {}
+  all_data['svalues']    = {}
+  all_data['GenPvalues'] = {}
+  all_data['GenQvalues'] = {}
+
+  for k in range(T):
+    all_data['Pfvalues'][k]   = solviews['Pf'][k]
+    all_data['Qfvalues'][k]   = solviews['Qf'][k]
+    all_data['Ptvalues'][k]   = solviews['Pt'][k]
+    all_data['Qtvalues'][k]   = solviews['Qt'][k]
+    all_data['cvalues'][k]    = solviews['cbus'][k]
+    all_data['cvalues'][k].update(solviews['cbr'][k])
+    all_data['svalues'][k]    = solviews['sbr'][k]
+    all_data['GenPvalues'][k] = solviews['GenP'][k]
+    all_data['GenQvalues'][k] = solviews['GenQ'][k]
+
+  if all_data['i2']:
+    all_data['i2fvalues'] = {k: solviews['i2'][k] for k in range(T)}
+
+
 # Optimizes the current model
 
 def cutplane_optimize(log,all_data):
 
   themodel = all_data['themodel']
 
+  cutplane_solvestrategy(log,all_data)
+
   log.joint(' solving model with method ' + str(themodel.params.method) + '\n')
   log.joint(' crossover ' + str(themodel.params.crossover) + '\n')
     
@@ -1897,6 +2793,7 @@ def cutplane_optimize(log,all_data):
 
     log.joint(' writing casename, opt status, and runtime to summary_ws.log\n')
 
+    all_data['writer'].flush()
     summary_ws = open("summary_ws.log","a+") 
     summary_ws.write(' case ' + all_data['casename'] + ' opt_status ' 
                      + str(themodel.status) + ' runtime ' 
@@ -1918,6 +2815,7 @@ def cutplane_optimize(log,all_data):
 
     log.joint(' writing casename, opt status, and runtime to summary_ws.log\n')
 
+    all_data['writer'].flush()
     summary_ws = open("summary_ws.log","a+")                           
     summary_ws.write(' case ' + all_data['casename'] + ' opt_status ' 
                      + str(themodel.status) + ' runtime ' 
@@ -1941,6 +2839,7 @@ def cutplane_optimize(log,all_data):
 
     log.joint(' writing casename, opt status and runtime to summary_ws.log\n')
 
+    all_data['writer'].flush()
     summary_ws = open("summary_ws.log","a+")                            
     summary_ws.write(' case ' + all_data['casename'] + ' opt_status ' 
                      + str(themodel.status) + ' runtime ' 
@@ -1958,13 +2857,232 @@ def cutplane_optimize(log,all_data):
   all_data['optstatus']               = themodel.status
   all_data['solvertime']              = t1_solve - t0_solve
   all_data['cumulative_solver_time'] += (t1_solve - t0_solve)
-  if (themodel.status != GRB.status.NUMERIC):
+  # Residuals are only available for LPs; models with the exact 
+  # inequalities of 'hybrid_cones' are QCPs
+  if (themodel.status != GRB.status.NUMERIC) and not themodel.IsQCP:
     all_data['dinfs']                   = themodel.DualResidual
     all_data['dinfs_scaled']            = themodel.DualSResidual
   else:
     all_data['dinfs'] = -1
     all_data['dinfs_scaled'] = -1
 
+  if all_data['methodchoice'] is not None:
+    recordmethod(all_data)
+
+
+# Round from which the LPs are solved by dual simplex, warm started from 
+# the basis of the previous round. With 'solve_strategy warm' only the 
+# first round is solved by barrier, with 'switch' the first 
+# 'warm_start_round' ones; 'adaptive' chooses the method of every round,
+# see 'choosemethod'
+
+def warmstartround(all_data):
+
+  if all_data['solve_strategy'] == 'warm':
+    return 2
+  elif all_data['solve_strategy'] == 'switch':
+    return all_data['warm_start_round'] + 1
+  else:
+    return math.inf
+
+
+# Sets the algorithm of the current round. The last barrier round runs 
+# crossover, so that there is a basis to start from; later rounds run dual
+# simplex, which Gurobi warm starts from the basis of the previous LP, with
+# the cuts added since then entering with their slacks basic
+
+def cutplane_solvestrategy(log,all_data):
+
+  themodel = all_data['themodel']
+  rnd      = all_data['round']
+
+  if all_data['tolerance_schedule']:
+    cutplane_tolerances(log,all_data)
+
+  # Once 'hybrid_cones' replaced cuts by exact inequalities the model is a
+  # QCP, which Gurobi only solves by barrier, so there is no basis to warm
+  # start from nor a method to choose
+  if all_data['hybrid'] and sum(all_data['hybrid_replaced'].values()):
+    if all_data['solve_strategy'] != 'barrier':
+      log.joint(' the model is a QCP, solving by barrier\n')
+    themodel.Params.Method   = 2
+    all_data['methodchoice'] = None
+    return None
+
+  if all_data['solve_strategy'] == 'adaptive':
+    # Every method leaves a basis for the simplex rounds
+    themodel.Params.Method    = choosemethod(log,all_data)
+    themodel.Params.Crossover = -1
+    return None
+
+  warmrnd  = warmstartround(all_data)
+
+  if rnd == warmrnd - 1:
+    themodel.Params.Crossover = -1
+
+  if rnd < warmrnd:
+    return None
+
+  themodel.Params.Method = 1
+
+
+# Solver tolerances of the current round. They start at 'tolerance_factor'
+# times the largest threshold of the cut families still violated in the
+# last separation, and tighten tenfold per round down to that threshold,
+# so that early LPs are solved loosely and later ones about as accurately
+# as the cuts are separated. Once no family is violated the smallest
+# threshold is used. Never tighter than the configured barconvtol, feastol
+# and opttol; Gurobi does not accept FeasibilityTol and OptimalityTol
+# above 1e-2
+
+def cutplane_tolerances(log,all_data):
+
+  themodel = all_data['themodel']
+  rnd      = all_data['round']
+  active   = cutactivethresholds(all_data)
+
+  if active:
+    threshold = max(active)
+  else:
+    threshold = min(cutthresholds(all_data) or [all_data['threshold']])
+
+  loose = threshold * max(all_data['tolerance_factor'] * 10**(1 - rnd), 1)
+
+  themodel.Params.BarConvTol     = max(all_data['barconvtol'], loose)
+  themodel.Params.FeasibilityTol = min(max(all_data['feastol'], loose), 1e-2)
+  themodel.Params.OptimalityTol  = min(max(all_data['opttol'], loose), 1e-2)
+
+  log.joint(' tolerances BarConvTol = ' + str(themodel.Params.BarConvTol)
+            + ' FeasTol = ' + str(themodel.Params.FeasibilityTol)
+            + ' OptTol = ' + str(themodel.Params.OptimalityTol) + '\n')
+
+
+# Solves the last LP again at the configured tolerances, and with crossover
+# if 'polish_crossover' is on, when 'tolerance_schedule' left them looser
+
+def cutplane_polish(log,all_data):
+
+  themodel = all_data['themodel']
+
+  if (themodel.Params.BarConvTol <= all_data['barconvtol']
+      and themodel.Params.FeasibilityTol <= all_data['feastol']
+      and themodel.Params.OptimalityTol <= all_data['opttol']
+      and not all_data['polish_crossover']):
+    return None
+
+  log.joint(' polishing the last solution ...\n')
+
+  themodel.Params.BarConvTol     = all_data['barconvtol']
+  themodel.Params.FeasibilityTol = all_data['feastol']
+  themodel.Params.OptimalityTol  = all_data['opttol']
+  if all_data['polish_crossover']:
+    themodel.Params.Crossover = -1
+
+  t0_solve = time.time()
+  themodel.optimize()
+  t1_solve = time.time()
+
+  if themodel.status not in (GRB.OPTIMAL, GRB.SUBOPTIMAL):
+    log.joint(' polish solve ended with status ' + str(themodel.status) 
+              + ', keeping the previous solution\n')
+    return None
+
+  all_data['cumulative_solver_time'] += (t1_solve - t0_solve)
+  all_data['objval']                  = themodel.ObjVal
+  all_data['optstatus']               = themodel.status
+
+  storesolution(log,all_data)
+
+  log.joint(' polished objective = ' + str(all_data['objval']) 
+            + ' time = ' + str(t1_solve - t0_solve) + '\n')
+
+
+# Methods tried by 'solve_strategy adaptive'
+METHODNAMES = {0: 'primal simplex', 1: 'dual simplex', 2: 'barrier'}
+
+# Epsilon-greedy choice of the method of the current round: every method is
+# tried once, starting with 'solver_method', then the one with the smallest
+# predicted solve time is chosen, except for a random method with
+# probability 'adaptive_epsilon'. See 'predictmethod' for the predictions
+
+def choosemethod(log,all_data):
+
+  history   = all_data['methodhistory']
+  rowsadded = cutrowsadded(all_data)
+
+  if 'methodrng' not in all_data:
+    all_data['methodrng'] = np.random.default_rng(0)
+
+  untried = [method for method in METHODNAMES if method not in history]
+  untried.sort(key = lambda method: method != all_data['solver_method'])
+
+  predicted = {method: predictmethod(method,record,rowsadded)
+               for method, record in history.items()}
+
+  if untried:
+    method, reason = untried[0], 'untried'
+  elif all_data['methodrng'].random() < all_data['adaptive_epsilon']:
+    method, reason = int(all_data['methodrng'].choice(list(METHODNAMES))), 'explore'
+  else:
+    method, reason = min(predicted, key = predicted.get), 'exploit'
+
+  all_data['methodchoice'] = (method, reason, predicted.get(method))
+
+  log.joint(' adaptive method: ' + METHODNAMES[method] + ' (' + reason + ')\n')
+
+  return method
+
+
+# Predicted solve time of 'method' when 'rowsadded' cut rows were added or
+# dropped since the previous solve. Simplex is warm started, so its
+# iterations grow with the rows changed: the prediction is its time per
+# iteration times its iterations per row changed, times 'rowsadded'.
+# Barrier starts from scratch every round, its prediction is its solve
+# time, as is the prediction of a simplex method not yet solved after row
+# changes. All are exponential averages over the rounds solved with the
+# method
+
+def predictmethod(method,record,rowsadded):
+
+  if method == 2 or 'iterperrow' not in record:
+    return record['time']
+
+  return record['timeperiter'] * record['iterperrow'] * max(rowsadded, 1)
+
+
+# Cut rows added or dropped since the last solve
+
+def cutrowsadded(all_data):
+
+  return cutchanges(all_data) - all_data['cutchanges_lastsolve']
+
+
+# Records the solve time, iterations and cut rows changed since the
+# previous solve of the method used in the current round, and updates the
+# averages used by 'predictmethod'. Rounds without row changes, such as a
+# first round solved with loaded cuts, do not update the iterations per row
+
+def recordmethod(all_data):
+
+  themodel = all_data['themodel']
+  method   = all_data['methodchoice'][0]
+  record   = all_data['methodhistory'].setdefault(method, {'rounds': []})
+  solvetime  = all_data['solvertime']
+  iterations = int(themodel.IterCount) + int(themodel.BarIterCount)
+  rowsadded  = cutrowsadded(all_data)
+
+  record['rounds'].append((all_data['round'], solvetime, iterations, rowsadded))
+
+  averages = {'time': solvetime,
+              'timeperiter': solvetime / max(iterations, 1)}
+  if rowsadded > 0:
+    averages['iterperrow'] = iterations / rowsadded
+
+  for key, value in averages.items():
+    record[key] = value if key not in record else 0.5 * record[key] + 0.5 * value
+
+  all_data['cutchanges_lastsolve'] += rowsadded
+
 
 # Loads a previously computed AC solution
 
@@ -2378,26 +3496,22 @@ def getrampr(log,all_data,loads):
 def getduals(log,all_data):
 
   buses    = all_data['buses']
-  themodel = all_data['themodel']
+  PBaldef  = all_data['PBaldef']
   T        = all_data['T']
   rnd      = all_data['round']
   duals    = {}
   
   for k in range(T):
     for bus in buses.values():
-      nodeID     = bus.nodeID
-      constrname = "PBaldef"+str(bus.nodeID)+"_"+str(k)
-      constr     = themodel.getConstrByName(constrname)
-      dual       = constr.Pi
-      duals[constrname] = dual 
+      duals[(bus.nodeID,k)] = PBaldef[k][bus].Pi
   
   all_data['duals'][rnd] = duals
   
   if rnd > 1:
     sqdiff = 0
     duals_prev = all_data['duals'][rnd-1]
-    for constrname in duals.keys():
-      sqdiff += (duals_prev[constrname] - duals[constrname])**2
+    for key in duals.keys():
+      sqdiff += (duals_prev[key] - duals[key])**2
 
     dual_diff = round(math.sqrt(sqdiff),4)
     all_data['dual_diff'][rnd] = dual_diff
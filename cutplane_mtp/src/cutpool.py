@@ -0,0 +1,267 @@
+###############################################################################
+##                                                                           ##
+## This code was written and is being maintained by Matias Villagra,         ##
+## PhD Student in Operations Research @ Columbia, supervised by              ##
+## Daniel Bienstock.                                                         ##
+##                                                                           ##
+## For code readability, we make references to equations in:                 ##
+## [1] D. Bienstock, and M. Villagra, Accurate Linear Cutting-Plane          ##
+## Relaxations for ACOPF, arXiv:2312.04251v2, 2024                           ##
+##                                                                           ##
+## Please report any bugs or issues to: mjv2153@columbia.edu                 ##
+##                                                                           ##
+## Jul 2024                                                                  ##
+###############################################################################
+
+# Pool with the Jabr, i2 and limit-envelope cuts currently in the model. Cuts
+# are rows of a growable NumPy record array, so that cut management (age and
+# slack filtering, parallel checks) works on whole columns at once. Dropped
+# cuts are marked inactive and removed from the array by 'compact'
+
+import numpy as np
+
+# Cut families
+JABR  = 0
+I2    = 1
+LIMIT = 2
+
+FAMILYNAMES = ('Jabr', 'i2', 'limit')
+
+# A row of the pool. 'coeffs' holds the LHS coefficients of the cut, in the
+# order (cft, sft, cff, ctt), (Pft, Qft, cff, i2ft) and (P, Q) for Jabr, i2 and
+# limit cuts, respectively, and 'normal' the same vector normalized; 'end' is 
+# the side ('f' or 't') of a limit cut
+CUTDTYPE = np.dtype([('cutid', np.int64),
+                     ('family', np.int8),
+                     ('branch', np.int32),
+                     ('period', np.int32),
+                     ('rnd', np.int32),
+                     ('violation', np.float64),
+                     ('threshold', np.float64),
+                     ('coeffs', np.float64, (4,)),
+                     ('normal', np.float64, (4,)),
+                     ('end', 'U1'),
+                     ('constr', object),
+                     ('active', np.bool_)])
+
+
+# Normalizes the rows of an (m, width) array of cut coefficients, padding them
+# to 4 columns, i.e., computes v / || v ||_2 for every row v
+
+def unitnormals(coeffs):
+
+    coeffs  = np.asarray(coeffs, dtype = float)
+    normals = np.zeros((coeffs.shape[0], 4))
+    norms   = np.linalg.norm(coeffs, axis = 1)
+    normals[:, :coeffs.shape[1]] = coeffs / np.where(norms > 0, norms, 1)[:,None]
+
+    return normals
+
+
+class CutPool:
+
+    # If 'hashstep' is given, the pool also keeps a hash table of the normals
+    # of its cuts, rounded to a grid of that step, see 'parallel_hash'
+
+    def __init__(self, capacity = 1024, hashstep = None):
+        self.cuts      = np.zeros(capacity, dtype = CUTDTYPE)
+        self.size      = 0  # rows in use, active or not
+        self.numactive = 0
+        self.hashstep  = hashstep
+        self.hashes    = {}
+
+    def __len__(self):
+        return self.numactive
+
+    # Rows in use; a view, invalidated by 'append' and 'compact'
+
+    def rows(self):
+        return self.cuts[:self.size]
+
+    # Appends m cuts of a family. All arguments but 'family' and 'rnd' are
+    # sequences of length m; 'coeffs' is (m, width) with width <= 4. The
+    # array doubles when full, so appending is O(1) amortized per cut.
+    # Returns the positions of the new rows
+
+    def append(self, family, rnd, cutid, branch, period, violation,
+               threshold, coeffs, constrs, end = 'f'):
+
+        m = len(constrs)
+        if self.size + m > len(self.cuts):
+            capacity = max(len(self.cuts), 1)
+            while capacity < self.size + m:
+                capacity *= 2
+            cuts = np.zeros(capacity, dtype = CUTDTYPE)
+            cuts[:self.size] = self.cuts[:self.size]
+            self.cuts = cuts
+
+        new    = np.arange(self.size, self.size + m)
+        coeffs = np.asarray(coeffs, dtype = float).reshape(m, -1)
+        cuts   = self.cuts
+
+        cuts['cutid'][new]     = cutid
+        cuts['family'][new]    = family
+        cuts['branch'][new]    = branch
+        cuts['period'][new]    = period
+        cuts['rnd'][new]       = rnd
+        cuts['violation'][new] = violation
+        cuts['threshold'][new] = threshold
+        cuts['coeffs'][new]    = 0
+        cuts['coeffs'][new, :coeffs.shape[1]] = coeffs
+        cuts['normal'][new]    = unitnormals(coeffs)
+        cuts['end'][new]       = end
+        cuts['active'][new]    = True
+        for row, constr in zip(new.tolist(), constrs):
+            cuts['constr'][row] = constr
+
+        if self.hashstep:
+            for key in self.hashkeys(new):
+                self.hashes[key] = self.hashes.get(key, 0) + 1
+
+        self.size      += m
+        self.numactive += m
+
+        return new
+
+    # Positions of the active cuts of a family, in the order they were added,
+    # optionally restricted to a time-period, branch index and end
+
+    def select(self, family, period = None, branch = None, end = None):
+
+        cuts = self.rows()
+        mask = cuts['active'] & (cuts['family'] == family)
+        if period is not None:
+            mask &= cuts['period'] == period
+        if branch is not None:
+            mask &= cuts['branch'] == branch
+        if end is not None:
+            mask &= cuts['end'] == end
+
+        return np.flatnonzero(mask)
+
+    # Active cuts of a family that are older than 'agelimit' rounds at
+    # round 'rnd'
+
+    def aged(self, family, rnd, agelimit):
+
+        rows = self.select(family)
+
+        return rows[rnd - self.cuts['rnd'][rows] > agelimit]
+
+    # Cuts in 'rows' whose slack, given in the same order, exceeds their
+    # threshold
+
+    def slack(self, rows, slacks):
+        return rows[np.asarray(slacks) > self.cuts['threshold'][rows]]
+
+    def constrs(self, rows):
+        return self.cuts['constr'][rows].tolist()
+
+    # Checks which of m candidate cuts of a family are parallel to an active
+    # cut of the same time-period, branch and end, i.e., the dot-product of
+    # their normals exceeds 1 - threshold_dotprod. All the (candidate,
+    # incumbent) pairs are found by sorting and compared at once. Returns a
+    # boolean array of length m
+
+    def parallel(self, family, period, branch, end, coeffs, threshold_dotprod):
+
+        m        = len(period)
+        parallel = np.zeros(m, dtype = bool)
+        rows     = self.select(family)
+
+        if m == 0 or len(rows) == 0:
+            return parallel
+
+        cuts    = self.cuts
+        period  = np.asarray(period)
+        branch  = np.asarray(branch)
+        end     = np.broadcast_to(np.asarray(end), (m,))
+        maxbr   = max(int(cuts['branch'][rows].max()), int(branch.max()))
+
+        def keys(p, b, e):
+            return ((p.astype(np.int64) * (maxbr + 1) + b) * 2 + (e == 't'))
+
+        poolkeys = keys(cuts['period'][rows], cuts['branch'][rows], cuts['end'][rows])
+        order    = np.argsort(poolkeys, kind = 'stable')
+        poolkeys = poolkeys[order]
+        rows     = rows[order]
+
+        candkeys = keys(period, branch, end)
+        lo       = np.searchsorted(poolkeys, candkeys, side = 'left')
+        counts   = np.searchsorted(poolkeys, candkeys, side = 'right') - lo
+        total    = int(counts.sum())
+
+        if total == 0:
+            return parallel
+
+        # Pairs (candidate, incumbent) with the same key
+        cand    = np.repeat(np.arange(m), counts)
+        offset  = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        inc     = rows[np.repeat(lo, counts) + offset]
+        dotprod = np.einsum('ij,ij->i', cuts['normal'][inc], unitnormals(coeffs)[cand])
+
+        parallel[cand[dotprod > 1 - threshold_dotprod]] = True
+
+        return parallel
+
+    # Approximate version of 'parallel' in O(1) per candidate: a candidate is 
+    # rejected if an active cut of the same time-period, branch and end has 
+    # its normal in the same cell of a grid of step 'hashstep'. Normals in
+    # the same cell have a dot-product of at least 1 - 2 * hashstep**2
+
+    def parallel_hash(self, family, period, branch, end, coeffs):
+
+        m       = len(period)
+        end     = np.broadcast_to(np.asarray(end), (m,))
+        normals = unitnormals(coeffs)
+
+        return np.array([self.hashkey(family, k, j, e, normal) in self.hashes
+                         for k, j, e, normal in zip(np.asarray(period).tolist(),
+                                                    np.asarray(branch).tolist(),
+                                                    end.tolist(), normals)],
+                        dtype = bool)
+
+    def hashkey(self, family, period, branch, end, normal):
+        return (family, period, branch, end,
+                tuple(np.floor(normal / self.hashstep).astype(int).tolist()))
+
+    def hashkeys(self, rows):
+        cuts = self.cuts[rows]
+        return [self.hashkey(int(cut['family']), int(cut['period']),
+                             int(cut['branch']), str(cut['end']), cut['normal'])
+                for cut in cuts]
+
+    # Marks cuts as dropped and releases their handles. The rows are reclaimed
+    # by 'compact' once dropped cuts are at least half of the pool
+
+    def drop(self, rows):
+
+        rows = rows[self.cuts['active'][rows]]
+
+        if self.hashstep:
+            for key in self.hashkeys(rows):
+                self.hashes[key] -= 1
+                if self.hashes[key] == 0:
+                    del self.hashes[key]
+
+        self.cuts['active'][rows] = False
+        self.cuts['constr'][rows] = None
+        self.numactive           -= len(rows)
+
+        if 2 * self.numactive <= self.size:
+            self.compact()
+
+    # Removes the dropped cuts, keeping the order of the remaining ones.
+    # Positions previously returned by the pool are no longer valid
+
+    def compact(self):
+
+        live     = self.rows()[self.rows()['active']]
+        capacity = len(self.cuts)
+        while capacity > 1024 and 4 * len(live) < capacity:
+            capacity //= 2
+
+        cuts            = np.zeros(capacity, dtype = CUTDTYPE)
+        cuts[:len(live)] = live
+        self.cuts       = cuts
+        self.size       = len(live)
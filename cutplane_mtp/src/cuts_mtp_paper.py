@@ -20,36 +20,419 @@ import math
 from json import dumps
 from gurobipy import *
 import numpy as np
-from numpy import linalg as LA
+import scipy.sparse as sp
+from cutpool import *
+import cutstore
 
-# Normalizes a vector v using the Euclidean norm, i.e., computes v / || v ||_2
+# Computes, for every time-period and branch at once, the violation of the
+# Jabr inequality and the coefficients of the corresponding Jabr-envelope
+# cut, see inequality (21) in [1]. Takes (T, nbus) and (T, nbranch) arrays
+# with the current values of c_kk, c_km and s_km, and the position of the 
+# 'from' and 'to' bus of every branch. Returns (T, nbranch) arrays with
+# the violations and cutnorms, and a (T, nbranch, 4) array with the 
+# coefficients of c_km, s_km, c_kk and c_mm
 
-def compute_normal(*args):
-    n = len(args)
-    v = np.zeros(n,dtype = 'float')
-    for i in range(n):
-        v[i] = args[i]
+def jabr_kernel(cbus,cbr,sbr,fidx,tidx):
 
-    norm = LA.norm(v)
+    cff       = cbus[:,fidx]
+    ctt       = cbus[:,tidx]
+    violation = cbr*cbr + sbr*sbr - cff*ctt
 
-    if norm == 0:
-        log.joint(' BUG: check vector (cut)\n')
-        breakexit(' Check cut')
-    return v / norm
+    cutnorm   = np.sqrt( (2 * cbr)**2 + (2 * sbr)**2 + (cff - ctt)**2 )
+    coeffs    = np.stack((4 * cbr, 4 * sbr, cff - ctt - cutnorm,
+                          - (cff - ctt) - cutnorm), axis = 2)
 
-# Computes the cut coefficients and cutnorm, see inequality (21) in [1]
+    return violation, cutnorm, coeffs
 
-def compute_coeffs_cutnorm(cft,sft,cff,ctt):
+# Same as 'jabr_kernel' for the i2 inequalities and i2-envelope cuts, see
+# inequality (23) in [1], over the branches in 'i2idx'. Takes (T, nbranch)
+# arrays with the current values of P_km and Q_km, and a (T, len(i2idx))
+# array with the values of i2_km. The coefficients are those of P_km, Q_km,
+# c_kk and i2_km
 
-    v = np.zeros(4,dtype = 'float')
-    
-    cutnorm   = math.sqrt( (2 * cft)**2 + (2 * sft)**2 + (cff - ctt)**2 )
-    coeff_cft = 4 * cft
-    coeff_sft = 4 * sft
-    coeff_cff = cff - ctt - cutnorm
-    coeff_ctt = - (cff - ctt) - cutnorm
+def i2_kernel(Pf,Qf,cbus,i2f,fidx,i2idx):
+
+    Pft       = Pf[:,i2idx]
+    Qft       = Qf[:,i2idx]
+    cff       = cbus[:,fidx[i2idx]]
+    violation = Pft*Pft + Qft*Qft - cff * i2f
+
+    cutnorm   = np.sqrt( (2 * Pft)**2 + (2 * Qft)**2 + (cff - i2f)**2 )
+    coeffs    = np.stack((4 * Pft, 4 * Qft, cff - i2f - cutnorm,
+                          - (cff - i2f) - cutnorm), axis = 2)
+
+    return violation, cutnorm, coeffs
+
+# Same as 'jabr_kernel' for the limit inequalities and limit-envelope cuts,
+# see inequality (24) in [1], at both ends of the branches in 'lidx'. Takes 
+# (T, nbranch) arrays with the current values of P_km, Q_km, P_mk and Q_mk,
+# and the branch limits. Columns j and len(lidx) + j of the returned arrays
+# correspond to the 'from' and 'to' end of branch lidx[j]; the coefficients
+# are those of P and Q, the RHS of the cuts being 1
+
+def limit_kernel(Pf,Qf,Pt,Qt,limit,lidx):
+
+    P         = np.concatenate((Pf[:,lidx], Pt[:,lidx]), axis = 1)
+    Q         = np.concatenate((Qf[:,lidx], Qt[:,lidx]), axis = 1)
+    u         = np.tile(limit[lidx], 2)
+    u2        = u**2
+    violation = P*P + Q*Q - u2
+
+    t0        = 1 / (u * np.sqrt(np.maximum(violation + u2, 0)))
+    coeffs    = np.stack((t0 * P, t0 * Q), axis = 2)
+
+    return violation, coeffs
+
+# Returns the positions of the 'num' largest entries of 'values', sorted
+# by decreasing value (ties by position). Uses a partial sort, so only the 
+# selected entries get sorted
+
+def top_idx(values,num):
+
+    if num <= 0:
+        return np.zeros(0, dtype = int)
+
+    if num < len(values):
+        idx = np.argpartition(-values, num-1)[:num]
+    else:
+        idx = np.arange(len(values))
+
+    return idx[np.lexsort((idx, -values[idx]))]
+
+# Returns, for every time-period, the positions of the most violated entries
+# of 'violation' above 'threshold', sorted by decreasing violation. How many
+# are selected depends on 'budget' (config option 'most_violated_budget'):
+#  'shared' : each period takes up to 'fraction' of the violations of all
+#             periods
+#  'global' : 'fraction' of the violations of all periods, the most 
+#             violated ones regardless of their period
+#  'period' : each period takes 'fraction' of its own violations
+
+def most_violated_idx(violation,threshold,fraction,budget):
+
+    T             = violation.shape[0]
+    violated      = violation > threshold
+    most_violated = {}
+
+    if budget == 'global':
+        flat     = np.flatnonzero(violated)
+        selected = flat[top_idx(violation.ravel()[flat],
+                                math.ceil(len(flat) * fraction))]
+        periods  = selected // violation.shape[1]
+        for k in range(T):
+            most_violated[k] = selected[periods == k] % violation.shape[1]
+        return most_violated
+
+    num_selected = math.ceil(np.count_nonzero(violated) * fraction)
+
+    for k in range(T):
+        candidates = np.flatnonzero(violated[k])
+        if budget == 'period':
+            num_selected = math.ceil(len(candidates) * fraction)
+        most_violated[k] = candidates[top_idx(violation[k,candidates],
+                                              num_selected)]
+
+    return most_violated
+
+# Names of the cuts as they appear in .lp files. If 'names' is off, cuts are
+# added unnamed and these are only used by 'name_cuts' right before writing
+# an .lp file
+
+def jabr_cutname(cutid,branch,rnd,k):
+    return "jabr_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(branch.f)+"_"+str(branch.t)
+
+def i2_cutname(cutid,branch,rnd,k):
+    return "i2_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(branch.f)+"_"+str(branch.t)
+
+def limit_cutname(cutid,branch,rnd,k,from_or_to):
+    if from_or_to == 'f':
+        return "limit_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(branch.f)+"_"+str(branch.t)
+    else:
+        return "limit_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(branch.t)+"_"+str(branch.f)
+
+def objective_cutname(cutid,gen,rnd,k):
+    return "objective_cut_"+str(cutid)+"_"+str(gen.count)+"r_"+str(rnd)+"k_"+str(k)
+
+# Names all the cuts currently in the model, using the handles kept in the
+# cut pool. The formulation is written before the pool is created
+
+def name_cuts(log,all_data):
+
+    if 'cutpool' not in all_data:
+        return
+
+    themodel   = all_data['themodel']
+    pool       = all_data['cutpool']
+    branchlist = list(all_data['branches'].values())
+    cuts       = pool.rows()[pool.rows()['active']]
+    names      = []
+
+    for cutid, family, j, k, rnd, end in zip(cuts['cutid'].tolist(),
+                                             cuts['family'].tolist(),
+                                             cuts['branch'].tolist(),
+                                             cuts['period'].tolist(),
+                                             cuts['rnd'].tolist(),
+                                             cuts['end'].tolist()):
+        branch = branchlist[j]
+        if family == JABR:
+            names.append(jabr_cutname(cutid,branch,rnd,k))
+        elif family == I2:
+            names.append(i2_cutname(cutid,branch,rnd,k))
+        else:
+            names.append(limit_cutname(cutid,branch,rnd,k,end))
+
+    if len(names):
+        themodel.setAttr("ConstrName", cuts['constr'].tolist(), names)
+
+    log.joint(' named ' + str(len(names)) + ' cuts\n')
+
+# Period-major lists with the variables of the blocks of variables appearing
+# in cuts, together with the buses/branches/gens they are indexed by
+
+def blockvars(all_data):
+
+    if 'blockvars' in all_data:
+        return all_data['blockvars']
+
+    T          = all_data['T']
+    cvar       = all_data['cvar']
+    buslist    = list(all_data['buses'].values())
+    branchlist = list(all_data['branches'].values())
+    genlist    = list(all_data['gens'].values())
+    blocks     = {'cbus' : (cvar, buslist), 
+                  'cbr'  : (cvar, branchlist),
+                  'sbr'  : (all_data['svar'], branchlist),
+                  'Pf'   : (all_data['Pvar_f'], branchlist),
+                  'Pt'   : (all_data['Pvar_t'], branchlist),
+                  'Qf'   : (all_data['Qvar_f'], branchlist),
+                  'Qt'   : (all_data['Qvar_t'], branchlist),
+                  'GenP' : (all_data['GenPvar'], genlist),
+                  'GenQ' : (all_data['GenQvar'], genlist)}
+
+    if all_data['i2']:
+        i2var_f      = all_data['i2var_f']
+        blocks['i2'] = (i2var_f, list(i2var_f[0].keys()))
+
+    all_data['blockvars'] = {block: ([var[k][obj] for k in range(T) for obj in objs],
+                                     objs)
+                             for block, (var, objs) in blocks.items()}
+
+    return all_data['blockvars']
+
+# (T, n) arrays with the model columns of the variables of every block in 
+# 'blockvars'
+
+def blockcols(all_data):
+
+    if 'blockcols' in all_data:
+        return all_data['blockcols']
+
+    T = all_data['T']
+
+    # Blocks of 'formulation_matrix' are contiguous and period-major
+    if 'varlayout' in all_data:
+        layout = all_data['varlayout']
+        blocks = ['cbus', 'cbr', 'sbr', 'Pf', 'Pt', 'Qf', 'Qt', 'GenP', 'GenQ']
+        if all_data['i2']:
+            blocks.append('i2')
+        all_data['blockcols'] = {block: layout[block][0]
+                                 + np.arange(T * layout[block][1]).reshape(T,layout[block][1])
+                                 for block in blocks}
+    else:
+        all_data['blockcols'] = {block: np.array([var.index for var in varlist],
+                                                 dtype = int).reshape(T,len(objs))
+                                 for block, (varlist, objs) 
+                                 in blockvars(all_data).items()}
+
+    return all_data['blockcols']
+
+# Adds the cuts 
+#    sum_j vals[i,j] x[cols[i,j]] <= rhs[i] 
+# with a single call to addMConstr, and returns their handles. 'cols' and 
+# 'vals' are (m, width) arrays
+
+def add_cutrows(all_data,cols,vals,rhs):
+
+    themodel = all_data['themodel']
+    m, width = cols.shape
+
+    if m == 0:
+        return []
+
+    A = sp.csr_matrix((np.asarray(vals, dtype = float).ravel(), cols.ravel(),
+                       np.arange(0, m * width + 1, width)),
+                      shape = (m, themodel.NumVars))
+    A.sum_duplicates()
+
+    return themodel.addMConstr(A, None, GRB.LESS_EQUAL, 
+                               np.asarray(rhs, dtype = float)).tolist()
+
+# Names cuts added by 'add_cutrows'; 'names' is a list of (namefunction, 
+# args) pairs. If 'names' is off, cuts tracked in the cut pool are named by
+# 'name_cuts', the others are named lazily
+
+def name_cutrows(all_data,constrs,names,tracked):
+
+    if all_data['names']:
+        all_data['themodel'].setAttr("ConstrName", constrs,
+                                     [name[0](*name[1]) for name in names])
+    elif not tracked and len(constrs):
+        all_data['lazynames'].append(("ConstrName", constrs, 
+                                      lambda: [name[0](*name[1]) for name in names]))
 
-    return v,cutnorm
+# A batch of cuts, all with the same number of variables, to be added with
+# 'add_cutbatch'
+
+def new_cutbatch():
+    return {'cols': [], 'vals': [], 'rhs': [], 'names': []}
+
+# Pushes to a batch the cuts given by the rows of 'cols' and the names
+# 'names'; 'vals' and 'rhs' are broadcast to all of them
+
+def push_cuts(batch,cols,vals,rhs,names):
+
+    m = cols.shape[0]
+    batch['cols'].append(cols)
+    batch['vals'].append(np.broadcast_to(np.asarray(vals, dtype = float), 
+                                         cols.shape))
+    batch['rhs'].append(np.full(m, rhs, dtype = float))
+    batch['names'].extend(names)
+
+def add_cutbatch(all_data,batch,tracked):
+
+    if len(batch['rhs']) == 0:
+        return []
+
+    constrs = add_cutrows(all_data, np.concatenate(batch['cols']),
+                          np.concatenate(batch['vals']),
+                          np.concatenate(batch['rhs']))
+    name_cutrows(all_data,constrs,batch['names'],tracked)
+
+    return constrs
+
+# Queues m cuts of a family found by a separator, see 'CutPool.append' for
+# the arguments; 'cols' is an (m, width) array with the columns of their
+# variables and 'rhs' their RHS
+
+def queue_cuts(all_data,family,rnd,cutid,branch,period,violation,threshold,
+               coeffs,cols,rhs,names,end = 'f'):
+
+    all_data['cutqueue'].append({'family': family, 'rnd': rnd, 'cutid': cutid,
+                                 'branch': branch, 'period': period,
+                                 'violation': violation, 'threshold': threshold,
+                                 'coeffs': coeffs, 'cols': cols,
+                                 'rhs': np.full(len(cols), rhs, dtype = float),
+                                 'names': names, 'end': end})
+
+# Adds all the queued cuts to the model with a single call to 'add_cutrows',
+# and to the cut pool. Cuts with fewer variables are padded repeating their
+# first column with a zero coefficient
+
+def flush_cuts(log,all_data):
+
+    queue = all_data['cutqueue']
+
+    if len(queue) == 0:
+        return None
+
+    width = max(cut['cols'].shape[1] for cut in queue)
+    cols  = []
+    vals  = []
+
+    for cut in queue:
+        pad = width - cut['cols'].shape[1]
+        cols.append(np.hstack((cut['cols'], np.repeat(cut['cols'][:,:1], pad, axis = 1))))
+        vals.append(np.hstack((cut['coeffs'], np.zeros((len(cut['cols']), pad)))))
+
+    constrs = add_cutrows(all_data,np.concatenate(cols),np.concatenate(vals),
+                          np.concatenate([cut['rhs'] for cut in queue]))
+
+    start = 0
+    for cut in queue:
+        end    = start + len(cut['cols'])
+        all_data['cutpool'].append(cut['family'],cut['rnd'],cut['cutid'],
+                                   cut['branch'],cut['period'],cut['violation'],
+                                   cut['threshold'],cut['coeffs'],
+                                   constrs[start:end],cut['end'])
+        if all_data['hybrid'] and cut['family'] in all_data['hybridcounts']:
+            np.add.at(all_data['hybridcounts'][cut['family']],
+                      (cut['period'],cut['branch']),1)
+        start  = end
+
+    name_cutrows(all_data,constrs,[name for cut in queue for name in cut['names']],
+                 True)
+
+    all_data['cutqueue'] = []
+
+    log.joint(' added ' + str(len(constrs)) + ' cuts to the model\n')
+
+# Adaptive hybrid mode: once 'hybrid_cut_limit' cuts of a family have been
+# added for a branch and time-period, its cuts are replaced by the exact 
+# Jabr inequality, see equation (1l) in [1], or i2 inequality, see equation
+# (9) in [1]. Both are rotated cones, so the model stays convex; they are
+# not separated anymore, see 'hybrid_mask'
+
+def hybrid_cones(log,all_data):
+
+    themodel   = all_data['themodel']
+    pool       = all_data['cutpool']
+    limit      = all_data['hybrid_cut_limit']
+    branchlist = list(all_data['branches'].values())
+    fidx       = all_data['branch_fidx']
+    tidx       = all_data['branch_tidx']
+    blocks     = blockvars(all_data)
+
+    # Variable of a block at time-period k and position j
+    def var(block,k,j):
+        varlist, objs = blocks[block]
+        return varlist[k * len(objs) + j]
+
+    for family, prefix in ((JABR, 'jabr_'), (I2, 'i2_')):
+        cones  = all_data['hybridcones'][family]
+        newcones = (all_data['hybridcounts'][family] >= limit) & ~cones
+        kk, bb = np.nonzero(newcones)
+
+        if len(kk) == 0:
+            continue
+
+        # All the cuts of the new cones are removed at once
+        rows   = pool.select(family)
+        cuts   = pool.rows()[rows]
+        rows   = rows[newcones[cuts['period'], cuts['branch']]]
+        themodel.remove(pool.constrs(rows))
+        pool.drop(rows)
+
+        for k, b in zip(kk.tolist(), bb.tolist()):
+            branch = branchlist[b]
+            if family == JABR:
+                lhs = (var('cbr',k,b) * var('cbr',k,b) + var('sbr',k,b) * var('sbr',k,b)
+                       - var('cbus',k,fidx[b]) * var('cbus',k,tidx[b]))
+            else:
+                j   = int(np.searchsorted(all_data['i2idx'], b))
+                lhs = (var('Pf',k,b) * var('Pf',k,b) + var('Qf',k,b) * var('Qf',k,b)
+                       - var('cbus',k,fidx[b]) * var('i2',k,j))
+            themodel.addQConstr(lhs <= 0, name = prefix + str(branch.count) + "_"
+                                + str(branch.f) + "_" + str(branch.t) + "_" + str(k))
+
+        cones[kk,bb] = True
+
+        name = FAMILYNAMES[family]
+        all_data['num_' + name.lower() + '_cuts'] -= len(rows)
+        all_data['hybrid_replaced'][family]       += len(rows)
+
+        log.joint(' hybrid: ' + str(len(kk)) + ' ' + name + ' inequalities replace '
+                  + str(len(rows)) + ' cuts\n')
+
+# Violations of a family, computed by its kernel, with the entries of the
+# branches and time-periods turned conic by 'hybrid_cones' masked out. 
+# 'bidx' are the branches of the columns of 'violations'
+
+def hybrid_mask(all_data,family,violations,bidx):
+
+    if not all_data['hybrid']:
+        return violations
+
+    return np.where(all_data['hybridcones'][family][:,bidx], -np.inf, violations)
 
 def drop_loss(log,all_data):
     
@@ -65,32 +448,24 @@ def drop_loss(log,all_data):
     loss_cuts     = all_data['loss_cuts']
     dropped_loss  = all_data['dropped_loss']
     
-    drop_loss     = []
-
-    for branch in loss_cuts.keys():
-        cut         = loss_cuts[branch]
-        cut_rnd     = cut[0]
-        cut_age     = rnd - cut_rnd
-
-        if (cut_age == 0):
-            log.joint(' branch ' + str(branch.count) + 'skipped \n')
-            continue #cut new born, skip                                                                                    
-        branchcount = branch.count 
-        f           = branch.f
-        t           = branch.t
-        constrname  = "loss_ineq_"+str(branchcount)+"_"+str(f)+"_"+str(t)
-        constr      = themodel.getConstrByName(constrname)
-        slack       = constr.getAttr("slack")
-
-        if ( slack < - threshold ) and (cut_age > cut_age_limit):
-            drop_loss.append(branch)
-            themodel.remove(themodel.getConstrByName(constrname))
-            if all_data['loud_cuts']:
+    # Slacks of the loss inequalities which are not new, fetched in a single
+    # call using the handles kept in 'loss_cuts'
+    candidates = [branch for branch in loss_cuts.keys()
+                  if rnd - loss_cuts[branch][0] > 0]
+    slacks     = themodel.getAttr("Slack", [loss_cuts[branch][3]
+                                            for branch in candidates])
+    drop_loss  = [branch for branch, slack in zip(candidates,slacks)
+                  if ( slack < - threshold ) and 
+                  (rnd - loss_cuts[branch][0] > cut_age_limit)]
+
+    if len(drop_loss):
+        themodel.remove([loss_cuts[branch][3] for branch in drop_loss])
+        if all_data['loud_cuts']:
+            for branch in drop_loss:
                 log.joint('  --> removed loss-cut\n')
-                log.joint('  the cut ' + str(key)
+                log.joint('  the cut at branch ' + str(branch.count)
                           + ' was removed from the model\n')
             
-            
     num_drop_loss = len(drop_loss)
     
     if num_drop_loss:
@@ -118,26 +493,15 @@ def i2_cuts(log,all_data):
     log.joint('\n')
     log.joint(' **** i2-cuts ****\n')
 
-    themodel       = all_data['themodel']
     IDtoCountmap   = all_data['IDtoCountmap']
     buses          = all_data['buses']
     branches       = all_data['branches']
     FeasibilityTol = all_data['FeasibilityTol']
     T              = all_data['T']
-    
-    cvar      = all_data['cvar']
-    Pvar_f    = all_data['Pvar_f']
-    Qvar_f    = all_data['Qvar_f']
-    i2var_f   = all_data['i2var_f']
-
-    #### CHANGE Do this once!
-    alphadic  = all_data['alphadic']
-    goodi2s   = {}
-    for branch in branches.values():
-        if alphadic[branch] < all_data['rho_threshold']:
-            goodi2s[branch.count] = branch
-
-    #####
+
+    # Positions of the branches with an i2 variable, computed by 'i2_def'
+    i2idx      = all_data['i2idx']
+    branchlist = list(branches.values())
     
     Pfvalues  = all_data['Pfvalues']
     Qfvalues  = all_data['Qfvalues']
@@ -145,39 +509,25 @@ def i2_cuts(log,all_data):
     i2fvalues = all_data['i2fvalues']
 
     rnd                      = all_data['round']
-    i2_cuts                  = all_data['i2_cuts']
-    i2_cuts_info             = all_data['i2_cuts_info']
     num_cuts                 = all_data['ID_i2_cuts']
     threshold                = all_data['threshold_i2']
-    violated                 = {}
-    violated_count           = 0
-    num_i2_cuts_added        = 0
-    most_violated            = {}
-    
-    for k in range(T):
-        violated[k] = {}
         
     all_data['NO_i2_cuts_violated'] = 0
     
     log.joint(' checking for violations of i2 inequalities ... \n')
-    for branch in goodi2s.values():
-        
-        f = branch.f
-        t = branch.t
-        count_of_f = IDtoCountmap[f]
-        count_of_t = IDtoCountmap[t]
 
-        for k in range(T):
-            violation = Pfvalues[k][branch]*Pfvalues[k][branch] + Qfvalues[k][branch]*Qfvalues[k][branch] - cvalues[k][buses[count_of_f]] * i2fvalues[k][branch]
-            #violation = max(violation_f,violation_t)
-            if violation > threshold:
-                if all_data['loud_cuts']:
-                    log.joint('  violation ' + str(violation) + ' at branch '
-                              + str(branch.count) + ' time-period ' + str(k)  + ' f '
-                              + str(f) + ' t ' + str(t) + ' i2 value '
-                              + str(i2fvalues[k][branch]) + '\n')
-                violated_count  += 1
-                violated[k][branch] = violation
+    # Computed by 'run_kernels' in module separation
+    violations, cutnorms, coeffs = all_data['kernels'][I2]
+    violations = hybrid_mask(all_data,I2,violations,i2idx)
+    violated_count = int(np.count_nonzero(violations > threshold))
+
+    if all_data['loud_cuts']:
+        for n, k in np.argwhere(violations.T > threshold).tolist():
+            branch = branchlist[i2idx[n]]
+            log.joint('  violation ' + str(violations[k,n]) + ' at branch '
+                      + str(branch.count) + ' time-period ' + str(k)  + ' f '
+                      + str(branch.f) + ' t ' + str(branch.t) + ' i2 value '
+                      + str(i2fvalues[k][branch]) + '\n')
 
     if violated_count == 0:
         all_data['NO_i2_cuts_violated'] = 1
@@ -189,63 +539,61 @@ def i2_cuts(log,all_data):
 
     log.joint(' sorting most violated i2-envelope cuts ...\n')
 
-    num_selected        =  math.ceil(violated_count * all_data['most_violated_fraction_i2'] )
+    most_violated = most_violated_idx(violations,threshold,
+                                      all_data['most_violated_fraction_i2'],
+                                      all_data['most_violated_budget'])
 
-    for k in range(T):
-        most_violated[k] = dict(sorted(violated[k].items(),
-                                       key = lambda x: x[1],
-                                       reverse = True)[:num_selected])
+    # Values of i2 at the AC solution, for the validity checks
+    if all_data['i2_validity']:
+        sol_i2fvalues = compute_sol_i2values(all_data,i2idx)
 
     log.joint(' computing i2-envelope cuts ... \n')
 
+    if all_data['parallel_check']:
+        parallel = parallel_check(log,all_data,I2,most_violated,coeffs,i2idx)
+
     most_violated_count  = 0
     most_violated_branch = 'none'
     max_error            = -1
+    newcuts              = []
 
     for k in range(T):
-        numkcuts = 0
-        for branch in most_violated[k].keys():
+        numkcuts  = 0
+        selected  = most_violated[k]
+        kviol     = violations[k,selected].tolist()
+        kcutnorm  = cutnorms[k,selected].tolist()
+        kcoeffs   = coeffs[k,selected].tolist()
+        for n, j in enumerate(selected.tolist()):
+            branch = branchlist[i2idx[j]]
             if (most_violated_count == 0):
-                if most_violated[k][branch] > max_error:
+                if kviol[n] > max_error:
                     most_violated_branch = 'branch ' + str(branch.count) + ' f ' + str(branch.f) + ' t ' + str(branch.t) + ' k ' + str(k)
-                    max_error = most_violated[k][branch]
-
-                
-            f                    = branch.f
-            t                    = branch.t
-            count_of_f           = IDtoCountmap[f]
-            count_of_t           = IDtoCountmap[t]
-            Pft                  = Pfvalues[k][branch]
-            Qft                  = Qfvalues[k][branch]
-            cff                  = cvalues[k][buses[count_of_f]]
-            i2ft                 = i2fvalues[k][branch]
-
-            cutnorm    = math.sqrt( (2 * Pft)**2 + (2 * Qft)**2 + (cff - i2ft)**2 )
-            coeff_Pft  = 4 * Pft
-            coeff_Qft  = 4 * Qft
-            coeff_cff  = cff - i2ft - cutnorm
-            coeff_i2ft = - (cff - i2ft) - cutnorm
-
-            if all_data['parallel_check']:
-                if parallel_check_i2(log,all_data,branch,coeff_Pft,coeff_Qft,
-                                     coeff_cff,coeff_i2ft,k):
-                    continue
+                    max_error = kviol[n]
+
+            coeff_Pft, coeff_Qft, coeff_cff, coeff_i2ft = kcoeffs[n]
+
+            if all_data['parallel_check'] and parallel[k][n]:
+                continue
 
             most_violated_count += 1
-            violation            = most_violated[k][branch]
+            violation            = kviol[n]
             cutid                = num_cuts + most_violated_count
 
             if all_data['loud_cuts']:
+                Pft  = Pfvalues[k][branch]
+                Qft  = Qfvalues[k][branch]
+                cff  = cvalues[k][buses[IDtoCountmap[branch.f]]]
+                i2ft = i2fvalues[k][branch]
                 log.joint('  --> new i2-cut\n')
                 log.joint('  branch ' + str(branch.count) + ' time-period ' + str(k)
-                          + ' f ' + str(f) + ' t ' + str(t) + ' violation '
+                          + ' f ' + str(branch.f) + ' t ' + str(branch.t) + ' violation '
                           + str(violation) + ' cut id ' + str(cutid) + '\n' )
                 log.joint('  values ' + ' Pft ' + str(Pft) + ' Qft ' + str(Qft) 
                           + ' cff ' + str(cff) + ' i2ft ' + str(i2ft) + '\n' )
                 log.joint('  LHS coeff ' + ' Pft ' + str(coeff_Pft) + ' Qft ' 
                           + str(coeff_Qft) + ' cff ' + str(coeff_cff) + ' i2ft ' 
                           + str(coeff_i2ft) + '\n' )
-                log.joint('  cutnorm ' + str(cutnorm) + '\n')
+                log.joint('  cutnorm ' + str(kcutnorm[n]) + '\n')
 
             # Sanity check, we check validity of the cut wrt to a previously
             # loaded AC solution
@@ -254,11 +602,8 @@ def i2_cuts(log,all_data):
             
                 sol_Pf        = all_data['sol_Pfvalues'][k][branch]
                 sol_Qf        = all_data['sol_Qfvalues'][k][branch]
-                sol_c         = all_data['sol_cvalues'][k][branch]
-                sol_s         = all_data['sol_svalues'][k][branch]
-                sol_cbusf     = all_data['sol_cvalues'][k][buses[count_of_f]]
-                sol_cbust     = all_data['sol_cvalues'][k][buses[count_of_t]]
-                sol_i2f       = computei2value(log,all_data,branch,sol_c,sol_s,sol_cbusf,sol_cbust)
+                sol_cbusf     = all_data['sol_cvalues'][k][buses[IDtoCountmap[branch.f]]]
+                sol_i2f       = sol_i2fvalues[k,j]
                 violation     = coeff_Pft * sol_Pf + coeff_Qft * sol_Qf + coeff_cff * sol_cbusf + coeff_i2ft * sol_i2f
                 relviolation  = violation / ( ( coeff_Pft**2 + coeff_Qft**2 + coeff_cff**2 + coeff_i2ft**2 )**0.5 ) 
 
@@ -274,21 +619,27 @@ def i2_cuts(log,all_data):
                 else:
                     log.joint('  AC solution satisfies loss inequality at branch '
                               + str(branch.count) + ' with slack ' + str(violation) + '\n')
-        
-        
-            i2_cuts[(cutid,branch.count)] = (rnd,threshold,k)
-            i2_cuts_info[k][branch][cutid]   = (rnd,violation,coeff_Pft,coeff_Qft,coeff_cff,coeff_i2ft,threshold,cutid)
-
-        
-            cutexp     = LinExpr()
-            constrname = "i2_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-            cutexp    += coeff_Pft * Pvar_f[k][branch] + coeff_Qft * Qvar_f[k][branch] + coeff_cff * cvar[k][buses[count_of_f]] + coeff_i2ft * i2var_f[k][branch]
 
-            themodel.addConstr(cutexp <= 0, name = constrname)
+            newcuts.append((k,j,cutid,branch))
             numkcuts += 1
 
         log.joint('  time-period = ' + str(k) + ' : i2-envelope cuts'
                   + ' added '  + str(numkcuts) + '\n')
+
+    # The cuts are added to the model, together with those of the other 
+    # families, by 'flush_cuts'
+    if len(newcuts):
+        cols    = blockcols(all_data)
+        kk      = np.array([cut[0] for cut in newcuts])
+        jj      = np.array([cut[1] for cut in newcuts])
+        bb      = i2idx[jj]
+        cutcols = np.stack((cols['Pf'][kk,bb], cols['Qf'][kk,bb],
+                            cols['cbus'][kk,all_data['branch_fidx'][bb]],
+                            cols['i2'][kk,jj]), axis = 1)
+        queue_cuts(all_data,I2,rnd,[cut[2] for cut in newcuts],bb,kk,
+                   violations[kk,jj],threshold,coeffs[kk,jj],cutcols,0,
+                   [(i2_cutname,(cutid,branch,rnd,k)) 
+                    for (k,j,cutid,branch) in newcuts])
     log.joint('  number i2-envelope cuts added ' + str(most_violated_count)
               + '\n')
     log.joint('  max error (abs) ' + str(max_error) + ' at '
@@ -322,48 +673,15 @@ def drop_i2(log,all_data):
     log.joint(' dropping old and slack i2-envelope cuts ...\n')
 
     themodel             = all_data['themodel']
-    branches             = all_data['branches']
-    buses                = all_data['buses']
-    IDtoCountmap         = all_data['IDtoCountmap']
+    branchlist           = list(all_data['branches'].values())
     current_rnd          = all_data['round']
     cut_age_limit        = all_data['cut_age_limit']
-    i2_cuts              = all_data['i2_cuts']
-    i2_cuts_info         = all_data['i2_cuts_info']
+    pool                 = all_data['cutpool']
     dropped_i2           = all_data['dropped_i2']
-    drop_i2              = []
-    T                    = all_data['T']
-    num_i2_cuts_dropped  = all_data['num_i2_cuts_dropped'] 
-
-    for key in i2_cuts.keys():  #key = (cutid,branch.count), value = (rnd,threshold)
-        cut     = i2_cuts[key] 
-        cut_rnd = cut[0]
-        cut_age = current_rnd - cut_rnd
 
-        if cut_age <= cut_age_limit:
-            continue 
-        
-        cutid         = key[0]
-        branchid      = key[1]
-        branch        = branches[branchid]
-        f             = branch.f
-        t             = branch.t
-        count_of_f    = IDtoCountmap[f]
-        count_of_t    = IDtoCountmap[t]
-        cut_threshold = cut[1]
-        k             = cut[2]
-        
-        constrname    = "i2_cut_"+str(cutid)+"_"+str(branchid)+"r_"+str(cut_rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-        constr        = themodel.getConstrByName(constrname)
-        slack         = - constr.getAttr("slack")
-
-        if ( slack < - cut_threshold ):
-            drop_i2.append(key)
-            themodel.remove(themodel.getConstrByName(constrname))
-            #if all_data['loud_cuts']:
-            #    log.joint('  --> removed i2-cut\n')
-            #    log.joint('  cut ' + str(key) + ' branch ' 
-            #              + str(branchid) + ' f ' + str(f) + ' t ' + str(t) 
-            #              + ' was removed from the model\n')
+    old     = pool.aged(I2,current_rnd,cut_age_limit)
+    slacks  = themodel.getAttr("Slack", pool.constrs(old))
+    drop_i2 = pool.slack(old,slacks)
     
     num_drop_i2       = len(drop_i2)
     
@@ -372,36 +690,98 @@ def drop_i2(log,all_data):
         all_data['num_i2_cuts']        -= num_drop_i2
         all_data['total_i2_dropped']   += num_drop_i2
 
-        dropped_i2.extend(drop_i2)
+        cuts = pool.rows()[drop_i2]
+        themodel.remove(cuts['constr'].tolist())
 
-        ##### drop i2-envelope cuts from i2_cuts_info
-        for key in drop_i2:
-            cutid    = key[0]
-            branchid = key[1]
-            k        = i2_cuts[key][2] 
-            cuts_branch = i2_cuts_info[k][branches[branchid]]
-            if all_data['loud_cuts']:
+        dropped_i2.extend(zip(cuts['cutid'].tolist(),
+                              [branchlist[j].count for j in cuts['branch']]))
+
+        if all_data['loud_cuts']:
+            for cut in cuts:
                 log.joint('  --> i2-cut removed\n')
-                log.joint('  cutid ' + str(cutid) + ' branchid '
-                          + str(branchid) + ' k ' + str(k) + '\n')
-                log.joint(' coeff: Pft ' + str(cuts_branch[cutid][2])
-                          + ' Qft ' + str(cuts_branch[cutid][3]) + ' cff '
-                          + str(cuts_branch[cutid][4]) + ' i2ft '
-                          + str(cuts_branch[cutid][5]) + ' rnd '
-                          + str(cuts_branch[cutid][0]) + '\n')            
-            cuts_branch.pop(cutid)
-        log.joint('  cuts in drop_i2 list were removed from i2_cuts_info\n')
-
-        ##### drop i2-envelope cuts from i2_cuts        
-        for key in drop_i2:
-            i2_cuts.pop(key)
-        log.joint('  the cuts in drop_i2 list were removed from dict i2_cuts\n')
+                log.joint('  cutid ' + str(cut['cutid']) + ' branchid '
+                          + str(branchlist[cut['branch']].count) + ' k '
+                          + str(cut['period']) + '\n')
+                log.joint(' coeff: Pft ' + str(cut['coeffs'][0])
+                          + ' Qft ' + str(cut['coeffs'][1]) + ' cff '
+                          + str(cut['coeffs'][2]) + ' i2ft '
+                          + str(cut['coeffs'][3]) + ' rnd '
+                          + str(cut['rnd']) + '\n')            
+
+        pool.drop(drop_i2)
+
+        log.joint('  the cuts in drop_i2 list were removed from the cut pool\n')
         
     else:
         all_data['num_i2_cuts_dropped'] = 0
         log.joint('  no i2-envelope cuts were dropped this round\n')
     
 
+# Adds the tangent cuts
+#    2 a p GenP_k - z_k <= a p^2
+# of the epigraph z_k >= a GenP_k^2 of a quadratic generation cost, see
+# 'objective_epigraph'. 'kk', 'qq' and 'points' give the time-period, the
+# position of the generator in all_data['epigraph'] and the point p of 
+# every cut. Returns the number of cuts added
+
+def objective_tangents(all_data,kk,qq,points,rnd):
+
+    epigraph = all_data['epigraph']
+    genlist  = list(all_data['gens'].values())
+    a        = epigraph['quadcoeff'][qq]
+    m        = len(kk)
+
+    cols     = np.column_stack((epigraph['GenPcols'][kk,qq],
+                                epigraph['zcols'][kk,qq]))
+    vals     = np.column_stack((2 * a * points, -np.ones(m)))
+    constrs  = add_cutrows(all_data,cols,vals,a * points * points)
+
+    cutid    = all_data['num_objective_cuts']
+    names    = [(objective_cutname, (cutid + n, genlist[j], rnd, k))
+                for n, (k, j) in enumerate(zip(kk.tolist(),
+                                               epigraph['gens'][qq].tolist()))]
+    name_cutrows(all_data,constrs,names,False)
+
+    all_data['num_objective_cuts'] += m
+
+    return m
+
+# Separates tangent cuts of the epigraphs of the quadratic generation costs
+# at the current GenP values. Violations are relative to the cost, since 
+# costs of different generators vary by orders of magnitude
+
+def objective_cuts(log,all_data):
+
+    log.joint('\n')
+    log.joint(' **** Objective-cuts ****\n')
+
+    themodel  = all_data['themodel']
+    epigraph  = all_data['epigraph']
+    T         = all_data['T']
+    threshold = all_data['threshold_objcuts']
+
+    all_data['NO_objective_cuts_violated'] = 0
+
+    GenP      = all_data['solarrays']['GenP'][:,epigraph['gens']]
+    zvalues   = np.array(themodel.getAttr('X', epigraph['zvar'])).reshape(GenP.shape)
+    cost      = epigraph['quadcoeff'] * GenP * GenP
+    violation = (cost - zvalues) / np.maximum(cost, 1.0)
+
+    kk, qq = np.nonzero(violation > threshold)
+
+    if len(kk) == 0:
+        all_data['NO_objective_cuts_violated'] = 1
+        log.joint(' all objective violations below threshold\n')
+        return None
+
+    log.joint('  number violated epigraphs ' + str(len(kk)) + '\n')
+    log.joint('  max error ' + str(violation.max()) + '\n')
+
+    added = objective_tangents(all_data,kk,qq,GenP[kk,qq],all_data['round'])
+
+    log.joint('  objective-cuts added ' + str(added) + '\n')
+
+
 # Computes limit cuts, see inequality (23) in [1]
 
 def limit_cuts(log,all_data):
@@ -409,14 +789,8 @@ def limit_cuts(log,all_data):
     log.joint('\n')
     log.joint(' **** Limit-cuts ****\n')
 
-    themodel         = all_data['themodel']
     IDtoCountmap     = all_data['IDtoCountmap']
-    buses            = all_data['buses']
     branches         = all_data['branches']
-    Pvar_f           = all_data['Pvar_f']
-    Qvar_f           = all_data['Qvar_f']
-    Pvar_t           = all_data['Pvar_t']
-    Qvar_t           = all_data['Qvar_t']
     FeasibilityTol   = all_data['FeasibilityTol']
     T                = all_data['T']
     
@@ -426,32 +800,23 @@ def limit_cuts(log,all_data):
     Qtvalues = all_data['Qtvalues']
     
     rnd                   = all_data['round']
-    limit_cuts            = all_data['limit_cuts']    
-    limit_cuts_info       = all_data['limit_cuts_info']
     num_cuts              = all_data['ID_limit_cuts']
-    num_limit_cuts_added  = 0
     threshold             = all_data['threshold']
-    violated              = {}
-    violated_count        = 0
-    most_violated         = {}
-
-    for k in range(T):
-        violated[k] = {}
-
+    network               = all_data['network']
+    branchlist            = list(branches.values())
     
     all_data['NO_limit_cuts_violated'] = 0
     
     log.joint(' checking for violations of limit inequalities ... \n')
-    for branch in branches.values():
-        for k in range(T):
-            violation_f = Pfvalues[k][branch]*Pfvalues[k][branch] + Qfvalues[k][branch]*Qfvalues[k][branch] - branch.limit**2
-            violation_t = Ptvalues[k][branch]*Ptvalues[k][branch] + Qtvalues[k][branch]*Qtvalues[k][branch] - branch.limit**2
-            if violation_f > threshold:
-                violated_count += 1
-                violated[k][branch] = (violation_f,'f')
-            elif violation_t > threshold:
-                violated_count += 1
-                violated[k][branch] = (violation_t,'t')    
+
+    # Branches without a flow limit (rateA = 0) are skipped, both ends of
+    # the other ones are checked; computed by 'run_kernels' in module 
+    # separation
+    lidx    = np.flatnonzero(network.constrainedflow)
+    nlimit  = len(lidx)
+    limits  = network.limit[lidx].tolist()
+    violations, coeffs = all_data['kernels'][LIMIT]
+    violated_count = int(np.count_nonzero(violations > threshold))
 
     if violated_count == 0:
         all_data['NO_limit_cuts_violated'] = 1
@@ -463,61 +828,56 @@ def limit_cuts(log,all_data):
     
     log.joint(' sorting most violated limit-envelope cuts ...\n')
 
-    num_selected =  math.ceil(violated_count * all_data['most_violated_fraction_limit'] )
-
-    for k in range(T):
-        most_violated[k] = dict(sorted(violated[k].items(),
-                                       key = lambda x: x[1][0],
-                                       reverse = True)[:num_selected])
+    most_violated = most_violated_idx(violations,threshold,
+                                      all_data['most_violated_fraction_limit'],
+                                      all_data['most_violated_budget'])
 
     log.joint(' computing limit-envelope cuts ... \n')
 
+    if all_data['parallel_check']:
+        parallel = parallel_check(log,all_data,LIMIT,most_violated,coeffs,
+                                  np.concatenate((lidx,lidx)),
+                                  np.repeat(['f','t'],nlimit))
+
     most_violated_count  = 0
     most_violated_branch = 'none'
     max_error            = -1
+    newcuts              = []
 
     for k in range(T):
         numkcuts = 0
-        for branch in most_violated[k].keys():
+        selected = most_violated[k]
+        kviol    = violations[k,selected].tolist()
+        kcoeffs  = coeffs[k,selected].tolist()
+        for n, j in enumerate(selected.tolist()):
+            branch     = branchlist[lidx[j % nlimit]]
+            from_or_to = 'f' if j < nlimit else 't'
+
             if (most_violated_count == 0):
-                if most_violated[k][branch][0] > max_error:
+                if kviol[n] > max_error:
                     most_violated_branch = 'branch ' + str(branch.count) + ' f ' + str(branch.f) + ' t ' + str(branch.t) + ' k ' + str(k)
-                    max_error = most_violated[k][branch][0]
-  
-
-            from_or_to = most_violated[k][branch][1]
+                    max_error = kviol[n]
     
             if from_or_to == 'f':
                 Pval                  = Pfvalues[k][branch]
                 Qval                  = Qfvalues[k][branch]
-            elif from_or_to == 't':
+            else:
                 Pval                 = Ptvalues[k][branch]
                 Qval                 = Qtvalues[k][branch]
-            else:
-                log.joint(' There is a bug\n')
-                breakexit('check')
-
-            f          = branch.f
-            t          = branch.t
-            count_of_f = IDtoCountmap[f]
-            count_of_t = IDtoCountmap[t]
-            violation  = most_violated[k][branch][0]
-            u          = branch.limit
+
+            violation  = kviol[n]
+            u          = limits[j % nlimit]
             u2         = u**2
 
             if violation + u2 < 1e-05:
                 log.joint('  limit cuts: check branch\n') 
                 breakexit('check')  
 
-            t0         = 1 / (u * math.sqrt(violation + u2))
-            coeff_P    = t0 * Pval
-            coeff_Q    = t0 * Qval
+            coeff_P, coeff_Q = kcoeffs[n]
             z          = 1
 
-            if all_data['parallel_check']:
-                if parallel_check_limit(log,all_data,branch,coeff_P,coeff_Q,
-                                        from_or_to,k):
-                    continue
+            if all_data['parallel_check'] and parallel[k][n]:
+                continue
 
             # We add the cut
             most_violated_count += 1
@@ -526,7 +886,7 @@ def limit_cuts(log,all_data):
             if all_data['loud_cuts']:
                 log.joint('  --> new cut\n')
                 log.joint('  branch ' + str(branch.count) + ' time-period '
-                          + str(k) + ' f ' + str(f) + ' t '  + str(t)
+                          + str(k) + ' f ' + str(branch.f) + ' t '  + str(branch.t)
                           + ' violation ' + str(violation) + ' cut id '
                           + str(cutid) + '\n')
                 if from_or_to == 'f':
@@ -555,7 +915,7 @@ def limit_cuts(log,all_data):
                 if slack > FeasibilityTol:
                     log.joint('  this cut is not valid!\n')
                     log.joint('  branch ' + str(branch.count) + ' time-period '
-                          + str(k) + ' f ' + str(f) + ' t '  + str(t)
+                          + str(k) + ' f ' + str(branch.f) + ' t '  + str(branch.t)
                           + ' cut id ' + str(cutid) + '\n')
                     log.joint('  violation ' + str(slack) + '\n')
                     log.joint('  values (a primal bound)' + ' P '
@@ -565,26 +925,29 @@ def limit_cuts(log,all_data):
                 else:
                     log.joint('  valid cut at branch ' + str(branch.count)
                               + ' with slack ' + str(slack) + '\n')
-        
-            limit_cuts[(cutid,branch.count)]  = (rnd,threshold,from_or_to,k)
-            limit_cuts_info[k][branch][cutid] = (rnd,violation,coeff_P,coeff_Q,threshold,cutid,from_or_to)
-        
-            cutexp = LinExpr()
 
-            if from_or_to == 'f':
-                constrname = "limit_cut_" + str(cutid) + "_" + str(branch.count) + "r_" + str(rnd) + "k_" + str(k) + "_" + str(f) + "_" + str(t)
-                cutexp += coeff_P * Pvar_f[k][branch] + coeff_Q * Qvar_f[k][branch]
-            elif from_or_to == 't':
-                constrname = "limit_cut_" + str(cutid) + "_" + str(branch.count) + "r_" + str(rnd) + "k_" + str(k) + "_" + str(t) + "_" + str(f)
-                cutexp += coeff_P * Pvar_t[k][branch] + coeff_Q * Qvar_t[k][branch]
-            else:
-                log.joint('  we have a bug\n')
-                breakexit('look for bug')
-            
-            themodel.addConstr(cutexp <= z, name = constrname)
+            newcuts.append((k,j,cutid,branch,from_or_to))
             numkcuts += 1
         log.joint('  time-period = ' + str(k) + ' : limit-envelope cuts'
                   + ' added ' + str(numkcuts) + '\n')
+
+    # The cuts are added to the model, together with those of the other 
+    # families, by 'flush_cuts'. Columns j < nlimit of the kernel are the
+    # 'from' ends, the others the 'to' ends
+    if len(newcuts):
+        cols    = blockcols(all_data)
+        kk      = np.array([cut[0] for cut in newcuts])
+        jj      = np.array([cut[1] for cut in newcuts])
+        bb      = lidx[jj % nlimit]
+        tend    = jj >= nlimit
+        cutcols = np.stack((np.where(tend, cols['Pt'][kk,bb], cols['Pf'][kk,bb]),
+                            np.where(tend, cols['Qt'][kk,bb], cols['Qf'][kk,bb])),
+                           axis = 1)
+        queue_cuts(all_data,LIMIT,rnd,[cut[2] for cut in newcuts],bb,kk,
+                   violations[kk,jj],threshold,coeffs[kk,jj],cutcols,1,
+                   [(limit_cutname,(cutid,branch,rnd,k,from_or_to)) 
+                    for (k,j,cutid,branch,from_or_to) in newcuts],
+                   np.where(tend,'t','f'))
     log.joint('  number limit-envelope cuts added '
               + str(most_violated_count) + '\n')
     log.joint('  max error (abs) ' + str(max_error) + ' at '
@@ -618,55 +981,15 @@ def drop_limit(log,all_data):
     log.joint(' dropping old and slack limit-envelope cuts ...\n')
 
     themodel                = all_data['themodel']
-    branches                = all_data['branches']
-    buses                   = all_data['buses']
-    IDtoCountmap            = all_data['IDtoCountmap']
+    branchlist              = list(all_data['branches'].values())
     current_rnd             = all_data['round']
     cut_age_limit           = all_data['cut_age_limit']
-    limit_cuts              = all_data['limit_cuts']
-    limit_cuts_info         = all_data['limit_cuts_info']
-    drop_limit              = []
+    pool                    = all_data['cutpool']
     dropped_limit           = all_data['dropped_limit']
-    num_limit_cuts_dropped  = all_data['num_limit_cuts_dropped']
-    T                       = all_data['T']
-
-    for key in limit_cuts.keys():
-        cut     = limit_cuts[key]   
-        cut_rnd = cut[0]
-        cut_age = current_rnd - cut_rnd
 
-        if cut_age <= cut_age_limit:
-            continue #baby cuts, skip!
-        
-        cutid         = key[0]
-        branchid      = key[1]
-        branch        = branches[branchid]
-        f             = branch.f
-        t             = branch.t
-        count_of_f    = IDtoCountmap[f]
-        count_of_t    = IDtoCountmap[t]
-        cut_threshold = cut[1]
-        from_or_to    = cut[2]
-        k             = cut[3]
-
-        if from_or_to == 'f':
-            constrname = "limit_cut_" + str(cutid) + "_" + str(branch.count) + "r_" + str(cut_rnd) + "k_" + str(k) + "_" + str(f) + "_" + str(t)
-        elif from_or_to == 't':
-            constrname = "limit_cut_" + str(cutid) + "_" + str(branch.count) + "r_" + str(cut_rnd) + "k_" + str(k) + "_" + str(t) + "_" + str(f)
-        else:
-            log.joint(' we have a bug\n')
-            breakexit('look for bug')
-
-        constr        = themodel.getConstrByName(constrname)
-        slack         = - constr.getAttr("slack")
-
-        if ( slack < - cut_threshold ):
-            drop_limit.append(key)
-            themodel.remove(themodel.getConstrByName(constrname))
-            #if all_data['loud_cuts']:
-            #    log.joint(' --> removed limit-cut\n')
-            #    log.joint(' the cut ' + str(key)
-            #              + ' was removed from the model\n')
+    old        = pool.aged(LIMIT,current_rnd,cut_age_limit)
+    slacks     = themodel.getAttr("Slack", pool.constrs(old))
+    drop_limit = pool.slack(old,slacks)
     
     num_drop_limit = len(drop_limit)
     if num_drop_limit:
@@ -674,35 +997,30 @@ def drop_limit(log,all_data):
         all_data['num_limit_cuts']        -= num_drop_limit
         all_data['total_limit_dropped']   += num_drop_limit
 
-        dropped_limit.extend(drop_limit)
-
-        ##### drop limit-envelope cuts from limit_cuts_info
-        for key in drop_limit:
-            cutid      = key[0]
-            branchid   = key[1]
-            from_or_to = limit_cuts[key][2]
-            k          = limit_cuts[key][3]
-            cuts_branch = limit_cuts_info[k][branches[branchid]]
-            if all_data['loud_cuts']:
-                log.joint('  --> limit-cut removed\n')
-                log.joint('  cutid ' + str(cutid) + ' branchid '
-                          + str(branchid) + ' k ' + str(k) + '\n')
-                if from_or_to == 'f':
-                    log.joint(' coeff: Pft ' + str(cuts_branch[cutid][2])
-                              + ' Qft ' + str(cuts_branch[cutid][3])
-                              + ' rnd ' + str(cuts_branch[cutid][0]) + '\n')
-                elif from_or_to == 't':
-                    log.joint(' coeff: Ptf ' + str(cuts_branch[cutid][2])
-                              + ' Qtf ' + str(cuts_branch[cutid][3])
-                              + ' rnd ' + str(cuts_branch[cutid][0]) + '\n') 
-            cuts_branch.pop(cutid)
-        log.joint('  cuts in drop_limit list were removed from limit_cuts_info\n')
+        cuts = pool.rows()[drop_limit]
+        themodel.remove(cuts['constr'].tolist())
 
-        ##### drop limit-envelope cuts from limit_cuts        
-        for key in drop_limit:
-            limit_cuts.pop(key)
+        dropped_limit.extend(zip(cuts['cutid'].tolist(),
+                                 [branchlist[j].count for j in cuts['branch']]))
 
-        log.joint('  the cuts in drop_limit list were removed from dict limit_cuts\n' )        
+        if all_data['loud_cuts']:
+            for cut in cuts:
+                log.joint('  --> limit-cut removed\n')
+                log.joint('  cutid ' + str(cut['cutid']) + ' branchid '
+                          + str(branchlist[cut['branch']].count) + ' k '
+                          + str(cut['period']) + '\n')
+                if cut['end'] == 'f':
+                    log.joint(' coeff: Pft ' + str(cut['coeffs'][0])
+                              + ' Qft ' + str(cut['coeffs'][1])
+                              + ' rnd ' + str(cut['rnd']) + '\n')
+                elif cut['end'] == 't':
+                    log.joint(' coeff: Ptf ' + str(cut['coeffs'][0])
+                              + ' Qtf ' + str(cut['coeffs'][1])
+                              + ' rnd ' + str(cut['rnd']) + '\n') 
+
+        pool.drop(drop_limit)
+
+        log.joint('  the cuts in drop_limit list were removed from the cut pool\n' )        
     else:
         all_data['num_limit_cuts_dropped'] = 0
         log.joint('  no limit-envelope cuts were dropped this round\n')
@@ -715,29 +1033,18 @@ def jabr_cuts(log,all_data):
     log.joint('\n')
     log.joint(' **** Jabr-cuts ****\n')
 
-    themodel       = all_data['themodel']
     IDtoCountmap   = all_data['IDtoCountmap']
     buses          = all_data['buses']
     branches       = all_data['branches']
-    cvar           = all_data['cvar']
-    svar           = all_data['svar']
     FeasibilityTol = all_data['FeasibilityTol']
     cvalues        = all_data['cvalues']
     svalues        = all_data['svalues']
     T              = all_data['T']
     
     rnd                 = all_data['round']
-    jabr_cuts           = all_data['jabr_cuts']
-    jabr_cuts_info      = all_data['jabr_cuts_info']
     num_cuts            = all_data['ID_jabr_cuts']
-    num_jabr_cuts_added = 0
     threshold           = all_data['threshold']
-    violated            = {}
-    violated_count      = 0
-    most_violated       = {}
-    
-    for k in range(T):
-        violated[k] = {}
+    branchlist          = list(branches.values())
         
     all_data['NO_jabrs_violated'] = 0
     
@@ -745,17 +1052,10 @@ def jabr_cuts(log,all_data):
 
     log.joint(' checking for violations of Jabr inequalities ... \n')
 
-    for branch in branches.values():
-        f = branch.f
-        t = branch.t
-        count_of_f = IDtoCountmap[f]
-        count_of_t = IDtoCountmap[t]
-
-        for k in range(T):
-            violation = cvalues[k][branch]*cvalues[k][branch] + svalues[k][branch]*svalues[k][branch] - cvalues[k][buses[count_of_f]]*cvalues[k][buses[count_of_t]]
-            if violation > threshold:
-                violated_count += 1
-                violated[k][branch] = violation
+    # Computed by 'run_kernels' in module separation
+    violations, cutnorms, coeffs = all_data['kernels'][JABR]
+    violations = hybrid_mask(all_data,JABR,violations,slice(None))
+    violated_count = int(np.count_nonzero(violations > threshold))
 
     if violated_count == 0:
         all_data['NO_jabrs_violated'] = 1
@@ -774,13 +1074,9 @@ def jabr_cuts(log,all_data):
 
     t0_mostviol = time.time()
 
-    num_selected = math.ceil( violated_count *
-                             all_data['most_violated_fraction_jabr'] )
-
-    for k in range(T):
-        most_violated[k] = dict(sorted(violated[k].items(),
-                                       key = lambda x: x[1],
-                                       reverse = True)[:num_selected])
+    most_violated = most_violated_idx(violations,threshold,
+                                      all_data['most_violated_fraction_jabr'],
+                                      all_data['most_violated_budget'])
         
     t1_mostviol = time.time()
 
@@ -790,47 +1086,46 @@ def jabr_cuts(log,all_data):
     log.joint(' computing Jabr-envelope cuts ... \n')
     t0_compute  = time.time()
 
+    if all_data['parallel_check']:
+        parallel = parallel_check(log,all_data,JABR,most_violated,coeffs,
+                                  np.arange(len(branchlist)))
+
     most_violated_count  =  0
     most_violated_branch = 'none'
     max_error            = -1
+    newcuts              = []
     
     for k in range(T):
-        numkcuts = 0
-        for branch in most_violated[k].keys():
+        numkcuts  = 0
+        selected  = most_violated[k]
+        kviol     = violations[k,selected].tolist()
+        kcutnorm  = cutnorms[k,selected].tolist()
+        kcoeffs   = coeffs[k,selected].tolist()
+        for n, j in enumerate(selected.tolist()):
+            branch = branchlist[j]
             if (most_violated_count == 0):
-                if most_violated[k][branch] > max_error:
+                if kviol[n] > max_error:
                     most_violated_branch = 'branch ' + str(branch.count) + ' f ' + str(branch.f) + ' t ' + str(branch.t) + ' k ' + str(k)
-                    max_error = most_violated[k][branch]
-
-            f          = branch.f
-            t          = branch.t
-            count_of_f = IDtoCountmap[f]
-            count_of_t = IDtoCountmap[t]
-            cft        = cvalues[k][branch]
-            sft        = svalues[k][branch]
-            cff        = cvalues[k][buses[count_of_f]]
-            ctt        = cvalues[k][buses[count_of_t]]
-
-            cutnorm = math.sqrt( (2 * cft)**2 + (2 * sft)**2 + (cff - ctt)**2 )
-            coeff_cft = 4 * cft
-            coeff_sft = 4 * sft
-            coeff_cff = cff - ctt - cutnorm
-            coeff_ctt = - (cff - ctt) - cutnorm
-
-            if all_data['parallel_check']:
-                if parallel_check(log,all_data,branch,coeff_cft,coeff_sft,
-                                  coeff_cff,coeff_ctt,k):
-                    continue
+                    max_error = kviol[n]
+
+            coeff_cft, coeff_sft, coeff_cff, coeff_ctt = kcoeffs[n]
+
+            if all_data['parallel_check'] and parallel[k][n]:
+                continue
 
             #we add the cut
             most_violated_count += 1
-            violation            = most_violated[k][branch]
+            violation            = kviol[n]
             cutid                = num_cuts + most_violated_count
 
             if all_data['loud_cuts']:
+                cft = cvalues[k][branch]
+                sft = svalues[k][branch]
+                cff = cvalues[k][buses[IDtoCountmap[branch.f]]]
+                ctt = cvalues[k][buses[IDtoCountmap[branch.t]]]
                 log.joint('  --> new cut\n')
                 log.joint('  branch ' + str(branch.count) + ' time-period '
-                          + str(k) + ' f ' + str(f) + ' t ' + str(t)
+                          + str(k) + ' f ' + str(branch.f) + ' t ' + str(branch.t)
                           + ' violation ' + str(violation) + ' cut id '
                           + str(cutid) + '\n' )
                 log.joint('  values ' + ' cft ' + str(cft) + ' sft ' + str(sft)
@@ -838,14 +1133,14 @@ def jabr_cuts(log,all_data):
                 log.joint('  LHS coeff ' + ' cft ' + str(coeff_cft) + ' sft ' 
                           + str(coeff_sft) + ' cff ' + str(coeff_cff) + ' ctt '
                           + str(coeff_ctt) + '\n' )
-                log.joint('  cutnorm ' + str(cutnorm) + '\n')
+                log.joint('  cutnorm ' + str(kcutnorm[n]) + '\n')
 
             # Sanity check
             if all_data['jabr_validity']:
                 sol_c     = all_data['sol_cvalues'][k][branch]
                 sol_s     = all_data['sol_svalues'][k][branch]
-                sol_cbusf = all_data['sol_cvalues'][k][buses[count_of_f]]
-                sol_cbust = all_data['sol_cvalues'][k][buses[count_of_t]]
+                sol_cbusf = all_data['sol_cvalues'][k][buses[IDtoCountmap[branch.f]]]
+                sol_cbust = all_data['sol_cvalues'][k][buses[IDtoCountmap[branch.t]]]
                 slack     = coeff_cft * sol_c + coeff_sft * sol_s + coeff_cff * sol_cbusf + coeff_ctt * sol_cbust
 
                 if slack > FeasibilityTol:
@@ -853,27 +1148,32 @@ def jabr_cuts(log,all_data):
                     log.joint('  violation ' + str(slack) + '\n')
                     log.joint('  values (a primal bound)' + ' cft '
                               + str(sol_c)  + ' sft ' + str(sol_s) + ' cff '
-                              + str(sol_busf)  + ' ctt ' + str(sol_cbust)
+                              + str(sol_cbusf)  + ' ctt ' + str(sol_cbust)
                               + '\n' )
                     breakexit('check!')
                 else:
                     log.joint('  valid cut at branch ' + str(branch.count)
                               + ' with slack ' + str(slack) + '\n')
-        
-            jabr_cuts[(cutid,branch.count)]  = (rnd,threshold,k)
-            jabr_cuts_info[k][branch][cutid] = (rnd,violation,coeff_cft,
-                                                coeff_sft,coeff_cff,coeff_ctt,
-                                                threshold,cutid)
-        
-            cutexp = LinExpr()
-            constrname = "jabr_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-            cutexp += coeff_cft * cvar[k][branch] + coeff_sft * svar[k][branch] + coeff_cff * cvar[k][buses[count_of_f]] + coeff_ctt * cvar[k][buses[count_of_t]]
 
-            themodel.addConstr(cutexp <= 0, name = constrname)
+            newcuts.append((k,j,cutid,branch))
             numkcuts += 1
         log.joint('  time-period = ' + str(k) + ' : Jabr-envelope cuts'
                   + ' added ' + str(numkcuts) + '\n')
 
+    # The cuts are added to the model, together with those of the other 
+    # families, by 'flush_cuts'
+    if len(newcuts):
+        cols    = blockcols(all_data)
+        kk      = np.array([cut[0] for cut in newcuts])
+        jj      = np.array([cut[1] for cut in newcuts])
+        cutcols = np.stack((cols['cbr'][kk,jj], cols['sbr'][kk,jj],
+                            cols['cbus'][kk,all_data['branch_fidx'][jj]],
+                            cols['cbus'][kk,all_data['branch_tidx'][jj]]), axis = 1)
+        queue_cuts(all_data,JABR,rnd,[cut[2] for cut in newcuts],jj,kk,
+                   violations[kk,jj],threshold,coeffs[kk,jj],cutcols,0,
+                   [(jabr_cutname,(cutid,branch,rnd,k)) 
+                    for (k,j,cutid,branch) in newcuts])
+
     log.joint('  number Jabr-envelope cuts added ' + str(most_violated_count)
               + '\n')
     log.joint('  max error (abs) ' + str(max_error) + ' at '
@@ -914,48 +1214,19 @@ def drop_jabr(log,all_data):
     log.joint(' dropping old and slack Jabr-envelope cuts ...\n')
 
     themodel               = all_data['themodel']
-    branches               = all_data['branches']
-    buses                  = all_data['buses']
-    IDtoCountmap           = all_data['IDtoCountmap']
+    branchlist             = list(all_data['branches'].values())
     current_rnd            = all_data['round']
     cut_age_limit          = all_data['cut_age_limit']
-    jabr_cuts              = all_data['jabr_cuts']
-    jabr_cuts_info         = all_data['jabr_cuts_info']
-    drop_jabrs             = []
-    num_jabr_cuts_dropped  = all_data['num_jabr_cuts_dropped'] 
+    pool                   = all_data['cutpool']
     dropped_jabrs          = all_data['dropped_jabrs']
-    T                      = all_data['T']
-    
-    for key in jabr_cuts.keys():
-        cut     = jabr_cuts[key] 
-        cut_rnd = cut[0]
-        cut_age = current_rnd - cut_rnd 
-
-        if cut_age <= cut_age_limit: #fix this... we are not cleaning up precomputed cuts...
-            continue #baby cuts, skip! 
-
-        cutid         = key[0]
-        branchid      = key[1]
-        branch        = branches[branchid]
-        f             = branch.f
-        t             = branch.t
-        count_of_f    = IDtoCountmap[f]
-        count_of_t    = IDtoCountmap[t]
-        cut_threshold = cut[1]
-        k             = cut[2]
-
-        constrname    = "jabr_cut_"+str(cutid)+"_"+str(branchid)+"r_"+str(cut_rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-        constr        = themodel.getConstrByName(constrname)
-        slack         = - constr.getAttr("slack")
-        
-        if ( slack < - cut_threshold ):
-            drop_jabrs.append(key)
-            themodel.remove(themodel.getConstrByName(constrname))
-            #if all_data['loud_cuts']:
-            #    log.joint('  --> removed Jabr-cut\n')
-            #    log.joint('  the cut ' + str(key)
-            #              + ' was removed from the model\n')
-    
+
+    # Cuts older than 'cut_age_limit' rounds are dropped if their slack 
+    # exceeds their threshold; slacks are fetched, and cuts removed, in a
+    # single call using the handles kept in the cut pool
+    old        = pool.aged(JABR,current_rnd,cut_age_limit)
+    slacks     = themodel.getAttr("Slack", pool.constrs(old))
+    drop_jabrs = pool.slack(old,slacks)
+
     num_drop_jabrs = len(drop_jabrs)
 
     if num_drop_jabrs:
@@ -963,1119 +1234,589 @@ def drop_jabr(log,all_data):
         all_data['num_jabr_cuts']        -= num_drop_jabrs
         all_data['total_jabr_dropped']   += num_drop_jabrs
 
-        dropped_jabrs.extend(drop_jabrs)
+        cuts = pool.rows()[drop_jabrs]
+        themodel.remove(cuts['constr'].tolist())
 
-        ##### drop Jabr-envelope cuts from jabr_cuts_info                
-        for key in drop_jabrs:
-            cutid       = key[0]
-            branchid    = key[1]
-            k           = jabr_cuts[key][2]
-            cuts_branch = jabr_cuts_info[k][branches[branchid]]
-            if all_data['loud_cuts']:
-                log.joint('  --> Jabr-cut removed\n')
-                log.joint('  cutid ' + str(cutid) + ' branchid '
-                          + str(branchid) + ' k ' + str(k) + '\n')
-                log.joint(' coeff: cft ' + str(cuts_branch[cutid][2])
-                          + ' sft ' + str(cuts_branch[cutid][3]) + ' cff '
-                          + str(cuts_branch[cutid][4]) + ' ctt '
-                          + str(cuts_branch[cutid][5]) + ' rnd '
-                          + str(cuts_branch[cutid][0]) + '\n')
-            cuts_branch.pop(cutid)
-    
-        log.joint('  cuts in drop_jabrs list were removed from jabr_cuts_info\n')
-
-        ##### drop Jabr-envelope cuts from jabr_cuts        
-        for key in drop_jabrs:
-            jabr_cuts.pop(key)
+        dropped_jabrs.extend(zip(cuts['cutid'].tolist(),
+                                 [branchlist[j].count for j in cuts['branch']]))
 
-        log.joint('  the cuts in drop_jabrs list were removed from dict jabr_cuts\n')
+        if all_data['loud_cuts']:
+            for cut in cuts:
+                log.joint('  --> Jabr-cut removed\n')
+                log.joint('  cutid ' + str(cut['cutid']) + ' branchid '
+                          + str(branchlist[cut['branch']].count) + ' k '
+                          + str(cut['period']) + '\n')
+                log.joint(' coeff: cft ' + str(cut['coeffs'][0])
+                          + ' sft ' + str(cut['coeffs'][1]) + ' cff '
+                          + str(cut['coeffs'][2]) + ' ctt '
+                          + str(cut['coeffs'][3]) + ' rnd '
+                          + str(cut['rnd']) + '\n')
+
+        pool.drop(drop_jabrs)
+
+        log.joint('  the cuts in drop_jabrs list were removed from the cut pool\n')
         
     else:
         all_data['num_jabr_cuts_dropped'] = 0
         log.joint('  no Jabr-envelope cuts were dropped this round\n')
 
 
-# Loads previously computed cuts
+# Writes cuts of the current round to a .txt file. The live cuts are copied
+# out of the pool here and the file is written by all_data['writer'], see
+# module artifacts
 
-def add_cuts(log,all_data):
+def write_cuts(log,all_data):
 
-    if '_b' in all_data['casename']:
-        original_casename = all_data['casename'][:len(all_data['casename']) - 2]
-    elif ('_n_5_5' in all_data['casename'] or '_n_0_5' in all_data['casename'] 
-          or '_n_1_1' in all_data['casename'] or '_pline' in all_data['casename']):
-        original_casename = all_data['casename'][:len(all_data['casename']) - 6]
-    #elif '_line' in all_data['casename']:
-    #    original_casename = all_data['casename'][:len(all_data['casename']) - 5]
-    #elif '_line5' in all_data['casename']:
-    #    original_casename = all_data['casename'][:len(all_data['casename']) - 6]
-    else:
-        original_casename = all_data['casename']
+    if all_data['cutformat'] == 'binary':
+        return journal_cuts(log,all_data)
 
-    filename = '../data/cuts/cuts_' + original_casename + '.txt' ###cuts | newcuts
-    log.joint(" opening file with cuts " + filename + "\n")
+    filename = 'cuts_' + all_data['casename'] + '.txt'
+    #filename = 'cuts/cuts_' + all_data['casename'] + '.txt'
+    log.joint(" queueing file with cuts " + filename + "\n")
 
-    try:
-        thefile = open(filename, "r") 
-        lines = thefile.readlines()
-    except:
-        log.stateandquit(" cannot open file", filename)
-        sys.exit("failure")
+    pool       = all_data['cutpool']
+    branchlist = list(all_data['branches'].values())
+    rnd        = all_data['round'] 
 
-    numlines  = len(lines)
-    theround  = lines[0].split()[3]
-    firstline = lines[1].split()
-    jabr      = 1
-    i2        = 0
-    
-    log.joint(' loading cuts from round ' + str(theround) + '\n')
-
-    if firstline[0] == '#Jabr-envelope':
-        numjabrcuts = int(firstline[3])
-        all_data['addcuts_numjabrcuts'] = numjabrcuts
-        log.joint(' number of Jabr-envelope cuts in file = ' + str(numjabrcuts) + '\n')
-    elif firstline[0] == '#i2-envelope':
-        jabr      = 0
-        i2        = 1
-        numi2cuts = int(firstline[3])
-        all_data['addcuts_numi2cuts'] = numi2cuts
-        log.joint(' no Jabr-envelope cuts to add\n')
-        log.joint(' number of i2-envelope cuts in file = ' + str(numi2cuts) + '\n')
-    elif firstline[0] == '#limit-envelope':
-        jabr         = 0
-        i2           = 0
-        numlimitcuts = int(firstline[3])
-        all_data['addcuts_numlimitcuts'] = numlimitcuts
-        log.joint(' no Jabr nor i2-envelope cuts to add\n')
-        log.joint(' number of limit-envelope cuts in file = ' + str(numlimitcuts) + '\n')
-    else:
-        log.joint(' no cuts added\n')
-        return None
+    # Live cuts of a family, grouped by branch; indexing copies them
+    def branchcuts(family):
+        rows = pool.select(family)
+        rows = rows[np.argsort(pool.rows()['branch'][rows], kind = 'stable')]
+        return pool.rows()[rows][['cutid', 'branch', 'rnd', 'violation',
+                                  'threshold', 'coeffs', 'end']]
 
-    linenum = 2
+    sections = [('#Jabr-envelope cuts = ' + str(all_data['num_jabr_cuts']),
+                 JABR, branchcuts(JABR))]
+    if all_data['i2cuts']:
+        sections.append(('#i2-envelope cuts = ' + str(all_data['num_i2_cuts']),
+                         I2, branchcuts(I2)))
+    if all_data['limitcuts']:
+        sections.append(('#limit-envelope cuts = ' + str(all_data['num_limit_cuts']),
+                         LIMIT, branchcuts(LIMIT)))
 
-    themodel       = all_data['themodel']
-    buses          = all_data['buses']
-    branches       = all_data['branches']
-    IDtoCountmap   = all_data['IDtoCountmap']
-    cvar           = all_data['cvar']
-    svar           = all_data['svar']
-    Pvar_f         = all_data['Pvar_f']
-    Qvar_f         = all_data['Qvar_f']
-    Pvar_t         = all_data['Pvar_t']
-    Qvar_t         = all_data['Qvar_t']
-    T              = all_data['T']
-    FeasibilityTol = all_data['FeasibilityTol']
-    alphadic       = all_data['alphadic']
+    all_data['writer'].submit(writecutfile,filename,rnd,branchlist,sections)
 
-    if all_data['i2']:
-        i2var_f    = all_data['i2var_f']
-        numi2added = 0
-    else:
-        numi2cuts  = 0
-
-    while linenum < numlines: 
-        thisline = lines[linenum].split()
-        if thisline[0] == '#i2-envelope' and jabr:
-            if all_data['i2']:
-                numi2cuts = int(thisline[3])
-                all_data['addcuts_numi2cuts'] = numi2cuts
-                log.joint(' number of i2-envelope cuts in file = '
-                          + str(numi2cuts) + '\n')
-            linenum += 1
-            jabr = 0
-            i2   = 1
-            continue
-            
-        elif thisline[0] == '#limit-envelope' and i2: 
-            numlimitcuts = int(thisline[3])
-            all_data['addcuts_numlimitcuts'] = numlimitcuts
-            log.joint(' number of limit-envelope cuts in file = ' + str(numlimitcuts) 
-                      + '\n')
-            linenum += 1
-            i2       = 0
-            continue
+    log.joint(' cuts of round ' + str(rnd) + ' queued for writing\n')
 
-        elif all_data['i2'] == 0 and i2:
-            linenum += 1
-            continue
-            
 
-        elif jabr:
-            branchid  = int(thisline[1])
-            f         = int(thisline[3])
-            t         = int(thisline[5])
-            cutid     = int(thisline[7])
-            rnd       = int(thisline[9])
-            coeff_cft = float(thisline[15])
-            coeff_sft = float(thisline[17])
-            coeff_cff = float(thisline[19])
-            coeff_ctt = float(thisline[21])
-
-
-            if branchid not in branches.keys(): # perturbed lines
-                log.joint(' we do not add this cut since branch ' 
-                          + str(branchid) + ' f ' + str(f) + ' t ' + str(t) 
-                          + ' was turned OFF\n')
-                linenum += 1
-                continue
+# Writes the cuts copied by 'write_cuts'
 
-            branch     = branches[branchid]
-            count_of_f = IDtoCountmap[f] 
-            count_of_t = IDtoCountmap[t]
+def writecutfile(filename,rnd,branchlist,sections):
 
-            if ( (branchid != branch.count) or f != (branch.f) 
-                 or (t != branch.t) ):
+    # Names of the coefficients, per family and end
+    coeffnames = {(JABR, 'f'): ('cft', 'sft', 'cff', 'ctt'),
+                  (I2, 'f'): ('Pft', 'Qft', 'cff', 'i2ft'),
+                  (LIMIT, 'f'): ('Pft', 'Qft'), 
+                  (LIMIT, 't'): ('Ptf', 'Qtf')}
 
-                log.joint(' branchid ' + str(branchid) + ' branch.count ' 
-                          + str(branch.count) + ' f ' + str(f) + ' branch.f ' 
-                          + str(branch.f) + ' t ' + str(t) + ' branch.t ' 
-                          + str(branch.t) + '\n')
-                breakexit('bug')
+    with open(filename, "w+") as thefile: #a+ if we want to append cuts of different rounds
+        thefile.write('current round = ' + str(rnd) + '\n')
 
-            if all_data['loud_cuts']:
-                log.joint(' --> new Jabr-envelope cut for every time period\n')
-                log.joint(' branch ' + str(branchid) + ' f ' + str(f) + ' t ' 
-                          + str(t) + ' cutid ' + str(cutid) + '\n' )
-                log.joint(' LHS coeff ' + ' cft ' + str(coeff_cft) + ' sft ' 
-                          + str(coeff_sft) + ' cff ' + str(coeff_cff) 
-                          + ' ctt ' + str(coeff_ctt) + '\n' )
+        for header, family, cuts in sections:
+            thefile.write(header + '\n')
+            for cut in cuts:
+                branch = branchlist[cut['branch']]
+                names  = coeffnames[(family, str(cut['end']))]
+                cut_info = 'branch ' + str(branch.count) + ' f ' + str(branch.f) + ' t ' + str(branch.t) + ' cutid ' + str(cut['cutid']) + ' round ' + str(cut['rnd']) + ' violation ' + str(cut['violation']) + ' threshold ' + str(cut['threshold'])
+                for name, coeff in zip(names, cut['coeffs'].tolist()):
+                    cut_info += ' ' + name + ' ' + str(coeff)
+                thefile.write(cut_info + '\n')
 
-            
-            if all_data['jabr_validity']:
-                for k in range(T):
-                    sol_c       = all_data['sol_cvalues'][k][branch]
-                    sol_s       = all_data['sol_svalues'][k][branch]
-                    sol_cbusf   = all_data['sol_cvalues'][k][buses[count_of_f]]
-                    sol_cbust   = all_data['sol_cvalues'][k][buses[count_of_t]]
-                    sol_viol    = coeff_cft * sol_c + coeff_sft * sol_s + coeff_cff * sol_cbusf + coeff_ctt * sol_cbust
-                    sol_relviol = sol_viol / ( ( coeff_cft**2 + coeff_sft**2 + coeff_cff**2 + coeff_ctt**2 )**0.5 ) 
-
-                    if sol_relviol > FeasibilityTol:
-                        log.joint(' WARNING, the Jabr-envelope cut associated '
-                                  + 'to branch ' + str(branch.count) + ' k '
-                                  + str(k) + ' f ' + str(branch.f)
-                                  + ' t ' + str(branch.t)
-                                  + ' is violated by the AC solution!\n')
-                        log.joint(' violation ' + str(sol_viol) + '\n')
-                        log.joint(' relative violation ' + str(sol_relviol)
-                                  + '\n')
-                        log.joint(' values (AC solution)' + ' cft '
-                                  + str(sol_c) + ' sft ' + str(sol_s)
-                                  + ' cff ' + str(sol_cbusf) + ' ctt '
-                                  + str(sol_cbust) + '\n' )
-                        breakexit('check!')
-                    else:
-                        log.joint(' AC solution satisfies Jabr inequality '
-                                  + 'at branch ' + str(branch.count)
-                                  + ' with slack ' + str(sol_relviol) + '\n')
-                    
-            for k in range(T):
-                cutexp = LinExpr()
-                constrname = "jabr_cut_"+str(cutid)+"_"+str(branchid)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-                cutexp += coeff_cft * cvar[k][branch] + coeff_sft * svar[k][branch] + coeff_cff * cvar[k][buses[count_of_f]] + coeff_ctt * cvar[k][buses[count_of_t]]
-
-                themodel.addConstr(cutexp <= 0, name = constrname)
-                
-            linenum += 1
-
-        elif (jabr == 0) and i2 and all_data['i2']:
-
-            branchid   = int(thisline[1])
-            f          = int(thisline[3])
-            t          = int(thisline[5])
-            cutid      = int(thisline[7])
-            coeff_Pft  = float(thisline[15])
-            coeff_Qft  = float(thisline[17])
-            coeff_cff  = float(thisline[19])
-            coeff_i2ft = float(thisline[21])
-            alpha      = all_data['alphadic'][branches[branchid]]
-            
-            if branchid not in branches.keys(): # perturbed lines
-                log.joint(' we do not add this cut since branch ' 
-                          + str(branchid) + ' f ' + str(f) + ' t ' + str(t) 
-                          + 'was turned OFF\n')
-                linenum += 1
-                continue
 
-            if alpha >= all_data['rho_threshold']:
-                log.joint(' stability: branch ' + str(branchid) + ' f '
-                          + str(f) + ' t ' + str(t) + ' was skipped\n')
-                linenum += 1
-                continue
-            
-            branch     = branches[branchid]
-            count_of_f = IDtoCountmap[f] 
-            count_of_t = IDtoCountmap[t]
+# Binary version of 'write_cuts': appends to the journal of the run the cuts
+# added and dropped since the previous call, see module cutstore. The keys
+# (cutid, family) of the cuts already journaled are kept in 
+# all_data['journaled']
 
-            if ( (branchid != branch.count) or f != (branch.f) 
-                 or (t != branch.t) ):
-                breakexit('there might be bug')
+def journal_cuts(log,all_data):
 
-            if all_data['loud_cuts']:
-                log.joint(' --> new i2-envelope cut for every time period\n')
-                log.joint(' branch ' + str(branchid) + ' f ' + str(f) + ' t ' 
-                          + str(t) + ' cutid ' + str(cutid) + '\n' )
-                log.joint(' LHS coeff ' + ' Pft ' + str(coeff_Pft) + ' Qft ' 
-                          + str(coeff_Qft) + ' cff ' + str(coeff_cff) 
-                          + ' i2ft ' + str(coeff_i2ft) + '\n' )
-            
-            if all_data['i2_validity']:
-                sol_Pf           = all_data['sol_Pfvalues'][branch]
-                sol_Qf           = all_data['sol_Qfvalues'][branch]
-                sol_c            = all_data['sol_cvalues'][branch]
-                sol_s            = all_data['sol_svalues'][branch]
-                sol_cbusf        = all_data['sol_cvalues'][buses[count_of_f]]
-                sol_cbust        = all_data['sol_cvalues'][buses[count_of_t]]
-                sol_i2f          = computei2value(log,all_data,branch,sol_c,sol_s,sol_cbusf,sol_cbust)
-                sol_viol    = coeff_Pft * sol_Pf + coeff_Qft * sol_Qf + coeff_cff * sol_cbusf + coeff_i2ft * sol_i2f
-                sol_relviol = sol_viol / ( ( coeff_Pft**2 + coeff_Qft**2 + coeff_cff**2 + coeff_i2ft**2 )**0.5 ) 
-
-                if sol_relviol > FeasibilityTol:
-                    log.joint(' WARNING, the i2-envelope cut associated to branch ' + str(branch.count) + ' f ' + str(branch.f) + ' t ' + str(branch.t) + ' is violated by the AC solution!\n')
-                    log.joint(' violation ' + str(sol_viol) + '\n')
-                    log.joint(' relative violation ' + str(sol_relviol) + '\n')
-                    log.joint(' values (AC solution) ' + ' Pft ' + str(sol_Pf) + ' Qft ' + str(sol_Qf) + ' cff ' + str(sol_cbusf) + ' i2ft ' + str(sol_i2f) + '\n' )
-                    breakexit('check!')
-                else:
-                    log.joint(' AC solution satisfies i2 inequality at branch ' + str(branch.count) + ' with slack ' + str(sol_relviol) + '\n')
-
-            for k in range(T):                
-                cutexp     = LinExpr()
-                constrname = "i2_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-                cutexp    += coeff_Pft * Pvar_f[k][branch] + coeff_Qft * Qvar_f[k][branch] + coeff_cff * cvar[k][buses[count_of_f]] + coeff_i2ft * i2var_f[k][branch]
-
-                themodel.addConstr(cutexp <= 0, name = constrname)
-                numi2added += 1
-                
-            linenum += 1
-
-
-        elif (jabr == 0) and (i2 == 0):
-            branchid   = int(thisline[1])
-            f          = int(thisline[3])
-            t          = int(thisline[5])
-            cutid      = int(thisline[7])
-            if thisline[14] == 'Pft':
-                from_or_to = 'f'
-            elif thisline[14] == 'Ptf':
-                from_or_to = 't'
-            else:
-                log.joint(' look for a bug\n')
-                breakexit('bug')
-
-            if branchid not in branches.keys(): # perturbed lines
-                log.joint(' we do not add this cut since branch ' 
-                          + str(branchid) + ' f ' + str(f) + ' t ' + str(t) 
-                          + 'was turned OFF\n')
-                linenum += 1
-                continue
+    filename = 'cuts_' + all_data['casename'] + '.cutj'
+    pool     = all_data['cutpool']
+    rnd      = all_data['round']
+    writer   = all_data['writer']
 
-            coeff_P    = float(thisline[15])
-            coeff_Q    = float(thisline[17])
+    if 'journaled' not in all_data:
+        all_data['journaled'] = np.zeros(0, dtype = np.int64)
+        writer.submit(cutstore.create,filename)
 
-            branch     = branches[branchid]
-            count_of_f = IDtoCountmap[f] 
-            count_of_t = IDtoCountmap[t]
+    cuts    = pool.rows()
+    rows    = np.flatnonzero(cuts['active'])
+    keys    = cuts['cutid'][rows] * 3 + cuts['family'][rows]
+    new     = rows[~np.isin(keys, all_data['journaled'])]
+    gone    = all_data['journaled'][~np.isin(all_data['journaled'], keys)]
+    network = all_data['network']
 
-            if ( (branchid != branch.count) or f != (branch.f) 
-                 or (t != branch.t) ):
-                breakexit('there might be bug')
+    records  = cutstore.records(len(new) + len(gone))
+    added    = records[:len(new)]
+    dropped  = records[len(new):]
 
-            if all_data['loud_cuts']:
-                log.joint(' --> new limit-envelope cut for every time period\n')
-                log.joint(' branch ' + str(branchid) + ' f ' + str(f) + ' t ' 
-                          + str(t) + ' cutid ' + str(cutid) + '\n' )
-                if from_or_to == 'f':
-                    log.joint(' LHS coeff ' + ' Pft ' + str(coeff_P) 
-                              + ' Qft ' + str(coeff_Q) + '\n')
-                elif from_or_to == 't':
-                    log.joint(' LHS coeff ' + ' Ptf ' + str(coeff_P) 
-                              + ' Qtf ' + str(coeff_Q) + '\n')
-            
-            
-            if all_data['limit_validity']:
-                if from_or_to == 'f':
-                    sol_P           = all_data['sol_Pfvalues'][branch]
-                    sol_Q           = all_data['sol_Qfvalues'][branch]
-                elif from_or_to == 't':
-                    sol_P           = all_data['sol_Ptvalues'][branch]
-                    sol_Q           = all_data['sol_Qtvalues'][branch]
-                sol_viol    = coeff_P * sol_P + coeff_Q * sol_Q - 1
-
-                if sol_viol > FeasibilityTol:
-                    log.joint(' WARNING, the limit-envelope cut associated to branch ' + str(branch.count) + ' f ' + str(branch.f) + ' t ' + str(branch.t) + ' is violated by the AC solution!\n')
-                    log.joint(' violation ' + str(sol_viol) + '\n')
-                    if from_or_to == 'f':
-                        log.joint(' values (AC solution) ' + ' Pft ' + str(sol_P) + ' Qft ' + str(sol_Q) + '\n')
-                    elif from_or_to == 't':
-                        log.joint(' values (AC solution) ' + ' Ptf ' + str(sol_P) + ' Qtf ' + str(sol_Q) + '\n')
-                    breakexit('check!')
-                else:
-                    log.joint(' AC solution satisfies limit inequality at branch ' + str(branch.count) + ' with slack ' + str(sol_viol) + '\n')
+    added['event']     = cutstore.ADD
+    added['family']    = cuts['family'][new]
+    added['end']       = np.char.encode(cuts['end'][new])
+    added['period']    = cuts['period'][new]
+    added['branch']    = network.count[cuts['branch'][new]]
+    added['f']         = network.f[cuts['branch'][new]]
+    added['t']         = network.t[cuts['branch'][new]]
+    added['cutid']     = cuts['cutid'][new]
+    added['violation'] = cuts['violation'][new]
+    added['threshold'] = cuts['threshold'][new]
+    added['coeffs']    = cuts['coeffs'][new]
+    dropped['event']   = cutstore.DROP
+    dropped['family']  = gone % 3
+    dropped['cutid']   = gone // 3
+    records['rnd']     = rnd
 
+    writer.submit(cutstore.append,filename,records)
 
-            for k in range(T):
-                cutexp     = LinExpr()
-                if from_or_to == 'f':
-                    constrname = "limit_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-                    cutexp    += coeff_P * Pvar_f[k][branch] + coeff_Q * Qvar_f[k][branch]
-                elif from_or_to == 't':
-                    constrname = "limit_cut_"+str(cutid)+"_"+str(branch.count)+"r_"+str(rnd)+"_"+str(f)+"_"+str(t)+"_"+str(k)
-                    cutexp    += coeff_P * Pvar_t[k][branch] + coeff_Q * Qvar_t[k][branch]
+    all_data['journaled'] = keys
 
-                themodel.addConstr(cutexp <= 1, name = constrname)
-            linenum += 1
+    log.joint(' journaling ' + str(len(new)) + ' new and ' + str(len(gone))
+              + ' dropped cuts of round ' + str(rnd) + ' to ' + filename + '\n')
 
-    all_data['num_jabr_cuts']  = numjabrcuts
-    all_data['num_i2_cuts']    = numi2cuts
-    all_data['num_limit_cuts'] = numlimitcuts
-    all_data['ID_jabr_cuts']   = numjabrcuts
-    all_data['ID_i2_cuts']     = numi2cuts
-    all_data['ID_limit_cuts']  = numlimitcuts
+# Name of the case whose precomputed cuts are loaded, i.e., without the 
+# suffixes of its perturbed versions
 
-# Writes cuts of the current round to a .txt file
+def precomputed_casename(all_data):
 
-def write_cuts(log,all_data):
+    if '_b' in all_data['casename']:
+        return all_data['casename'][:len(all_data['casename']) - 2]
+    elif ('_n_5_5' in all_data['casename'] or '_n_0_5' in all_data['casename'] 
+          or '_n_1_1' in all_data['casename'] or '_pline' in all_data['casename']):
+        return all_data['casename'][:len(all_data['casename']) - 6]
+    else:
+        return all_data['casename']
 
-    filename = 'cuts_' + all_data['casename'] + '.txt'
-    #filename = 'cuts/cuts_' + all_data['casename'] + '.txt'
-    log.joint(" opening file with cuts " + filename + "\n")
+# Number of variables and RHS of the cuts of every family
+CUTSHAPE = {JABR: (4, 0), I2: (4, 0), LIMIT: (2, 1)}
 
-    try:
-        thefile = open(filename, "w+") #a+ if we want to append cuts of different rounds
+# Reads a text cut file written by 'write_cuts' into cutstore records
+
+def read_cutfile(filename):
+
+    with open(filename, "r") as thefile:
         lines = thefile.readlines()
-    except:
-        log.stateandquit(" cannot open file", filename)
-        sys.exit("failure")
-    
-    jabr_cuts = all_data['jabr_cuts_info']
-    rnd       = all_data['round'] 
-
-    log.joint(' writing down to ' + filename + ' jabr-envelope cuts in round ' + str(rnd) + '\n')
-
-    thefile.write('current round = ' + str(all_data['round']) + '\n')
-    thefile.write('#Jabr-envelope cuts = ' + str(all_data['num_jabr_cuts']) + '\n')
-    for branch in jabr_cuts.keys():
-        branchcount = branch.count
-        f           = branch.f
-        t           = branch.t
-        branch_cuts = jabr_cuts[branch]
-        
-        for cutid in branch_cuts.keys():
-            cut = branch_cuts[cutid]
-            if len(cut) == 0:
-                continue
-            cut_info = 'branch ' + str(branchcount) + ' f ' + str(f) + ' t ' + str(t) + ' cutid ' + str(cutid) + ' round ' + str(cut[0]) + ' violation ' + str(cut[1]) + ' threshold ' + str(cut[6]) + ' cft ' + str(cut[2]) + ' sft ' + str(cut[3]) + ' cff ' + str(cut[4]) + ' ctt ' + str(cut[5]) + '\n'
-            thefile.write(cut_info)
-        
-    log.joint(' done writing down jabr-envelope cuts\n')
 
-    if all_data['i2cuts']:
-        log.joint(' writing down to ' + filename + ' i2-envelope cuts in round ' + str(rnd) + '\n')
-        thefile.write('#i2-envelope cuts = ' + str(all_data['num_i2_cuts']) + '\n')
-        
-        i2_cuts = all_data['i2_cuts_info']
-        for branch in i2_cuts.keys(): 
-            branchcount = branch.count
-            f           = branch.f
-            t           = branch.t
-            branch_cuts = i2_cuts[branch]
-        
-            for cutid in branch_cuts.keys():
-                cut = branch_cuts[cutid]
-                if len(cut) == 0:
-                    continue
-                cut_info = 'branch ' + str(branchcount) + ' f ' + str(f) + ' t ' + str(t) + ' cutid ' + str(cutid) + ' round ' + str(cut[0]) + ' violation ' + str(cut[1]) + ' threshold ' + str(cut[6]) + ' Pft ' + str(cut[2]) + ' Qft ' + str(cut[3]) + ' cff ' + str(cut[4]) + ' i2ft ' + str(cut[5]) + '\n'
-                thefile.write(cut_info)        
+    headers = {'#Jabr-envelope': JABR, '#i2-envelope': I2, '#limit-envelope': LIMIT}
+    family  = None
+    fields  = []
 
-        log.joint(' done writing down i2-envelope cuts\n')
+    for line in lines[1:]:
+        thisline = line.split()
+        if len(thisline) == 0:
+            continue
+        if thisline[0] in headers:
+            family = headers[thisline[0]]
+        elif family is not None:
+            fields.append((family, thisline))
 
+    cuts = cutstore.records(len(fields))
 
-    if all_data['limitcuts']:
-        log.joint(' writing down to ' + filename + ' limit-envelope cuts in round ' + str(rnd) + '\n')
-        thefile.write('#limit-envelope cuts = ' + str(all_data['num_limit_cuts']) + '\n')
-        
-        limit_cuts = all_data['limit_cuts_info']
-        for branch in limit_cuts.keys():
-            branchcount = branch.count
-            f           = branch.f   
-            t           = branch.t
-            branch_cuts = limit_cuts[branch]
-        
-            for cutid in branch_cuts.keys():
-                cut        = branch_cuts[cutid]
+    for j, (family, thisline) in enumerate(fields):
+        if family == LIMIT and thisline[14] not in ('Pft', 'Ptf'):
+            raise ValueError(filename + ': bad limit-envelope cut ' + ' '.join(thisline))
+        coeffs = [float(value) for value in thisline[15::2]]
+        cuts[j] = (cutstore.ADD, family, 
+                   b't' if thisline[14] == 'Ptf' else b'f',
+                   int(thisline[9]), 0, int(thisline[1]), int(thisline[3]),
+                   int(thisline[5]), int(thisline[7]), float(thisline[11]),
+                   float(thisline[13]), coeffs + [0] * (4 - len(coeffs)))
 
-                if len(cut) == 0:
-                    continue
+    return cuts
 
-                from_or_to = cut[6]
-                if from_or_to == 'f':
-                    cut_info = 'branch ' + str(branchcount) + ' f ' + str(f) + ' t ' + str(t) + ' cutid ' + str(cutid) + ' round ' + str(cut[0]) + ' violation ' + str(cut[1]) + ' threshold ' + str(cut[4]) + ' Pft ' + str(cut[2]) + ' Qft ' + str(cut[3]) + '\n'
-                elif from_or_to == 't':
-                    cut_info = 'branch ' + str(branchcount) + ' f ' + str(f) + ' t ' + str(t) + ' cutid ' + str(cutid) + ' round ' + str(cut[0]) + ' violation ' + str(cut[1]) + ' threshold ' + str(cut[4]) + ' Ptf ' + str(cut[2]) + ' Qtf ' + str(cut[3]) + '\n'
-                else:
-                    log.joint(' we have a bug\n')
-                    breakexit('look for the bug')
+# Reads the precomputed cuts of the case, from a text file or a journal 
+# depending on 'cutformat'
+
+def read_cuts(log,all_data):
 
-                thefile.write(cut_info)        
+    if all_data['cutformat'] == 'binary':
+        filename = '../data/cuts/cuts_' + precomputed_casename(all_data) + '.cutj'
+    else:
+        filename = '../data/cuts/cuts_' + precomputed_casename(all_data) + '.txt'
 
-        log.joint(' done writing down limit-envelope cuts\n')
+    log.joint(" opening file with cuts " + filename + "\n")
 
+    try:
+        if all_data['cutformat'] == 'binary':
+            cuts = cutstore.live(cutstore.load(filename))
+        else:
+            cuts = read_cutfile(filename)
+    except (OSError, ValueError, IndexError) as e:
+        log.joint(' cannot read file ' + filename + ': ' + str(e) + '\n')
+        sys.exit("failure")
 
-    thefile.close()
+    if len(cuts):
+        log.joint(' loading cuts from round ' + str(cuts['rnd'].max()) + '\n')
+    else:
+        log.joint(' no cuts added\n')
 
+    return cuts
 
-# Checks whether a candidate Jabr cut is parallel to the incumbent cuts,
-# see Section 5.2.1 in [1]
+# Gathers, for every time-period, the entries of the blocks of variables of
+# m loaded cuts of a family, given their branch indices 'bb' and ends 'end'. 
+# 'blocks' is either 'blockcols', giving the columns of the cuts, or a 
+# solution, see 'storesolution'. Returns a (T, m, width) array
 
-def parallel_check(log,all_data,branch,coeff_cft,coeff_sft,coeff_cff,coeff_ctt,k): 
+def loadedcut_entries(all_data,blocks,family,bb,end):
 
-    threshold         = all_data['threshold']
-    threshold_dotprod = all_data['threshold_dotprod']    
-    jabr_cuts_info    = all_data['jabr_cuts_info']
-    cuts_branch       = jabr_cuts_info[k][branch] 
-  
-    if all_data['loud_cuts']:
-        log.joint('\n -- parallel check wrt previous Jabr-envelope cuts at branch ' + str(branch.count) +'\n')
+    fidx = all_data['branch_fidx']
+    tidx = all_data['branch_tidx']
 
-    if len(cuts_branch) == 0:
-        if all_data['loud_cuts']:
-            log.joint(' first Jabr-envelope cut, we add it\n')
-        return 0 
+    if family == JABR:
+        return np.stack((blocks['cbr'][:,bb], blocks['sbr'][:,bb],
+                         blocks['cbus'][:,fidx[bb]], blocks['cbus'][:,tidx[bb]]),
+                        axis = 2)
+    elif family == I2:
+        i2pos = np.searchsorted(all_data['i2idx'], bb)
+        return np.stack((blocks['Pf'][:,bb], blocks['Qf'][:,bb],
+                         blocks['cbus'][:,fidx[bb]], blocks['i2'][:,i2pos]),
+                        axis = 2)
     else:
-        v = compute_normal(coeff_cft,coeff_sft,coeff_cff,coeff_ctt)
-        if all_data['loud_cuts']:
-            log.joint(' LHS coeffs potential cut ' + ' cft ' + str(coeff_cft) 
-                      + ' sft ' + str(coeff_sft) + ' cff ' + str(coeff_cff) 
-                      + ' ctt ' + str(coeff_ctt) + '\n' )
-
-        for cut in cuts_branch.values():
-            cutid         = cut[7]
-            cut_coeff_cft = cut[2]
-            cut_coeff_sft = cut[3]
-            cut_coeff_cff = cut[4]
-            cut_coeff_ctt = cut[5]
-            w = compute_normal(cut_coeff_cft,cut_coeff_sft,cut_coeff_cff,
-                               cut_coeff_ctt)
-            dotprod = np.dot(v,w)
-            angle = np.arccos(dotprod)
-            angle_deg = angle * 180 / np.pi
-            if all_data['loud_cuts']:
-                log.joint(' LHS coeffs of cutid ' + str(cutid) + ' cft ' 
-                          + str(cut_coeff_cft) + ' sft ' + str(cut_coeff_sft) 
-                          + ' cff ' + str(cut_coeff_cff) + ' ctt ' 
-                          + str(cut_coeff_ctt) + '\n' )
-                log.joint(' angle (rad) ' + str(angle) + ' angle (deg) ' 
-                          + str(angle_deg) +  ' dot-product ' + str(dotprod) 
-                          + '\n')
-            
-            if dotprod > 1 - threshold_dotprod:
-                if all_data['loud_cuts']:
-                    log.joint(' parallel cut, should not be added\n')
-                return 1
-            else:
-                if all_data['loud_cuts']:
-                    log.joint(' cut should be added\n')
-                return 0
-        
-# Checks whether a candidate i2 cut is parallel to the incumbent cuts,
-# see Section 5.2.1 in [1]
+        tend = (end == 't')[None,:]
+        return np.stack((np.where(tend, blocks['Pt'][:,bb], blocks['Pf'][:,bb]),
+                         np.where(tend, blocks['Qt'][:,bb], blocks['Qf'][:,bb])),
+                        axis = 2)
 
-def parallel_check_i2(log,all_data,branch,coeff_Pft,coeff_Qft,coeff_cff,coeff_i2ft,k):
+# The AC solution loaded for the validity checks, as (T, n) arrays with the
+# same blocks as all_data['solarrays']
 
-    threshold         = all_data['threshold']
-    threshold_dotprod = all_data['threshold_dotprod']    
-    i2_cuts_info      = all_data['i2_cuts_info']      
-    cuts_branch       = i2_cuts_info[k][branch]          
+def sol_blockvalues(all_data):
 
-    if all_data['loud_cuts']:
-        log.joint('\n -- parallel check wrt previous i2-envelope cuts at branch ' + str(branch.count) +'\n')
+    T          = all_data['T']
+    buslist    = list(all_data['buses'].values())
+    branchlist = list(all_data['branches'].values())
 
-    if len(cuts_branch) == 0:
-        if all_data['loud_cuts']:
-            log.joint(' first i2-envelope cut, we add it\n')
-        return 0 
-    else:
-        v = compute_normal(coeff_Pft,coeff_Qft,coeff_cff,coeff_i2ft)
-        if all_data['loud_cuts']:
-            log.joint(' LHS coeffs potential cut ' + ' Pft ' + str(coeff_Pft) 
-                      + ' Qft ' + str(coeff_Qft) + ' cff ' + str(coeff_cff) 
-                      + ' i2ft ' + str(coeff_i2ft) + '\n' )
-
-        for cut in cuts_branch.values():
-            cutid      = cut[7]
-            cut_coeff_Pft  = cut[2]
-            cut_coeff_Qft  = cut[3]
-            cut_coeff_cff  = cut[4]
-            cut_coeff_i2ft = cut[5]
-            w = compute_normal(cut_coeff_Pft,cut_coeff_Qft,cut_coeff_cff,
-                               coeff_i2ft)
-            dotprod = np.dot(v,w)
-            angle = np.arccos(dotprod)
-            angle_deg = angle * 180 / np.pi
-            if all_data['loud_cuts']:
-                log.joint(' LHS coeffs of cutid ' + str(cutid) + ' cft ' 
-                          + str(cut_coeff_Pft) + ' sft ' + str(cut_coeff_Qft) 
-                          + ' cff ' + str(cut_coeff_cff) + ' ctt ' 
-                          + str(cut_coeff_i2ft) + '\n' )
-                log.joint(' angle (rad) ' + str(angle) + ' angle (deg) ' 
-                          + str(angle_deg) +  ' dot-product ' + str(dotprod) 
-                          + '\n')
-            if dotprod > 1 - threshold_dotprod:
-                if all_data['loud_cuts']:
-                    log.joint(' parallel cut, should not be added\n')
-                return 1
-            else:
-                if all_data['loud_cuts']:
-                    log.joint(' cut should be added\n')
-                return 0
+    def block(values, objs):
+        return np.array([[values[k][obj] for obj in objs] 
+                         for k in range(T)]).reshape(T,len(objs))
 
+    blocks = {'cbus' : block(all_data['sol_cvalues'], buslist),
+              'cbr'  : block(all_data['sol_cvalues'], branchlist),
+              'sbr'  : block(all_data['sol_svalues'], branchlist),
+              'Pf'   : block(all_data['sol_Pfvalues'], branchlist),
+              'Qf'   : block(all_data['sol_Qfvalues'], branchlist),
+              'Pt'   : block(all_data['sol_Ptvalues'], branchlist),
+              'Qt'   : block(all_data['sol_Qtvalues'], branchlist)}
 
-# Checks whether a candidate limit cut is parallel to the incumbent cuts,
-# see Section 5.2.1 in [1]
+    if all_data['i2']:
+        blocks['i2'] = compute_sol_i2values(all_data,all_data['i2idx'])
 
-def parallel_check_limit(log,all_data,branch,coeff_P,coeff_Q,from_or_to,k):
+    return blocks
 
-    threshold         = all_data['threshold']
-    threshold_dotprod = all_data['threshold_dotprod']    
-    limit_cuts_info   = all_data['limit_cuts_info']
-    cuts_branch       = limit_cuts_info[k][branch]          
+# Checks that the loaded cuts of a family are satisfied by the AC solution 
+# at every time-period; Jabr and i2-envelope cuts are scaled by their norm
 
-    if all_data['loud_cuts']:
-        log.joint('\n -- parallel check wrt previous limit-envelope cuts at branch ' + str(branch.count) +'\n')
+def check_loadedcuts(log,all_data,family,loaded,solblocks):
 
-    if len(cuts_branch) == 0:
-        if all_data['loud_cuts']:
-            log.joint(' first limit-envelope cut, we add it\n')
-        return 0 
-    else:        
-        v = compute_normal(coeff_P,coeff_Q)
-        if all_data['loud_cuts']:
-            if from_or_to == 'f':
-                log.joint(' LHS coeffs potential cut ' + ' Pft ' 
-                          + str(coeff_P) + ' Qft ' + str(coeff_Q) + '\n')
-            elif from_or_to == 't':
-                log.joint(' LHS coeffs potential cut ' + ' Ptf ' 
-                          + str(coeff_P) + ' Qtf ' + str(coeff_Q) + '\n' )
-
-        for cut in cuts_branch.values(): 
-            cutid          = cut[5]
-            cut_coeff_P    = cut[2]
-            cut_coeff_Q    = cut[3]
-            cut_from_or_to = cut[6]
-
-            # We check whether potential cut has the same sense (from/to) 
-            # as the incumbent cut
-            if from_or_to != cut_from_or_to:  
-                continue                    
-
-            w         = compute_normal(cut_coeff_P,cut_coeff_Q)
-            dotprod   = np.dot(v,w)
-            angle     = np.arccos(dotprod)
-            angle_deg = angle * 180 / np.pi
-            
-            if all_data['loud_cuts']:
-                if cut_from_or_to == 'f':
-                    log.joint(' LHS coeffs of cutid ' + str(cutid) + ' Pft ' 
-                              + str(cut_coeff_P) + ' Qft ' + str(cut_coeff_Q) 
-                              + '\n')
-                elif cut_from_or_to == 't':
-                    log.joint(' LHS coeffs of cutid ' + str(cutid) + ' Ptf ' 
-                              + str(cut_coeff_P) + ' Qtf ' + str(cut_coeff_Q) 
-                              + '\n')
-                log.joint(' angle (rad) ' + str(angle) + ' angle (deg) ' 
-                          + str(angle_deg) +  ' dot-product ' + str(dotprod) 
-                          + '\n')
-
-            if dotprod > 1 - threshold_dotprod:
-                if all_data['loud_cuts']:
-                    log.joint(' parallel cut, should not be added\n')
-                return 1
-            else:
-                if all_data['loud_cuts']:
-                    log.joint(' cut should be added\n')
-                return 0
-            
-# Computes the value of the i2 variable of a given branch using squared 
-# voltages of 'from' and 'to' buses (sol_cbusf,sol_cbust) and the corresponding 
-# c and s values (sol_c,sol_s). See equation (29) in [1]
+    width, rhs = CUTSHAPE[family]
+    coeffs     = loaded['coeffs']
+    values     = loadedcut_entries(all_data,solblocks,family,loaded['bb'],
+                                   loaded['end'])
+    violation  = np.einsum('kmw,mw->km', values, coeffs) - rhs
 
-def computei2value(log,all_data,branch,sol_c,sol_s,sol_cbusf,sol_cbust):
-    
-    ratio  = branch.ratio
-    y      = branch.y
-    g      = y.real
-    b      = y.imag
-    bshunt = branch.bc
-    angle  = branch.angle_rad
-                                                                                
-    i2f  = 0
-    i2f += (g*g + b*b)/(ratio*ratio) * ( (sol_cbusf/(ratio*ratio)) + sol_cbust - (2/ratio) * ( sol_c * math.cos(angle) + sol_s * math.sin(angle) ) )
-    i2f += b*bshunt/(ratio**3) * ( (sol_cbusf/ratio) - (sol_c * math.cos(angle) + sol_s * math.sin(angle) )) 
-    i2f += g*bshunt/(ratio**3) * ( sol_s * math.cos(angle) - sol_c * math.sin(angle) )
-    i2f += (bshunt*bshunt*sol_cbusf/(4*(ratio**4)) )
-        
-    return i2f
+    if family != LIMIT:
+        violation /= np.linalg.norm(coeffs, axis = 1)
 
+    if violation.size == 0:
+        return None
 
-# Loads previously computed cuts. This function is called if multiple 
-# cutting-plane rounds want to be run after loading the cuts
+    for k, j in zip(*np.nonzero(violation > all_data['FeasibilityTol'])):
+        branch = loaded['branch'][j]
+        log.joint(' WARNING, the ' + FAMILYNAMES[family] + '-envelope cut '
+                  + 'associated to branch ' + str(branch.count) + ' k ' + str(k)
+                  + ' f ' + str(branch.f) + ' t ' + str(branch.t)
+                  + ' is violated by the AC solution!\n')
+        log.joint(' violation ' + str(violation[k,j]) + '\n')
+        log.joint(' values (AC solution) ' + str(values[k,j].tolist()) + '\n')
+        breakexit('check!')
 
-def add_cuts_ws(log,all_data):
+    log.joint(' AC solution satisfies the ' + FAMILYNAMES[family] 
+              + '-envelope cuts, max violation ' + str(violation.max()) + '\n')
 
-    log.joint('\n')
-    log.joint(' **** loading precomputed cuts ****\n')
-    
-    if '_b' in all_data['casename']:
-        original_casename = all_data['casename'][:len(all_data['casename']) - 2]
-    elif ('_n_5_5' in all_data['casename'] or '_n_0_5' in all_data['casename'] 
-          or '_n_1_1' in all_data['casename'] or '_pline' in all_data['casename']):
-        original_casename = all_data['casename'][:len(all_data['casename']) - 6]        
-    #elif '_line5' in all_data['casename']:
-    #    original_casename = all_data['casename'][:len(all_data['casename']) - 6]
-    else:
-        original_casename = all_data['casename']
+# Loads previously computed cuts, see 'read_cuts'. Each cut is meant for 
+# every time-period. If only one round is run (max_rounds 1) cuts are added
+# to the model as they are, else they are tracked in the cut pool as cuts of
+# round 0 and may be dropped. With 'lazycuts', the cuts are not added but
+# kept in all_data['lazycuts'], and 'activate_cuts' adds a cut to a 
+# time-period once the solution violates it there
 
-    filename = '../data/cuts/cuts_' + original_casename + '.txt' 
-    log.joint(" opening file with cuts " + filename + "\n")
+def load_cuts(log,all_data):
 
+    log.joint('\n')
+    log.joint(' **** loading precomputed cuts ****\n')
 
-    try:
-        thefile = open(filename, "r") 
-        lines = thefile.readlines()
-    except:
-        log.stateandquit(" cannot open file", filename)
-        sys.exit("failure")
+    cuts       = read_cuts(log,all_data)
+    T          = all_data['T']
+    branchlist = list(all_data['branches'].values())
+    network    = all_data['network']
+    counts     = network.count
+    fbus       = network.f
+    tbus       = network.t
+    tracked    = all_data['max_rounds'] > 1
+    lazy       = all_data['lazycuts'] and tracked
+
+    if all_data['lazycuts'] and not tracked:
+        log.joint(' lazycuts ignored, a single round is run\n')
+
+    # Position of the branch of every cut in the current case
+    order   = np.argsort(counts)
+    pos     = order[np.minimum(np.searchsorted(counts[order], cuts['branch']),
+                               len(counts) - 1)]
+    present = counts[pos] == cuts['branch']
+
+    if np.count_nonzero(~present):
+        log.joint(' we do not add ' + str(np.count_nonzero(~present)) 
+                  + ' cuts since their branches were turned OFF\n')
+
+    if np.any(((fbus[pos] != cuts['f']) | (tbus[pos] != cuts['t'])) & present):
+        breakexit('bug')
+
+    if (all_data['jabr_validity'] or all_data['i2_validity'] 
+        or all_data['limit_validity']):
+        solblocks = sol_blockvalues(all_data)
+
+    validity = {JABR: all_data['jabr_validity'], I2: all_data['i2_validity'],
+                LIMIT: all_data['limit_validity']}
+    infile   = {}
+    numadded = {}
+
+    all_data['lazycuts_pool'] = {}
+
+    for family in (JABR, I2, LIMIT):
+        width, rhs     = CUTSHAPE[family]
+        thisfamily     = cuts['family'] == family
+        infile[family] = np.count_nonzero(thisfamily)
+        keep           = thisfamily & present
+
+        # i2-envelope cuts only for the branches with an i2 variable
+        if family == I2:
+            if all_data['i2'] == 0:
+                infile[family] = numadded[family] = 0
+                continue
+            keep &= np.isin(pos, all_data['i2idx'])
+
+        log.joint(' number of ' + FAMILYNAMES[family] + '-envelope cuts in file = ' 
+                  + str(infile[family]) + '\n')
+
+        rows   = np.flatnonzero(keep)
+        loaded = {'bb': pos[rows],
+                  'branch': [branchlist[j] for j in pos[rows].tolist()],
+                  'end': np.char.decode(cuts['end'][rows]),
+                  'cutid': cuts['cutid'][rows],
+                  'rnd': cuts['rnd'][rows],
+                  'violation': cuts['violation'][rows],
+                  'threshold': cuts['threshold'][rows],
+                  'coeffs': cuts['coeffs'][rows,:width]}
+        m      = len(rows)
 
-    numlines  = len(lines)
-    theround  = lines[0].split()[3]
-    firstline = lines[1].split()
-    jabr      = 1
-    
-    log.joint(' loading cuts from round ' + str(theround) + '\n')
-
-    if firstline[0] == '#Jabr-envelope':
-        numjabrcuts = int(firstline[3])
-        log.joint(' number of Jabr-envelope cuts in file = ' + str(numjabrcuts) + '\n')
-    elif firstline[0] == '#i2-envelope':
-        jabr      = 0
-        i2        = 1
-        numi2cuts = int(firstline[3])
-        log.joint(' no Jabr-envelope cuts to add\n')
-        log.joint(' number of i2-envelope cuts in file = ' + str(numi2cuts) + '\n')
-    elif firstline[0] == '#limit-envelope':
-        jabr         = 0
-        i2           = 0
-        numlimitcuts = int(firstline[3])
-        all_data['addcuts_numlimitcuts'] = numlimitcuts
-        log.joint(' no Jabr nor i2-envelope cuts to add\n')
-        log.joint(' number of limit-envelope cuts in file = ' + str(numlimitcuts) + '\n')
+        if all_data['loud_cuts']:
+            for j in range(m):
+                branch = loaded['branch'][j]
+                log.joint(' --> new ' + FAMILYNAMES[family] + '-envelope cut '
+                          + 'for every time period\n')
+                log.joint(' branch ' + str(branch.count) + ' f ' + str(branch.f)
+                          + ' t ' + str(branch.t) + ' cutid ' 
+                          + str(loaded['cutid'][j]) + '\n')
+                log.joint(' LHS coeff ' + str(loaded['coeffs'][j].tolist()) + '\n')
+
+        if validity[family]:
+            check_loadedcuts(log,all_data,family,loaded,solblocks)
+
+        if lazy:
+            # Time-periods where a cut has not been added yet
+            loaded['pending']                 = np.ones((T,m), dtype = bool)
+            all_data['lazycuts_pool'][family] = loaded
+            numadded[family]                  = 0
+        else:
+            # Cut-major, i.e., every cut for time-periods 0, ..., T - 1
+            jj = np.repeat(np.arange(m), T)
+            kk = np.tile(np.arange(T), m)
+            add_loadedcuts(all_data,family,loaded,jj,kk,tracked,0)
+            numadded[family] = m * T
+
+    if tracked:
+        flush_cuts(log,all_data)
+        count = numadded
     else:
-        log.joint(' no cuts added\n')
-        return None
+        # As before, these count the cuts in the file
+        count = infile
+
+    all_data['num_jabr_cuts']  = all_data['ID_jabr_cuts']  = count[JABR]
+    all_data['num_i2_cuts']    = all_data['ID_i2_cuts']    = count[I2]
+    all_data['num_limit_cuts'] = all_data['ID_limit_cuts'] = count[LIMIT]
+
+    if lazy:
+        count = {family: all_data['lazycuts_pool'][family]['pending'].size
+                 if family in all_data['lazycuts_pool'] else 0
+                 for family in (JABR, I2, LIMIT)}
+
+    all_data['addcuts_numjabrcuts']  = count[JABR]
+    all_data['addcuts_numi2cuts']    = count[I2]
+    all_data['addcuts_numlimitcuts'] = count[LIMIT]
+
+    if lazy:
+        log.joint(' -- number of cuts kept for lazy activation\n')
+        log.joint(' Jabr-envelope cuts= ' + str(count[JABR]) + '\n')
+        log.joint(' i2-envelope cuts = ' + str(count[I2]) + '\n')
+        log.joint(' limit-envelope cuts = ' + str(count[LIMIT]) + '\n')
+    else:
+        log.joint(' -- number of cuts added and propagated\n')
+        log.joint(' Jabr-envelope cuts= ' + str(numadded[JABR]) + '\n')
+        log.joint(' i2-envelope cuts = ' + str(numadded[I2]) + '\n')
+        log.joint(' limit-envelope cuts = ' + str(numadded[LIMIT]) + '\n')
+
+# Adds the loaded cuts jj[i] of a family for time-periods kk[i]. Tracked 
+# cuts are queued for 'flush_cuts' with new cutids and round 'rnd', the
+# others are added right away with their cutids and rounds in the file
+
+def add_loadedcuts(all_data,family,loaded,jj,kk,tracked,rnd):
+
+    width, rhs = CUTSHAPE[family]
+    n          = len(jj)
+    cutcols    = loadedcut_entries(all_data,blockcols(all_data),family,
+                                   loaded['bb'][jj],loaded['end'][jj])
+    cutcols    = cutcols[kk,np.arange(n)]
+    coeffs     = loaded['coeffs'][jj]
+    branches   = [loaded['branch'][j] for j in jj.tolist()]
+    ends       = loaded['end'][jj]
+
+    if tracked:
+        IDkey  = ('ID_jabr_cuts', 'ID_i2_cuts', 'ID_limit_cuts')[family]
+        cutids = np.arange(all_data[IDkey], all_data[IDkey] + n)
+        rnds   = np.full(n, rnd)
+    else:
+        cutids = loaded['cutid'][jj]
+        rnds   = loaded['rnd'][jj]
 
-    linenum = 2
+    if family == LIMIT:
+        names = [(limit_cutname,(cutid,branch,r,k,e)) for cutid, branch, r, k, e
+                 in zip(cutids.tolist(), branches, rnds.tolist(), kk.tolist(),
+                        ends.tolist())]
+    else:
+        cutname = jabr_cutname if family == JABR else i2_cutname
+        names   = [(cutname,(cutid,branch,r,k)) for cutid, branch, r, k
+                   in zip(cutids.tolist(), branches, rnds.tolist(), kk.tolist())]
+
+    if tracked:
+        queue_cuts(all_data,family,rnd,cutids,loaded['bb'][jj],kk,
+                   loaded['violation'][jj],loaded['threshold'][jj],coeffs,
+                   cutcols,rhs,names,ends)
+    else:
+        constrs = add_cutrows(all_data,cutcols,coeffs,np.full(n, rhs))
+        name_cutrows(all_data,constrs,names,False)
 
-    themodel       = all_data['themodel']
-    buses          = all_data['buses']
-    branches       = all_data['branches']
-    IDtoCountmap   = all_data['IDtoCountmap']
-    cvar           = all_data['cvar']
-    svar           = all_data['svar']
-    Pvar_f         = all_data['Pvar_f']
-    Qvar_f         = all_data['Qvar_f']
-    Pvar_t         = all_data['Pvar_t']
-    Qvar_t         = all_data['Qvar_t']    
-    FeasibilityTol = all_data['FeasibilityTol']
-    T              = all_data['T']
-    alphadic       = all_data['alphadic']
+# Adds, for every time-period, the loaded cuts kept by 'load_cuts' in lazy
+# mode that the current solution violates by more than FeasibilityTol. 
+# Added cuts are tracked in the cut pool as cuts of the current round
 
-    jabr_cuts       = all_data['jabr_cuts']
-    jabr_cuts_info  = all_data['jabr_cuts_info']
+def activate_cuts(log,all_data):
 
-    if all_data['i2']:
-        i2var_f    = all_data['i2var_f']
+    if len(all_data.get('lazycuts_pool', {})) == 0:
+        return None
 
-    if all_data['i2cuts']:
-        i2_cuts         = all_data['i2_cuts']     
-        i2_cuts_info    = all_data['i2_cuts_info']
-        
-    limit_cuts      = all_data['limit_cuts']
-    limit_cuts_info = all_data['limit_cuts_info']
+    rnd = all_data['round']
 
-    cutid_jabr  = 0
-    cutid_i2    = 0
-    cutid_limit = 0
+    for family, loaded in all_data['lazycuts_pool'].items():
+        width, rhs = CUTSHAPE[family]
+        values     = loadedcut_entries(all_data,all_data['solarrays'],family,
+                                       loaded['bb'],loaded['end'])
+        violation  = np.einsum('kmw,mw->km', values, loaded['coeffs']) - rhs
+        kk, jj     = np.nonzero(loaded['pending'] 
+                                & (violation > all_data['FeasibilityTol']))
 
-    numjabradded  = 0
-    numi2added    = 0
-    numlimitadded = 0
-    
-    while linenum < numlines: 
-        thisline = lines[linenum].split()
-        if thisline[0] == '#i2-envelope' and jabr:
-            numi2cuts = int(thisline[3])
-            all_data['addcuts_numi2cuts'] = numi2cuts
-            log.joint(' number of i2-envelope cuts in file = '
-                      + str(numi2cuts) + '\n')
-            linenum += 1
-            jabr     = 0
-            i2       = 1
+        if len(kk) == 0:
             continue
 
-        elif thisline[0] == '#limit-envelope' and i2:
-            numlimitcuts = int(thisline[3])
-            log.joint(' number of limit-envelope cuts in file = '
-                      + str(numlimitcuts) + '\n')
-            linenum += 1
-            i2       = 0
-            continue
+        add_loadedcuts(all_data,family,loaded,jj,kk,True,rnd)
+        loaded['pending'][kk,jj] = False
 
-        elif jabr:
-            branchid  = int(thisline[1])
-            f         = int(thisline[3])
-            t         = int(thisline[5])
-            rnd       = 0
-            violation = float(thisline[11])
-            threshold = float(thisline[13])
-            coeff_cft = float(thisline[15])
-            coeff_sft = float(thisline[17])
-            coeff_cff = float(thisline[19])
-            coeff_ctt = float(thisline[21])
-
-
-            if branchid not in branches.keys(): # perturbed lines
-                log.joint(' we do not add this cut since branch ' + str(branchid) 
-                          + ' f ' + str(f) + ' t ' + str(t) 
-                          + ' was turned OFF\n')
-                linenum += 1
-                continue
+        counter = ('jabr', 'i2', 'limit')[family]
+        all_data['ID_' + counter + '_cuts']  += len(kk)
+        all_data['num_' + counter + '_cuts'] += len(kk)
 
-            branch     = branches[branchid]
-            count_of_f = IDtoCountmap[f] 
-            count_of_t = IDtoCountmap[t]
+        log.joint(' activated ' + str(len(kk)) + ' loaded ' + FAMILYNAMES[family]
+                  + '-envelope cuts, ' + str(np.count_nonzero(loaded['pending']))
+                  + ' left\n')
 
-            if (branchid != branch.count) or f != (branch.f) or (t != branch.t):
-                log.joint(' branchid ' + str(branchid) + ' branch.count ' 
-                          + str(branch.count) + ' f ' + str(f) + ' branch.f ' 
-                          + str(branch.f) + ' t ' + str(t) + ' branch.t ' 
-                          + str(branch.t) + '\n')
-                breakexit('bug')
 
+# Checks which candidate cuts are parallel to the incumbent cuts of the same
+# family, time-period, branch and end, see Section 5.2.1 in [1]. Candidates
+# are compared with all the incumbents at once using the normals kept in the
+# cut pool, or, if 'parallel_check_mode' is 'hash', looked up in its hash 
+# table of normals. 'selected[k]' holds, for time-period k, positions in
+# the kernel output 'coeffs'; 'branchidx' and 'ends' give the branch index 
+# and end of every position. Returns, for every time-period, a boolean array
+# aligned with 'selected'
 
-            if all_data['loud_cuts']:
-                log.joint(' --> new Jabr-envelope cut for every time period\n')
-                log.joint(' branch ' + str(branchid) + ' f ' + str(f) + ' t ' 
-                          + str(t) + ' rnd ' + str(rnd)
-                          + ' cutid ' + str(cutid_jabr) + '\n' )
-                log.joint(' LHS coeff ' + ' cft ' + str(coeff_cft) + ' sft ' 
-                          + str(coeff_sft) + ' cff ' + str(coeff_cff) 
-                          + ' ctt ' + str(coeff_ctt) + '\n' )
+def parallel_check(log,all_data,family,selected,coeffs,branchidx,ends = 'f'):
 
-            if all_data['jabr_validity']:
-                for k in range(T):
-                    sol_c       = all_data['sol_cvalues'][k][branch]
-                    sol_s       = all_data['sol_svalues'][k][branch]
-                    sol_cbusf   = all_data['sol_cvalues'][k][buses[count_of_f]]
-                    sol_cbust   = all_data['sol_cvalues'][k][buses[count_of_t]]
-                    sol_viol    = coeff_cft * sol_c + coeff_sft * sol_s + coeff_cff * sol_cbusf + coeff_ctt * sol_cbust
-                    sol_relviol = sol_viol / ( ( coeff_cft**2 + coeff_sft**2 + coeff_cff**2 + coeff_ctt**2 )**0.5 ) 
-
-                    if sol_relviol > FeasibilityTol:
-                        log.joint(' WARNING, the Jabr-envelope cut associated '
-                                  + 'to branch ' + str(branch.count) + ' k '
-                                  + str(k) + ' f ' + str(branch.f)
-                                  + ' t ' + str(branch.t)
-                                  + ' is violated by the AC solution!\n')
-                        log.joint(' violation ' + str(sol_viol) + '\n')
-                        log.joint(' relative violation ' + str(sol_relviol)
-                                  + '\n')
-                        log.joint(' values (AC solution)' + ' cft '
-                                  + str(sol_c) + ' sft ' + str(sol_s)
-                                  + ' cff ' + str(sol_cbusf) + ' ctt '
-                                  + str(sol_cbust) + '\n' )
-                        breakexit('check!')
-                    else:
-                        log.joint(' AC solution satisfies Jabr inequality '
-                                  + 'at branch ' + str(branch.count)
-                                  + ' with slack ' + str(sol_relviol) + '\n')
-                    
-            
-            for k in range(T):
-                # Updating dictionaries
-                jabr_cuts[(cutid_jabr,branchid)]   = (rnd,threshold,k)
-                jabr_cuts_info[k][branch][cutid_jabr] = (rnd,violation,
-                                                         coeff_cft,coeff_sft,
-                                                         coeff_cff,coeff_ctt,
-                                                         threshold,cutid_jabr)
-                
-                cutexp = LinExpr()
-                constrname = "jabr_cut_"+str(cutid_jabr)+"_"+str(branchid)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-                cutexp += (coeff_cft * cvar[k][branch]
-                           + coeff_sft * svar[k][branch]
-                           + coeff_cff * cvar[k][buses[count_of_f]]
-                           + coeff_ctt * cvar[k][buses[count_of_t]])
-                
-                themodel.addConstr(cutexp <= 0, name = constrname)
-                numjabradded += 1
-                cutid_jabr += 1                
-                
-            linenum += 1
-
-        elif (jabr == 0) and i2 and all_data['i2']:
-            
-            branchid   = int(thisline[1])
-            f          = int(thisline[3])
-            t          = int(thisline[5])
-            #cutid      = int(thisline[7])
-            #rnd        = int(thisline[9])
-            rnd        = 0
-            violation  = float(thisline[11])
-            threshold  = float(thisline[13])
-            coeff_Pft  = float(thisline[15])
-            coeff_Qft  = float(thisline[17])
-            coeff_cff  = float(thisline[19])
-            coeff_i2ft = float(thisline[21])
-            alpha      = all_data['alphadic'][branches[branchid]]
-            
-            if branchid not in branches.keys(): # perturbed lines
-                log.joint(' we do not add this cut since branch ' + str(branchid) + ' f ' + str(f) + ' t ' + str(t) + 'was turned OFF\n')
-                linenum += 1
-                continue
+    pool       = all_data['cutpool']
+    branchlist = list(all_data['branches'].values())
+    T          = all_data['T']
+    sizes      = [len(selected[k]) for k in range(T)]
+    kk         = np.repeat(np.arange(T), sizes)
+    jj         = np.concatenate([selected[k] for k in range(T)]).astype(int)
+    end        = np.asarray(ends)[jj] if np.ndim(ends) else ends
 
-            if alpha >= all_data['rho_threshold']:
-                if all_data['loud_cuts']:
-                    log.joint(' bad coeffs: branch ' + str(branchid) + ' f '
-                              + str(f) + ' t ' + str(t) + ' was skipped\n')
-                linenum += 1
-                continue
-            
-            branch     = branches[branchid]
-            count_of_f = IDtoCountmap[f] 
-            count_of_t = IDtoCountmap[t]
+    if all_data['parallel_check_mode'] == 'hash':
+        parallel = pool.parallel_hash(family,kk,branchidx[jj],end,coeffs[kk,jj])
+    else:
+        parallel = pool.parallel(family,kk,branchidx[jj],end,coeffs[kk,jj],
+                                 all_data['threshold_dotprod'])
 
-            if (branchid != branch.count) or f != (branch.f) or (t != branch.t):
-                breakexit('there might be bug')
-            
+    if all_data['loud_cuts']:
+        for k, j in zip(kk[parallel].tolist(), jj[parallel].tolist()):
+            log.joint(' parallel ' + FAMILYNAMES[family] + '-envelope cut at'
+                      + ' branch ' + str(branchlist[branchidx[j]].count)
+                      + ' time-period ' + str(k) + ', should not be added\n')
 
-            if all_data['loud_cuts']:
-                log.joint(' --> new i2-envelope cut for every time period\n')
-                log.joint(' branch ' + str(branchid) + ' f ' + str(f) + ' t ' 
-                          + str(t) + ' cutid ' + str(cutid_i2) + '\n' )
-                log.joint(' LHS coeff ' + ' Pft ' + str(coeff_Pft) + ' Qft ' 
-                          + str(coeff_Qft) + ' cff ' + str(coeff_cff) 
-                          + ' i2ft ' + str(coeff_i2ft) + '\n' )
+    log.joint('  parallel ' + FAMILYNAMES[family] + '-envelope cuts skipped '
+              + str(int(np.count_nonzero(parallel))) + '\n')
 
-            if all_data['i2_validity']:
-                for k in range(T):
-                    
-                    sol_Pf    = all_data['sol_Pfvalues'][k][branch]
-                    sol_Qf    = all_data['sol_Qfvalues'][k][branch]
-                    sol_c     = all_data['sol_cvalues'][k][branch]
-                    sol_s     = all_data['sol_svalues'][k][branch]
-                    sol_cbusf = all_data['sol_cvalues'][k][buses[count_of_f]]
-                    sol_cbust = all_data['sol_cvalues'][k][buses[count_of_t]]
-                    sol_i2f   = computei2value(log,all_data,branch,sol_c,
-                                               sol_s,sol_cbusf,sol_cbust)   
-                    sol_viol    = coeff_Pft * sol_Pf + coeff_Qft * sol_Qf + coeff_cff * sol_cbusf + coeff_i2ft * sol_i2f
-                    sol_relviol = sol_viol / ( ( coeff_Pft**2 + coeff_Qft**2 + coeff_cff**2 + coeff_i2ft**2 )**0.5 )                     
-
-                    if sol_relviol > FeasibilityTol:
-                        log.joint(' WARNING, the i2-envelope cut associated '
-                                  + 'to branch ' + str(branch.count) + ' k '
-                                  + str(k) + ' f ' + str(branch.f)
-                                  + ' t ' + str(branch.t)
-                                  + ' is violated by the AC solution!\n')
-                        log.joint(' violation ' + str(sol_viol) + '\n')
-                        log.joint(' relative violation ' + str(sol_relviol)
-                                  + '\n')
-                        log.joint(' values (AC solution) ' + ' Pft '
-                                  + str(sol_Pf) + ' Qft ' + str(sol_Qf)
-                                  + ' cff ' + str(sol_cbusf) + ' i2ft '
-                                  + str(sol_i2f) + '\n' )                 
-                        breakexit('check!')
-                    else:
-                        log.joint(' AC solution satisfies the i2-cut '
-                                  + 'at branch ' + str(branch.count)
-                                  + ' with slack ' + str(sol_relviol) + '\n')
-
-            for k in range(T):
-                # Updating dictionaries            
-                i2_cuts[(cutid_i2,branchid)]   = (rnd,threshold,k)
-                i2_cuts_info[k][branch][cutid_i2] = (rnd,violation,coeff_Pft,
-                                                     coeff_Qft,coeff_cff,
-                                                     coeff_i2ft,threshold,cutid_i2)
-                    
-                cutexp     = LinExpr()
-                constrname = "i2_cut_"+str(cutid_i2)+"_"+str(branchid)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-                cutexp    += (coeff_Pft * Pvar_f[k][branch]
-                              + coeff_Qft * Qvar_f[k][branch]
-                              + coeff_cff * cvar[k][buses[count_of_f]]
-                              + coeff_i2ft * i2var_f[k][branch])
-
-                themodel.addConstr(cutexp <= 0, name = constrname)
-                numi2added += 1
-                cutid_i2   += 1 # updating i2-cut counter
-                
-            linenum += 1
-
-
-        elif (jabr == 0) and (i2 == 0):
-            branchid   = int(thisline[1])
-            f          = int(thisline[3])
-            t          = int(thisline[5])
-            cutid      = int(thisline[7])
-            if thisline[14] == 'Pft':
-                from_or_to = 'f'
-            elif thisline[14] == 'Ptf':
-                from_or_to = 't'
-            else:
-                log.joint(' look for a bug\n')
-                breakexit('bug')
+    return np.split(parallel, np.cumsum(sizes)[:-1])
 
-            if branchid not in branches.keys(): # perturbed lines
-                log.joint(' we do not add this cut since branch ' + str(branchid) + ' f ' + str(f) + ' t ' + str(t) + 'was turned OFF\n')
-                linenum += 1
-                continue
+# Computes the value of the i2 variable of a given branch using squared 
+# voltages of 'from' and 'to' buses (sol_cbusf,sol_cbust) and the corresponding 
+# c and s values (sol_c,sol_s). See equation (29) in [1]
 
-            #rnd        = int(thisline[9])
-            rnd        = 0
-            violation  = float(thisline[11])
-            threshold  = float(thisline[13])
-            coeff_P    = float(thisline[15])
-            coeff_Q    = float(thisline[17])
+def computei2value(log,all_data,branch,sol_c,sol_s,sol_cbusf,sol_cbust):
+    
+    ratio  = branch.ratio
+    y      = branch.y
+    g      = y.real
+    b      = y.imag
+    bshunt = branch.bc
+    angle  = branch.angle_rad
+                                                                                
+    i2f  = 0
+    i2f += (g*g + b*b)/(ratio*ratio) * ( (sol_cbusf/(ratio*ratio)) + sol_cbust - (2/ratio) * ( sol_c * math.cos(angle) + sol_s * math.sin(angle) ) )
+    i2f += b*bshunt/(ratio**3) * ( (sol_cbusf/ratio) - (sol_c * math.cos(angle) + sol_s * math.sin(angle) )) 
+    i2f += g*bshunt/(ratio**3) * ( sol_s * math.cos(angle) - sol_c * math.sin(angle) )
+    i2f += (bshunt*bshunt*sol_cbusf/(4*(ratio**4)) )
+        
+    return i2f
 
-            branch     = branches[branchid]
-            count_of_f = IDtoCountmap[f] 
-            count_of_t = IDtoCountmap[t]
 
-            if (branchid != branch.count) or f != (branch.f) or (t != branch.t):
-                breakexit('there might be bug')
+# Computes, for every time-period, the value of i2 at the AC solution 
+# previously loaded of the branches in 'i2idx', c.f. 'computei2value'
 
-            if all_data['loud_cuts']:
-                log.joint(' --> new limit-envelope cut for every time period\n')
-                log.joint(' branch ' + str(branchid) + ' f ' + str(f) + ' t ' 
-                          + str(t) + ' cutid ' + str(cutid_limit) + '\n' )
-                if from_or_to == 'f':
-                    log.joint(' LHS coeff ' + ' Pft ' + str(coeff_P) 
-                              + ' Qft ' + str(coeff_Q) + '\n')
-                elif from_or_to == 't':
-                    log.joint(' LHS coeff ' + ' Ptf ' + str(coeff_P) 
-                              + ' Qtf ' + str(coeff_Q) + '\n')
-            
-            if all_data['i2_validity']:
-                for k in range(T):
-                    
-                    sol_Pf    = all_data['sol_Pfvalues'][k][branch]
-                    sol_Qf    = all_data['sol_Qfvalues'][k][branch]
-                    sol_c     = all_data['sol_cvalues'][k][branch]
-                    sol_s     = all_data['sol_svalues'][k][branch]
-                    sol_cbusf = all_data['sol_cvalues'][k][buses[count_of_f]]
-                    sol_cbust = all_data['sol_cvalues'][k][buses[count_of_t]]
-                    sol_i2f   = computei2value(log,all_data,branch,sol_c,
-                                               sol_s,sol_cbusf,sol_cbust)   
-                    sol_viol    = coeff_Pft * sol_Pf + coeff_Qft * sol_Qf + coeff_cff * sol_cbusf + coeff_i2ft * sol_i2f
-                    sol_relviol = sol_viol / ( ( coeff_Pft**2 + coeff_Qft**2 + coeff_cff**2 + coeff_i2ft**2 )**0.5 )                     
-
-                    if sol_relviol > FeasibilityTol:
-                        log.joint(' WARNING, the i2-envelope cut associated '
-                                  + 'to branch ' + str(branch.count) + ' k '
-                                  + str(k) + ' f ' + str(branch.f)
-                                  + ' t ' + str(branch.t)
-                                  + ' is violated by the AC solution!\n')
-                        log.joint(' violation ' + str(sol_viol) + '\n')
-                        log.joint(' relative violation ' + str(sol_relviol)
-                                  + '\n')
-                        log.joint(' values (AC solution) ' + ' Pft '
-                                  + str(sol_Pf) + ' Qft ' + str(sol_Qf)
-                                  + ' cff ' + str(sol_cbusf) + ' i2ft '
-                                  + str(sol_i2f) + '\n' )                 
-                        breakexit('check!')
-                    else:
-                        log.joint(' AC solution satisfies the i2-cut '
-                                  + 'at branch ' + str(branch.count)
-                                  + ' with slack ' + str(sol_relviol) + '\n')
-                    
-            if all_data['limit_validity']:
-                for k in range(T):
-                    if from_or_to == 'f':
-                        sol_P   = all_data['sol_Pfvalues'][k][branch]
-                        sol_Q   = all_data['sol_Qfvalues'][k][branch]
-                    elif from_or_to == 't':
-                        sol_P   = all_data['sol_Ptvalues'][k][branch]
-                        sol_Q   = all_data['sol_Qtvalues'][k][branch]
-                    sol_viol    = coeff_P * sol_P + coeff_Q * sol_Q - 1
-
-                if sol_viol > FeasibilityTol:
-                    log.joint(' WARNING, the limit-envelope cut associated '
-                              + 'to branch ' + str(branchid) + ' k '
-                              + str(k) + ' f ' + str(f) + ' t ' + str(t)
-                              + ' is violated by the AC solution!\n')
-                    log.joint(' violation ' + str(sol_viol) + '\n')
-                    
-                    if from_or_to == 'f':
-                        log.joint(' values (AC solution) ' + ' Pft ' 
-                                  + str(sol_P) + ' Qft ' + str(sol_Q) + '\n')
-                    elif from_or_to == 't':
-                        log.joint(' values (AC solution) ' + ' Ptf ' 
-                                  + str(sol_P) + ' Qtf ' + str(sol_Q) + '\n')
-                    breakexit('check!')
-                else:
-                    log.joint(' AC solution satisfies limit inequality '
-                              + 'at branch ' + str(branchid)
-                              + ' with slack ' + str(sol_viol) 
-                              + '\n')
-
-            for k in range(T):            
-                # Updating dictionaries
-                limit_cuts[(cutid_limit,branchid)]   = (rnd,threshold,
-                                                        from_or_to,k)
-                limit_cuts_info[k][branch][cutid_limit] = (rnd,violation,
-                                                           coeff_P,coeff_Q,
-                                                           threshold,cutid_limit,
-                                                           from_or_to)                
-
-                cutexp     = LinExpr()
-                if from_or_to == 'f':
-                    constrname = "limit_cut_"+str(cutid_limit)+"_"+str(branchid)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(f)+"_"+str(t)
-                    cutexp    += (coeff_P * Pvar_f[k][branch]
-                                  + coeff_Q * Qvar_f[k][branch])
-                elif from_or_to == 't':
-                    constrname = "limit_cut_"+str(cutid_limit)+"_"+str(branchid)+"r_"+str(rnd)+"k_"+str(k)+"_"+str(t)+"_"+str(f)
-                    cutexp    += (coeff_P * Pvar_t[k][branch]
-                                  + coeff_Q * Qvar_t[k][branch])
-                themodel.addConstr(cutexp <= 1, name = constrname)
-                numlimitadded += 1
-                cutid_limit   += 1 # updating limit-cut counter                
-            
-            linenum += 1
-    
+def compute_sol_i2values(all_data,i2idx):
 
-    all_data['num_jabr_cuts']  = numjabradded
-    all_data['num_i2_cuts']    = numi2added
-    all_data['num_limit_cuts'] = numlimitadded
-    all_data['ID_jabr_cuts']   = numjabradded
-    all_data['ID_i2_cuts']     = numi2added
-    all_data['ID_limit_cuts']  = numlimitadded
-    
-    all_data['addcuts_numjabrcuts']  = numjabradded
-    all_data['addcuts_numi2cuts']    = numi2added
-    all_data['addcuts_numlimitcuts'] = numlimitadded
-        
-    all_data['jabr_cuts']       = jabr_cuts
-    all_data['jabr_cuts_info']  = jabr_cuts_info
-    all_data['i2_cuts']         = i2_cuts
-    all_data['i2_cuts_info']    = i2_cuts_info
-    all_data['limit_cuts']      = limit_cuts
-    all_data['limit_cuts_info'] = limit_cuts_info
-
-    log.joint(' -- number of cuts added and propagated\n')
-    log.joint(' Jabr-envelope cuts= ' + str(numjabradded)
-              + '\n')
-    log.joint(' i2-envelope cuts = ' + str(numi2added)
-              + '\n')
-    log.joint(' limit-envelope cuts = ' + str(numlimitadded)
-              + '\n')    
+    T           = all_data['T']
+    buslist     = list(all_data['buses'].values())
+    branchlist  = list(all_data['branches'].values())
+    eligible    = [branchlist[j] for j in i2idx]
+    sol_cvalues = all_data['sol_cvalues']
+    sol_svalues = all_data['sol_svalues']
+    fidx        = all_data['branch_fidx'][i2idx]
+    tidx        = all_data['branch_tidx'][i2idx]
 
+    sol_cbus = np.array([[sol_cvalues[k][bus] for bus in buslist] 
+                         for k in range(T)]).reshape(T,len(buslist))
+    sol_c    = np.array([[sol_cvalues[k][branch] for branch in eligible]
+                         for k in range(T)]).reshape(T,len(eligible))
+    sol_s    = np.array([[sol_svalues[k][branch] for branch in eligible]
+                         for k in range(T)]).reshape(T,len(eligible))
 
+    alpha, beta, gamma, zeta = (coeff[i2idx] for coeff in all_data['i2coeffs'])
 
+    return alpha * sol_cbus[:,fidx] + beta * sol_cbus[:,tidx] + gamma * sol_c + zeta * sol_s
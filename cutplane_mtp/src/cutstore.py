@@ -0,0 +1,102 @@
+###############################################################################
+##                                                                           ##
+## This code was written and is being maintained by Matias Villagra,         ##
+## PhD Student in Operations Research @ Columbia, supervised by              ##
+## Daniel Bienstock.                                                         ##
+##                                                                           ##
+## For code readability, we make references to equations in:                 ##
+## [1] D. Bienstock, and M. Villagra, Accurate Linear Cutting-Plane          ##
+## Relaxations for ACOPF, arXiv:2312.04251v2, 2024                           ##
+##                                                                           ##
+## Please report any bugs or issues to: mjv2153@columbia.edu                 ##
+##                                                                           ##
+## Jul 2024                                                                  ##
+###############################################################################
+
+# Binary cut journal, the 'cutformat binary' alternative to the text cut
+# files. A journal is a header followed by fixed-size records: every round
+# appends one record per cut added to the model and one per cut dropped
+# from it since the previous round, so nothing is rewritten. Journals are
+# read through a memory map, and the cuts still in the model at the last
+# round are found with array operations
+
+import os
+import numpy as np
+
+MAGIC   = b'CUTJOURN'
+# Bump when STOREDTYPE changes
+VERSION = 1
+
+# Record events
+ADD  = 0
+DROP = 1
+
+HEADERDTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('recordsize', '<u4')])
+
+# A record; 'branch', 'f' and 't' are the branch count and its end buses, as
+# in the case file, and 'coeffs' is as in cutpool.CUTDTYPE. Drop records
+# only use 'event', 'family', 'rnd' and 'cutid'
+STOREDTYPE = np.dtype([('event', 'i1'),
+                       ('family', 'i1'),
+                       ('end', 'S1'),
+                       ('rnd', '<i4'),
+                       ('period', '<i4'),
+                       ('branch', '<i4'),
+                       ('f', '<i4'),
+                       ('t', '<i4'),
+                       ('cutid', '<i8'),
+                       ('violation', '<f8'),
+                       ('threshold', '<f8'),
+                       ('coeffs', '<f8', (4,))])
+
+
+def records(m):
+    return np.zeros(m, dtype = STOREDTYPE)
+
+# Creates an empty journal, replacing any existing file
+
+def create(filename):
+
+    header = np.array([(MAGIC, VERSION, STOREDTYPE.itemsize)], dtype = HEADERDTYPE)
+
+    with open(filename, 'wb') as thefile:
+        thefile.write(header.tobytes())
+
+def append(filename,newrecords):
+
+    with open(filename, 'ab') as thefile:
+        thefile.write(np.ascontiguousarray(newrecords, dtype = STOREDTYPE).tobytes())
+
+# Memory map of the records of a journal. A partial record at the end, left
+# by an interrupted run, is ignored
+
+def load(filename):
+
+    header = np.fromfile(filename, dtype = HEADERDTYPE, count = 1)
+
+    if (len(header) == 0 or header['magic'][0] != MAGIC
+        or header['recordsize'][0] != STOREDTYPE.itemsize):
+        raise ValueError(filename + ' is not a cut journal')
+    if header['version'][0] != VERSION:
+        raise ValueError(filename + ' has version ' + str(header['version'][0])
+                         + ', expected ' + str(VERSION))
+
+    m = (os.path.getsize(filename) - HEADERDTYPE.itemsize) // STOREDTYPE.itemsize
+
+    if m == 0:
+        return records(0)
+
+    return np.memmap(filename, dtype = STOREDTYPE, mode = 'r',
+                     offset = HEADERDTYPE.itemsize, shape = (m,))
+
+# Add records of the cuts that were not dropped afterwards, in the order
+# they were added
+
+def live(journal):
+
+    events = journal['event']
+    keys   = journal['cutid'] * 3 + journal['family']
+    added  = np.flatnonzero(events == ADD)
+    gone   = keys[events == DROP]
+
+    return np.array(journal[added[~np.isin(keys[added], gone)]])
@@ -0,0 +1,301 @@
+###############################################################################
+##                                                                           ##
+## This code was written and is being maintained by Matias Villagra,         ##
+## PhD Student in Operations Research @ Columbia, supervised by              ##
+## Daniel Bienstock.                                                         ##
+##                                                                           ##
+## For code readability, we make references to equations in:                 ##
+## [1] D. Bienstock, and M. Villagra, Accurate Linear Cutting-Plane          ##
+## Relaxations for ACOPF, arXiv:2312.04251v2, 2024                           ##
+##                                                                           ##
+## Please report any bugs or issues to: mjv2153@columbia.edu                 ##
+##                                                                           ##
+## Jul 2024                                                                  ##
+###############################################################################
+
+# Temporal decomposition, the 'decomposition' alternative to 'gocutplane'.
+# Time-periods are split into windows of 'decomp_window' consecutive
+# periods, and time-periods of different windows are only coupled by the
+# ramping constraints, see equations (2a) and (2b) in [1], between the last
+# period of a window and the first one of the next. Every window gets a
+# copy of the GenP variables of the first period of the next window, which
+# the ramping constraints use instead, and the copies are linked to the
+# originals by
+#    copy_w = GenP_{first period of window w + 1}
+# These equations are dualized, so for multipliers nu the relaxation splits
+# into one subproblem per window
+#    min  cost_w + nu_w * copy_w - nu_{w-1} * GenP_{first period of w}
+# each solved by a worker process with its own relaxation and cut loop.
+# Cuts are valid for the subproblems, so the sum of their optimal values is
+# a lower bound for ACOPF for any nu, as long as every subproblem is solved
+# to optimality. The multipliers are updated by the master with subgradient
+# steps along g = copy_w - GenP_{first period of w + 1}, see
+# 'decomp_stepsize'
+
+import os
+import sys
+import time
+import numpy as np
+from multiprocessing import Process, Pipe
+from gurobipy import GRB
+from log import danoLogger
+from cutplane_mtp_paper import (cutplane_readdata, cutplane_setup,
+                                cutplane_optimize, cutplane_stats,
+                                cutplane_cuts, storesolution)
+from cuts_mtp_paper import blockvars
+from separation import sepshutdown
+
+
+# The windows of time-periods, as (first period, last period + 1)
+
+def decomp_windows(all_data):
+
+    T      = all_data['T']
+    window = all_data['decomp_window']
+
+    return [(k0, min(k0 + window, T)) for k0 in range(0, T, window)]
+
+
+# Restricts the data of a run to time-periods k0, ..., k1 - 1, which become
+# periods 0, ..., k1 - k0 - 1. The ramping rates of period k1 - 1 are kept,
+# for the ramping constraints with the next window
+
+def decomp_restrict(all_data,k0,k1):
+
+    for key in ('Pd', 'rampru', 'ramprd'):
+        all_data[key] = {k - k0: all_data[key][k] for k in range(k0, k1)}
+
+    all_data['T'] = k1 - k0
+
+    # Files are per run, not per window, and precomputed cuts refer to the
+    # time-periods of the whole run
+    for key in ('writelps', 'writecuts', 'writesol', 'writelastLP', 'getduals',
+                'addcuts', 'lazycuts', 'modelcache'):
+        all_data[key] = 0
+
+
+# Adds the copies of the GenP variables of the next window, and the
+# ramping constraints between them and the last time-period of the window,
+# as in 'formulation_loops'. 'knext' is the first period of the next
+# window. Returns the copies
+
+def decomp_copies(log,all_data,knext):
+
+    themodel = all_data['themodel']
+    T        = all_data['T']
+    genlist  = list(all_data['gens'].values())
+    ngen     = len(genlist)
+    GenPlast = blockvars(all_data)['GenP'][0][(T-1) * ngen:]
+    lb       = themodel.getAttr('LB', GenPlast)
+    ub       = themodel.getAttr('UB', GenPlast)
+    copies   = []
+
+    for g, gen in enumerate(genlist):
+        name   = str(gen.count) + "_" + str(gen.nodeID) + "_" + str(knext - 1) + "_" + str(knext)
+        copy   = themodel.addVar(lb = lb[g], ub = ub[g], name = 'GP_copy_' + name)
+        absgen = themodel.addVar(lb = 0, name = 'abs_gen_' + str(gen.count) + '_' + str(knext - 1))
+        rpu    = all_data['rampru'][T-1][gen]
+        rpd    = all_data['ramprd'][T-1][gen]
+        P      = GenPlast[g]
+
+        themodel.addConstr(copy - P - rpu * absgen <= 0, name = "rup_" + name)
+        themodel.addConstr(P - rpd * absgen - copy <= 0, name = "rdown_" + name)
+        themodel.addConstr(P - absgen <= 0, name = "rup_" + name + '_1')
+        themodel.addConstr(- P - absgen <= 0, name = "rup_" + name + '_2')
+        copies.append(copy)
+
+    themodel.update()
+
+    log.joint(' ' + str(ngen) + ' GenP copies of time-period ' + str(knext) + ' added\n')
+
+    return copies
+
+
+# Worker process of window [k0, k1). Formulates the window and, for every
+# (nu_in, nu_out) received from the master, runs 'decomp_rounds' rounds of
+# the cut loop and sends back the last objective value and solver status,
+# the GenP values of period k0 and the values of the copies. Stops when it
+# receives None
+
+def decomp_worker(all_data,k0,k1,conn,nworkers):
+
+    # The screen is the master's; the solver still writes to the log file
+    sys.stdout = open(os.devnull, 'w')
+
+    logfile    = all_data['mylogfile'] + '_w' + str(k0) + '_' + str(k1)
+    log        = danoLogger(logfile)
+    log.screen = 0
+
+    Tall                  = all_data['T']
+    all_data['mylogfile'] = logfile
+    decomp_restrict(all_data,k0,k1)
+
+    log.joint(' decomposition window ' + str(k0) + ' ... ' + str(k1 - 1) + '\n')
+
+    if not cutplane_setup(log,all_data):
+        conn.close()
+        return None
+
+    themodel  = all_data['themodel']
+    ngen      = len(all_data['gens'])
+    GenPfirst = blockvars(all_data)['GenP'][0][:ngen]
+    copies    = decomp_copies(log,all_data,k1) if k1 < Tall else []
+    firstobj  = np.array(themodel.getAttr('Obj', GenPfirst))
+
+    # Workers share the machine
+    themodel.Params.Threads = max(1, (os.cpu_count() or 1) // nworkers)
+
+    all_data['round']                  = 1
+    all_data['round_time']             = time.time()
+    all_data['cumulative_solver_time'] = 0
+    all_data['ftol_counter']           = 0
+
+    while True:
+        multipliers = conn.recv()
+        if multipliers is None:
+            break
+        nu_in, nu_out = multipliers
+
+        if nu_in is not None:
+            themodel.setAttr('Obj', GenPfirst, (firstobj - nu_in).tolist())
+        if nu_out is not None:
+            themodel.setAttr('Obj', copies, nu_out.tolist())
+
+        for rnd in range(all_data['decomp_rounds']):
+            cutplane_optimize(log,all_data)
+            storesolution(log,all_data)
+            all_data['runtime'] = time.time() - all_data['T0']
+            cutplane_stats(log,all_data)
+
+            objval   = all_data['objval']
+            status   = all_data['optstatus']
+            Pfirst   = all_data['solarrays']['GenP'][0].copy()
+            copyvals = np.array(themodel.getAttr('X', copies))
+
+            cutplane_cuts(log,all_data)
+            themodel.update()
+            all_data['round']     += 1
+            all_data['round_time'] = time.time()
+
+            if all_data['NO_cuts_added']:
+                break
+
+        numcuts = (all_data['num_jabr_cuts'] + all_data['num_i2_cuts']
+                   + all_data['num_limit_cuts'])
+        conn.send((objval, Pfirst, copyvals, numcuts, status))
+
+    # Processes started by multiprocessing skip atexit
+    sepshutdown(all_data)
+    all_data['writer'].close()
+    conn.close()
+    log.closelog()
+
+
+# Subgradient step for the multipliers, from the subgradient 'gradient' at
+# the current ones, whose lower bound is 'bound' (None if some window was
+# not solved to optimality). With a 'primal_bound' UB this is the Polyak
+# step (UB - bound) / ||g||^2; otherwise, or without a valid bound, a step
+# of length 'decomp_step' / sqrt(iteration) along g
+
+def decomp_stepsize(all_data,gradient,bound,it):
+
+    norm2 = float(np.sum(gradient**2))
+
+    if norm2 == 0:
+        return 0.0
+
+    if all_data['primal_bound'] != 'NONE' and bound is not None:
+        return max(all_data['primal_bound'] - bound, 0.0) / norm2
+
+    return all_data['decomp_step'] / it**0.5 / norm2**0.5
+
+
+# Master of the decomposition: starts a worker per window and updates the
+# multipliers with the steps of 'decomp_stepsize' until the copies agree
+# with the originals up to 'decomp_tol' or 'decomp_iterations' iterations.
+# Every iteration where all windows are solved to optimality gives a lower
+# bound, the best one is reported
+
+def godecomp(log,all_data):
+
+    cutplane_readdata(log,all_data)
+
+    windows = decomp_windows(all_data)
+    W       = len(windows)
+    ngen    = len(all_data['gens'])
+    nu      = np.zeros((W - 1, ngen))
+    best    = -np.inf
+    workers = []
+
+    log.joint(' decomposition: ' + str(W) + ' windows of at most '
+              + str(all_data['decomp_window']) + ' time-periods\n')
+
+    for k0, k1 in windows:
+        conn, workerconn = Pipe()
+        worker = Process(target = decomp_worker,
+                         args = (all_data, k0, k1, workerconn, W))
+        worker.start()
+        workerconn.close()
+        workers.append((worker, conn))
+
+    try:
+        for it in range(1, all_data['decomp_iterations'] + 1):
+            t0_it = time.time()
+
+            for w, (worker, conn) in enumerate(workers):
+                conn.send((nu[w-1] if w > 0 else None,
+                           nu[w] if w < W - 1 else None))
+
+            try:
+                results = [conn.recv() for worker, conn in workers]
+            except EOFError:
+                log.joint(' a decomposition worker stopped, see its log file\n')
+                break
+
+            optimal  = all(result[4] == GRB.OPTIMAL for result in results)
+            bound    = sum(result[0] for result in results) if optimal else None
+            gradient = np.array([results[w][2] - results[w+1][1]
+                                 for w in range(W - 1)]).reshape(W - 1, ngen)
+            residual = float(np.abs(gradient).max()) if W > 1 else 0.0
+            if optimal:
+                best = max(best, bound)
+
+            all_data['runtime'] = time.time() - all_data['T0']
+
+            if not optimal:
+                log.joint(' some windows were not solved to optimality,'
+                          + ' no valid lower bound\n')
+
+            log.joint(' iteration ' + str(it) + ' lower bound ' + str(bound)
+                      + ' best ' + str(best) + ' ramp residual ' + str(residual)
+                      + ' cuts ' + str(sum(result[3] for result in results))
+                      + ' time ' + str(time.time() - t0_it) + '\n')
+
+            if residual <= all_data['decomp_tol']:
+                log.joint(' copies agree with the originals\n')
+                break
+
+            if all_data['runtime'] > all_data['max_time']:
+                log.joint(' time limit reached!\n')
+                break
+
+            nu += decomp_stepsize(all_data,gradient,bound,it) * gradient
+    finally:
+        for worker, conn in workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker, conn in workers:
+            worker.join()
+
+    all_data['runtime'] = time.time() - all_data['T0']
+
+    log.joint(' decomposition lower bound ' + str(best) + ' runtime '
+              + str(all_data['runtime']) + '\n')
+
+    summary_ws = open("summary_ws.log","a+")
+    summary_ws.write(' case ' + all_data['casename'] + ' decomposition windows '
+                     + str(W) + ' obj ' + str(best) + ' runtime '
+                     + str(all_data['runtime']) + '\n\n')
+    summary_ws.close()
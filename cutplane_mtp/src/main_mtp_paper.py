@@ -24,6 +24,7 @@ from myutils import *
 from versioner import *
 from log import danoLogger
 from cutplane_mtp_paper import gocutplane
+from decomp_mtp import godecomp
 
 def read_config(log, filename):
 
@@ -74,6 +75,9 @@ def read_config(log, filename):
     solver_method                = 2
     primal_bound                 = 'NONE'
     crossover                    = 0
+    solve_strategy               = 'barrier'
+    warm_start_round             = 5
+    adaptive_epsilon             = 0.1
     timelimit                    = 'NONE'
     max_rounds                   = 100
     cut_analysis                 = 0
@@ -89,6 +93,14 @@ def read_config(log, filename):
     obbt                         = 0
 
     hybrid                       = 0
+    hybrid_cut_limit             = 10
+
+    decomposition                = 0
+    decomp_window                = 1
+    decomp_iterations            = 20
+    decomp_rounds                = 3
+    decomp_step                  = 1.0
+    decomp_tol                   = 1e-4
 
     jabr_validity                = 0
     i2_validity                  = 0
@@ -111,13 +123,18 @@ def read_config(log, filename):
 
     writecuts                    = 0
     addcuts                      = 0
+    cutformat                    = 'text'
+    lazycuts                     = 0
 
     droplimit                    = 0
     most_violated_fraction_limit = 1
+    most_violated_budget         = 'shared'
     threshold_limit              = 1e-5
 
 
     writelps                     = 0
+    names                        = 0
+    artifact_queue               = 4
 
     ftol                         = 1e-3
     ftol_iterates                = 5
@@ -125,8 +142,15 @@ def read_config(log, filename):
 
 
     parallel_check               = 0
+    parallel_check_mode          = 'exact'
+
+    separation_workers           = 1
+    separation_pool              = 'thread'
     
     T                            = 2
+    matrix_formulation           = 0
+    modelcache                   = 0
+    modelcache_size              = 8
     nperturb                     = 0.01
     uniform                      = 0
     uniform_drift                = 0.02
@@ -143,6 +167,9 @@ def read_config(log, filename):
     barconvtol                   = 1e-6
     feastol                      = 1e-6
     opttol                       = 1e-6
+    tolerance_schedule           = 0
+    tolerance_factor             = 1e2
+    polish_crossover             = 0
     rho_threshold                = 1e2  # Fixing rho parameter of i2(rho)+
     getduals                     = 0
 
@@ -187,6 +214,15 @@ def read_config(log, filename):
             elif thisline[0] == 'linear_objective':
                 linear_objective = 1
 
+            elif thisline[0] == 'matrix_formulation':
+                matrix_formulation = 1
+
+            elif thisline[0] == 'modelcache':
+                modelcache         = thisline[1]
+
+            elif thisline[0] == 'modelcache_size':
+                modelcache_size    = int(thisline[1])
+
             elif thisline[0] == 'i2cuts':
                 i2cuts           = 1
 
@@ -208,6 +244,26 @@ def read_config(log, filename):
             elif thisline[0] == 'threshold_dotprod':
                 threshold_dotprod = float(thisline[1])
                 parallel_check    = 1
+
+            elif thisline[0] == 'parallel_check_mode':
+                if thisline[1] in ('exact', 'hash'):
+                    parallel_check_mode = thisline[1]
+                else:
+                    sys.exit("main_mtp: illegal input parallel_check_mode " + thisline[1] + " bye")
+
+            elif thisline[0] == 'artifact_queue':
+                artifact_queue = int(thisline[1])
+                if artifact_queue < 0:
+                    sys.exit("main_mtp: illegal input artifact_queue " + thisline[1] + " bye")
+
+            elif thisline[0] == 'separation_workers':
+                separation_workers = int(thisline[1])
+
+            elif thisline[0] == 'separation_pool':
+                if thisline[1] in ('thread', 'process'):
+                    separation_pool = thisline[1]
+                else:
+                    sys.exit("main_mtp: illegal input separation_pool " + thisline[1] + " bye")
                 
             elif thisline[0] == 'tolerance':
                 tolerance = float(thisline[1])
@@ -233,6 +289,18 @@ def read_config(log, filename):
             elif thisline[0] == 'crossover':
                 crossover = int(thisline[1])
 
+            elif thisline[0] == 'solve_strategy':
+                if thisline[1] in ('barrier', 'warm', 'switch', 'adaptive'):
+                    solve_strategy = thisline[1]
+                else:
+                    sys.exit("main_mtp: illegal input solve_strategy " + thisline[1] + " bye")
+
+            elif thisline[0] == 'warm_start_round':
+                warm_start_round = int(thisline[1])
+
+            elif thisline[0] == 'adaptive_epsilon':
+                adaptive_epsilon = float(thisline[1])
+
             elif thisline[0] == 'max_time':
                 max_time  = float(thisline[1])
 
@@ -248,6 +316,37 @@ def read_config(log, filename):
             elif thisline[0] == 'hybrid':
                 hybrid = 1
 
+            elif thisline[0] == 'hybrid_cut_limit':
+                hybrid_cut_limit = int(thisline[1])
+                if hybrid_cut_limit < 1:
+                    sys.exit("main_mtp: illegal input hybrid_cut_limit " + thisline[1] + " bye")
+
+            elif thisline[0] == 'decomposition':
+                decomposition = 1
+
+            elif thisline[0] == 'decomp_window':
+                decomp_window = int(thisline[1])
+                if decomp_window < 1:
+                    sys.exit("main_mtp: illegal input decomp_window " + thisline[1] + " bye")
+
+            elif thisline[0] == 'decomp_iterations':
+                decomp_iterations = int(thisline[1])
+                if decomp_iterations < 1:
+                    sys.exit("main_mtp: illegal input decomp_iterations " + thisline[1] + " bye")
+
+            elif thisline[0] == 'decomp_rounds':
+                decomp_rounds = int(thisline[1])
+                if decomp_rounds < 1:
+                    sys.exit("main_mtp: illegal input decomp_rounds " + thisline[1] + " bye")
+
+            elif thisline[0] == 'decomp_step':
+                decomp_step = float(thisline[1])
+                if decomp_step <= 0:
+                    sys.exit("main_mtp: illegal input decomp_step " + thisline[1] + " bye")
+
+            elif thisline[0] == 'decomp_tol':
+                decomp_tol = float(thisline[1])
+
             elif thisline[0] == 'i2_inequalities':
                 i2_inequalities = 1
 
@@ -290,6 +389,15 @@ def read_config(log, filename):
             elif thisline[0] == 'addcuts':
                 addcuts     = 1
                 
+            elif thisline[0] == 'lazycuts':
+                lazycuts    = 1
+
+            elif thisline[0] == 'cutformat':
+                if thisline[1] in ('text', 'binary'):
+                    cutformat = thisline[1]
+                else:
+                    sys.exit("main_mtp: illegal input cutformat " + thisline[1] + " bye")
+                
             elif thisline[0] == 'fromscratch':
                 addcuts     = 0
 
@@ -297,7 +405,13 @@ def read_config(log, filename):
                 droplimit  = 1
 
             elif thisline[0] == 'most_violated_fraction_limit':
-                most_violated_fraction_limit    = 1
+                most_violated_fraction_limit    = float(thisline[1])
+
+            elif thisline[0] == 'most_violated_budget':
+                if thisline[1] in ('shared', 'global', 'period'):
+                    most_violated_budget = thisline[1]
+                else:
+                    sys.exit("main_mtp: illegal input most_violated_budget " + thisline[1] + " bye")
 
             elif thisline[0] == 'threshold_limit':
                 threshold_limit  = float(threshold_limit)
@@ -311,6 +425,14 @@ def read_config(log, filename):
             elif thisline[0] == 'writelps':
                 writelps     = 1
 
+            elif thisline[0] == 'names':
+                if thisline[1] == 'on':
+                    names    = 1
+                elif thisline[1] == 'off':
+                    names    = 0
+                else:
+                    sys.exit("main_mtp: illegal input names " + thisline[1] + " bye")
+
             elif thisline[0] == 'ftol':
                 ftol          = float(thisline[1])
 
@@ -471,6 +593,17 @@ def read_config(log, filename):
             elif thisline[0] == 'opttol':
                 opttol        = float(thisline[1])
 
+            elif thisline[0] == 'tolerance_schedule':
+                tolerance_schedule = 1
+
+            elif thisline[0] == 'tolerance_factor':
+                tolerance_factor   = float(thisline[1])
+                if tolerance_factor < 1:
+                    sys.exit("main_mtp: illegal input tolerance_factor " + thisline[1] + " bye")
+
+            elif thisline[0] == 'polish_crossover':
+                polish_crossover   = 1
+
             elif thisline[0] == 'writelastLP':
                 writelastLP   = 1
 
@@ -525,7 +658,18 @@ def read_config(log, filename):
     all_data['cut_age_limit'] = cut_age_limit
 
     all_data['linear_objective']   = linear_objective
+    all_data['matrix_formulation'] = matrix_formulation
+    all_data['modelcache']         = modelcache
+    all_data['modelcache_size']    = modelcache_size
     all_data['hybrid']             = hybrid
+    all_data['hybrid_cut_limit']   = hybrid_cut_limit
+
+    all_data['decomposition']      = decomposition
+    all_data['decomp_window']      = decomp_window
+    all_data['decomp_iterations']  = decomp_iterations
+    all_data['decomp_rounds']      = decomp_rounds
+    all_data['decomp_step']        = decomp_step
+    all_data['decomp_tol']         = decomp_tol
 
     if linear_objective or hybrid:
         all_data['objective_cuts']     = objective_cuts
@@ -533,15 +677,15 @@ def read_config(log, filename):
         all_data['num_objective_cuts'] = 0
         all_data['threshold_objcuts']  = threshold_objcuts
 
+    all_data['most_violated_budget'] = most_violated_budget
+
     all_data['jabrcuts'] = jabrcuts
     if jabrcuts:
         all_data['most_violated_fraction_jabr'] = most_violated_fraction_jabr
-        all_data['jabr_cuts']                   = {}
         all_data['num_jabr_cuts_rnd']           = {}
         all_data['num_jabr_cuts_added']         = 0
         all_data['num_jabr_cuts_dropped']       = 0
         all_data['dropped_jabrs']               = []    
-        all_data['jabr_cuts_info']              = {}
         all_data['max_error_jabr']              = 0
         all_data['total_jabr_dropped']          = 0
 
@@ -553,11 +697,9 @@ def read_config(log, filename):
     all_data['limitcuts'] = limitcuts
     if limitcuts:
         all_data['most_violated_fraction_limit'] = most_violated_fraction_limit
-        all_data['limit_cuts']                   = {}
         all_data['num_limit_cuts_rnd']           = {}
         all_data['num_limit_cuts_added']         = 0
         all_data['num_limit_cuts_dropped']       = 0
-        all_data['limit_cuts_info']              = {}
         all_data['threshold_limit']              = threshold_limit
         all_data['dropped_limit']                = []
         all_data['max_error_limit']              = 0
@@ -577,11 +719,9 @@ def read_config(log, filename):
         
     if i2cuts:
         all_data['most_violated_fraction_i2'] = most_violated_fraction_i2
-        all_data['i2_cuts']                   = {}
         all_data['num_i2_cuts_rnd']           = {}
         all_data['num_i2_cuts_added']         = 0
         all_data['num_i2_cuts_dropped']       = 0
-        all_data['i2_cuts_info']              = {}
         all_data['threshold_i2']              = threshold_i2
         all_data['dropped_i2']                = []
         all_data['max_error_i2']              = 0
@@ -596,6 +736,9 @@ def read_config(log, filename):
     
     all_data['primal_bound']                  = primal_bound
     all_data['crossover']                     = crossover
+    all_data['solve_strategy']                = solve_strategy
+    all_data['warm_start_round']              = warm_start_round
+    all_data['adaptive_epsilon']              = adaptive_epsilon
     all_data['max_time']                      = max_time
 
     all_data['mincut']                        = mincut
@@ -641,7 +784,11 @@ def read_config(log, filename):
 
     all_data['writecuts']                     = writecuts
     all_data['addcuts']                       = addcuts
+    all_data['cutformat']                     = cutformat
+    all_data['lazycuts']                      = lazycuts
     all_data['writelps']                      = writelps
+    all_data['names']                         = names
+    all_data['lazynames']                     = []
 
     all_data['ftol']                          = ftol
     all_data['ftol_iterates']                 = ftol_iterates
@@ -650,6 +797,10 @@ def read_config(log, filename):
     all_data['writesol']                      = writesol
 
     all_data['parallel_check']                = parallel_check
+    all_data['parallel_check_mode']           = parallel_check_mode
+    all_data['separation_workers']            = separation_workers
+    all_data['separation_pool']               = separation_pool
+    all_data['artifact_queue']                = artifact_queue
     all_data['T']                             = T
     all_data['nperturb']                      = nperturb    
     all_data['uniform']                       = uniform
@@ -666,6 +817,9 @@ def read_config(log, filename):
     all_data['barconvtol']                    = barconvtol
     all_data['feastol']                       = feastol
     all_data['opttol']                        = opttol
+    all_data['tolerance_schedule']            = tolerance_schedule
+    all_data['tolerance_factor']              = tolerance_factor
+    all_data['polish_crossover']              = polish_crossover
     all_data['writelastLP']                   = writelastLP
     all_data['rho_threshold']                 = rho_threshold    
     all_data['getduals']                      = getduals  
@@ -768,7 +922,10 @@ if __name__ == '__main__':
 
     readcode = reader.readcase(log,all_data,all_data['casefilename'])
 
-    gocutplane(log,all_data)
+    if all_data['decomposition']:
+        godecomp(log,all_data)
+    else:
+        gocutplane(log,all_data)
     
     log.closelog()
     
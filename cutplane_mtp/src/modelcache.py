@@ -0,0 +1,167 @@
+###############################################################################
+##                                                                           ##
+## This code was written and is being maintained by Matias Villagra,         ##
+## PhD Student in Operations Research @ Columbia, supervised by              ##
+## Daniel Bienstock.                                                         ##
+##                                                                           ##
+## For code readability, we make references to equations in:                 ##
+## [1] D. Bienstock, and M. Villagra, Accurate Linear Cutting-Plane          ##
+## Relaxations for ACOPF, arXiv:2312.04251v2, 2024                           ##
+##                                                                           ##
+## Please report any bugs or issues to: mjv2153@columbia.edu                 ##
+##                                                                           ##
+## Jul 2024                                                                  ##
+###############################################################################
+
+# On-disk cache of formulated models. An entry is a .npz file with the
+# constraint matrix, bounds, objective and names of the model, plus a .json
+# file with the variable layout and index maps used by 'formulation_matrix'.
+# Entries are keyed by a hash of the input files and of the config keys
+# that change the formulation; the least recently used ones are evicted
+
+import os
+import json
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+
+# Bump when the contents of an entry change
+CACHEVERSION = 1
+
+# Config keys which change the formulation
+FORMULATIONKEYS = ('T', 'i2', 'rho_threshold', 'jabr_inequalities',
+                   'i2_inequalities', 'limit_inequalities',
+                   'loss_inequalities')
+
+
+# Hashes the case, loads and ramprates files, together with the config keys
+# which change the formulation
+
+def cachekey(log,all_data):
+
+    h = hashlib.sha256()
+    h.update(str(CACHEVERSION).encode())
+
+    for filename in (all_data['casefilename'], all_data['loadsfilename'],
+                     all_data['rampfilename']):
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+
+    for key in FORMULATIONKEYS:
+        h.update((key + '=' + repr(all_data[key]) + ';').encode())
+
+    return h.hexdigest()
+
+
+def cachepaths(all_data,key):
+
+    base = os.path.join(all_data['modelcache'], all_data['casename'] + '_' + key)
+
+    return base + '.npz', base + '.json'
+
+
+# Returns the arrays and metadata of a cache entry, or None if there is no
+# entry for key
+
+def loadmodel(log,all_data,key):
+
+    npzname, jsonname = cachepaths(all_data,key)
+
+    if not (os.path.isfile(npzname) and os.path.isfile(jsonname)):
+        log.joint(' no cached model for key ' + key + '\n')
+        return None
+
+    with open(jsonname, 'r') as f:
+        meta = json.load(f)
+
+    with np.load(npzname) as npz:
+        cached = {name: npz[name] for name in npz.files}
+
+    cached['meta'] = meta
+    cached['A']    = sp.csr_matrix((cached['A_data'], cached['A_indices'],
+                                    cached['A_indptr']),
+                                   shape = tuple(cached['A_shape']))
+    cached['Q']    = sp.coo_matrix((cached['Q_data'], (cached['Q_row'],
+                                                       cached['Q_col'])),
+                                   shape = (len(cached['lb']),len(cached['lb'])))
+
+    # Touch the entry, eviction goes by modification time
+    os.utime(npzname)
+    os.utime(jsonname)
+
+    log.joint(' loaded cached model ' + npzname + '\n')
+
+    return cached
+
+
+# Saves the current model, which must have been built by 'formulation_matrix',
+# and evicts the least recently used entries beyond 'modelcache_size'
+
+def savemodel(log,all_data,key):
+
+    themodel = all_data['themodel']
+    T        = all_data['T']
+    buses    = all_data['buses']
+    allvars  = themodel.getVars()
+    constrs  = themodel.getConstrs()
+
+    A = themodel.getA().tocsr()
+    Q = themodel.getQ().tocoo()
+
+    pbalrows = [all_data['PBaldef'][k][bus].index for k in range(T)
+                for bus in buses.values()]
+
+    meta = {'version'  : CACHEVERSION,
+            'layout'   : {block: list(value) for block, value
+                          in all_data['varlayout'].items()},
+            'i2idx'    : [int(j) for j in all_data['i2idx']],
+            'objcon'   : themodel.ObjCon}
+
+    npzname, jsonname = cachepaths(all_data,key)
+    os.makedirs(all_data['modelcache'], exist_ok = True)
+
+    # Write to temporary files first, a half-written entry is never loaded
+    tmpnpz  = npzname + '.tmp.npz'
+    tmpjson = jsonname + '.tmp'
+
+    np.savez(tmpnpz,
+             A_data = A.data, A_indices = A.indices, A_indptr = A.indptr,
+             A_shape = np.array(A.shape),
+             Q_data = Q.data, Q_row = Q.row, Q_col = Q.col,
+             lb = np.array(themodel.getAttr('LB', allvars)),
+             ub = np.array(themodel.getAttr('UB', allvars)),
+             obj = np.array(themodel.getAttr('Obj', allvars)),
+             rhs = np.array(themodel.getAttr('RHS', constrs)),
+             sense = np.array(themodel.getAttr('Sense', constrs)),
+             varnames = np.array(themodel.getAttr('VarName', allvars)),
+             constrnames = np.array(themodel.getAttr('ConstrName', constrs)),
+             pbalrows = np.array(pbalrows, dtype = int))
+
+    with open(tmpjson, 'w') as f:
+        json.dump(meta, f)
+
+    os.replace(tmpnpz, npzname)
+    os.replace(tmpjson, jsonname)
+
+    log.joint(' saved model to cache ' + npzname + '\n')
+
+    evict(log,all_data)
+
+
+# Removes the least recently used entries so that at most 'modelcache_size'
+# remain
+
+def evict(log,all_data):
+
+    cachedir = all_data['modelcache']
+    entries  = [os.path.join(cachedir, name) for name in os.listdir(cachedir)
+                if name.endswith('.npz') and not name.endswith('.tmp.npz')]
+    entries.sort(key = os.path.getmtime, reverse = True)
+
+    for npzname in entries[all_data['modelcache_size']:]:
+        os.remove(npzname)
+        jsonname = npzname[:-len('.npz')] + '.json'
+        if os.path.isfile(jsonname):
+            os.remove(jsonname)
+        log.joint(' evicted cached model ' + npzname + '\n')
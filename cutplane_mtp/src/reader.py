@@ -17,7 +17,9 @@
 
 import sys
 import math
-import cmath
+import operator
+import numpy as np
+import scipy.sparse as sp
 
 from myutils import *
 import time
@@ -25,6 +27,11 @@ from log import *
 
 
 class Bus:
+  __slots__ = ('count', 'nodeID', 'nodetype', 'Pd', 'Qd', 'genidsbycount', 
+               'frombranchids', 'tobranchids', 'Gs', 'Bs', 'Vbase', 'Vmax', 
+               'Vmin', 'Pbalance', 'outdegree', 'indegree', 'degree', 
+               'busline0', 'lat', 'lon', 'index')
+
   def __init__(self, count, nodeID, nodetype, Pd, Qd, Gs, Bs, Vbase, Vmax, Vmin, busline0):
     self.count = count
     self.nodeID = nodeID
@@ -45,6 +52,7 @@ class Bus:
 
     self.lat = -1
     self.lon = -1
+    self.index = -1
 
 
   def getbusline0(self):
@@ -68,75 +76,129 @@ class Bus:
     self.degree += 1
 
 
-class branch:
-    def __init__(self, log, count, f, id_f, t, id_t, r, x, bc, rateAmva, rateBmva, rateCmva, ratio, angle, maxangle, minangle, status, defaultlimit, branchline0):
-       self.count = count
-       self.f = f
-       self.t = t
-       self.id_f = id_f
-       self.id_t = id_t
-       self.r = r
-       self.x = x
-       self.bc = bc
-       self.count = count
-       self.branchline0 = branchline0
+# Structure-of-arrays representation of the network: one contiguous array
+# per branch (resp., bus) parameter, where row 'i' corresponds to the branch 
+# (resp., bus) with attribute 'index' equal to 'i'. Branch admittances are
+# computed in one vectorized pass
+
+class NetworkArrays:
+    branchfields = ('r', 'x', 'bc', 'rateAmva', 'rateBmva', 'limit', 
+                    'constrainedflow', 'ratio', 'angle', 'angle_rad', 
+                    'maxangle', 'maxangle_rad', 'minangle', 'minangle_rad', 
+                    'upperanglenone', 'loweranglenone', 'invratio2', 'multtf', 
+                    'multft', 'status', 'z', 'y', 'Yff', 'Yft', 'Ytf', 'Ytt', 
+                    'Gff', 'Bff', 'Gft', 'Bft', 'Gtf', 'Btf', 'Gtt', 'Btt')
+
+    def __init__(self):
+       self.numbranches = 0
+       self.numbuses    = 0
+
+    # 'branchdata' is a list of tuples 
+    # (r, x, bc, rateAmva, rateBmva, ratio, angle, maxangle, minangle, status)
+    # and 'fidx', 'tidx' give the index of the 'from' and 'to' bus of each 
+    # branch
+    def addbranches(self, log, branchdata, fidx, tidx, defaultlimit):
+       data = np.array(branchdata, dtype = float).reshape(len(branchdata), 10)
+       r, x, bc, rateAmva, rateBmva, ratio, angle, maxangle, minangle, status = data.T
+
+       self.numbranches = len(branchdata)
+       self.fidx        = np.array(fidx, dtype = int)
+       self.tidx        = np.array(tidx, dtype = int)
+
+       self.r        = r
+       self.x        = x
+       self.bc       = bc
        self.rateAmva = rateAmva
        self.rateBmva = rateBmva
-       self.limit = rateAmva
-       self.constrainedflow = 1
-       if self.limit == 0:
-         self.limit = defaultlimit
-         self.constrainedflow = 0
-       if ratio == 0:
-         ratio = 1
-       self.ratio = ratio
-       self.angle = angle
-       self.angle_rad = math.pi*angle/180.0
-       self.maxangle = maxangle
-       self.maxangle_rad = math.pi*maxangle/180.0
-       self.minangle = minangle
-       self.minangle_rad = math.pi*minangle/180.0
-
-       self.upperanglenone = 0
-       if maxangle == 360 or maxangle == 0:
-         self.maxangle_rad   = 2*math.pi
-         self.upperanglenone = 1
-
-       self.loweranglenone = 0         
-       if minangle == -360 or minangle == 0:
-         self.minangle_rad   = -2*math.pi
-         self.loweranglenone = 1
+       self.status   = status.astype(int)
+
+       self.constrainedflow = (rateAmva != 0).astype(int)
+       self.limit           = np.where(rateAmva == 0, defaultlimit, rateAmva)
+
+       self.ratio        = ratio = np.where(ratio == 0, 1.0, ratio)
+       self.angle        = angle
+       self.angle_rad    = math.pi*angle/180.0
+       self.maxangle     = maxangle
+       self.minangle     = minangle
+
+       self.upperanglenone = ((maxangle == 360) | (maxangle == 0)).astype(int)
+       self.maxangle_rad   = np.where(self.upperanglenone, 2*math.pi, 
+                                      math.pi*maxangle/180.0)
+       self.loweranglenone = ((minangle == -360) | (minangle == 0)).astype(int)
+       self.minangle_rad   = np.where(self.loweranglenone, -2*math.pi, 
+                                      math.pi*minangle/180.0)
 
        self.invratio2 = invratio2 = 1/ratio**2
-       self.multtf = multtf = 1/(ratio*cmath.exp(1j*self.angle_rad))
-       self.multft = multft = 1/(ratio*cmath.exp(-1j*self.angle_rad))
-       #print 'multtf', multtf
-       self.status = status
-       pi = math.pi
-       self.z = z = r + x*1j
-       self.y = y = 1/z
+       self.multtf    = multtf    = 1/(ratio*np.exp(1j*self.angle_rad))
+       self.multft    = multft    = 1/(ratio*np.exp(-1j*self.angle_rad))
+
+       self.z   = z   = r + x*1j
+       self.y   = y   = 1/z
        self.Yff = Yff = (y + bc/2*1j)*invratio2
        self.Yft = Yft = -y*multft
        self.Ytf = Ytf = -y*multtf
        self.Ytt = Ytt = y + bc/2*1j
-       self.Gff = Gff = (self.Yff).real
-       self.Bff = Bff = (self.Yff).imag
-       self.Gft = Gft = (self.Yft).real
-       self.Bft = Bft = (self.Yft).imag
-       self.Gtf = Gtf = (self.Ytf).real
-       self.Btf = Btf = (self.Ytf).imag
-       self.Gtt = Gtt = (self.Ytt).real
-       self.Btt = Btt = (self.Ytt).imag
-       loud = 0
-#       if self.angle_rad != 0:
-#         loud = 1
-       if loud:
-         log.joint("\nbr " + str(count) + " f " + str(f) + " t " + str(t) +"\n")
-         log.joint("   idf " +  str(id_f) + " idt " + str(id_t) +"\n")
-         log.joint("   r " + str(r) + " x " + str(x) + " bb " + str(bc) +"\n")
-         log.joint("   ratio " + str(self.ratio) + " angle " + str(angle) + " angle_rad: " + str(self.angle_rad) + "\n")
-         log.joint("   y " + str(y) + "\n")
-         log.joint("       Yff " + str(Yff) + " , Yft " + str(Yft) + " , Ytf " + str(Ytf) +  " , Ytt " + str(Ytt) + "\n")
+       self.Gff = Yff.real
+       self.Bff = Yff.imag
+       self.Gft = Yft.real
+       self.Bft = Yft.imag
+       self.Gtf = Ytf.real
+       self.Btf = Ytf.imag
+       self.Gtt = Ytt.real
+       self.Btt = Ytt.imag
+
+    # Branch counts and the IDs of the 'from' and 'to' buses, in branch index
+    # order, for code that works on all branches at once
+    def addbranchids(self, log, count, f, t):
+       self.count = np.array(count, dtype = int)
+       self.f     = np.array(f, dtype = int)
+       self.t     = np.array(t, dtype = int)
+
+    # Coefficients alpha, beta, gamma and zeta of every branch, such that 
+    # i2_km = alpha c_kk + beta c_mm + gamma c_km + zeta s_km, see equation
+    # (18) in [1]
+    def i2coeffs(self):
+       g      = self.y.real
+       b      = self.y.imag
+       bshunt = self.bc
+       ratio  = self.ratio
+       cos    = np.cos(self.angle_rad)
+       sin    = np.sin(self.angle_rad)
+       alpha  = ( g*g + b*b + bshunt * (b + (bshunt/4)) ) / (ratio**4)
+       beta   = ( g*g + b*b ) / (ratio**2)
+       gamma  = ( cos * ( - 2 * (g*g + b*b) - b * bshunt ) + sin * ( - g * bshunt) ) / (ratio**3)
+       zeta   = ( sin * ( - 2 * (g*g + b*b) - b * bshunt ) - cos * ( - g* bshunt) ) / (ratio**3)
+       return alpha, beta, gamma, zeta
+
+    def addbuses(self, log, buses):
+       self.numbuses = len(buses)
+       self.Vmin     = np.array([bus.Vmin for bus in buses.values()])
+       self.Vmax     = np.array([bus.Vmax for bus in buses.values()])
+       self.Gs       = np.array([bus.Gs for bus in buses.values()])
+       self.Bs       = np.array([bus.Bs for bus in buses.values()])
+       self.Pd       = np.array([bus.Pd for bus in buses.values()])
+       self.Qd       = np.array([bus.Qd for bus in buses.values()])
+       self.nodetype = np.array([bus.nodetype for bus in buses.values()], dtype = int)
+       self.nodeID   = np.array([bus.nodeID for bus in buses.values()], dtype = int)
+
+
+# A branch is a view of row 'index' of a NetworkArrays object; its 
+# electrical parameters (see NetworkArrays.branchfields) are read from there.
+# Reading one costs a few attribute lookups, so loops over many branches
+# should index the arrays of all_data['network'] instead
+
+class branch:
+    __slots__ = ('net', 'index', 'count', 'f', 't', 'id_f', 'id_t', 'branchline0')
+
+    def __init__(self, net, index, count, f, id_f, t, id_t, branchline0):
+       self.net = net
+       self.index = index
+       self.count = count
+       self.f = f
+       self.t = t
+       self.id_f = id_f
+       self.id_t = id_t
+       self.branchline0 = branchline0
 
     def getbranchline0(self):
       return self.branchline0
@@ -146,7 +208,19 @@ class branch:
       log.joint("\n")
       log.joint(" ra " + str(self.ratio) + " ang " + str(self.angle) )
       log.joint("\n")
+
+def branchfield(name):
+    column = operator.attrgetter(name)
+    return property(lambda self: column(self.net).item(self.index))
+
+for name in NetworkArrays.branchfields:
+    setattr(branch, name, branchfield(name))
+
 class gen:
+    __slots__ = ('count', 'nodeID', 'Pg', 'Qg', 'status', 'Pmax', 'Pmin', 
+                 'Qmax', 'Qmin', 'line0', 'costlinenum', 'costvector', 
+                 'costdegree', 'index')
+
     def __init__(self, count, nodeID, Pg, Qg, status, Pmax, Pmin, Qmax, Qmin, line0):
        self.count = count
        self.nodeID = nodeID
@@ -159,6 +233,7 @@ class gen:
        self.Qmin = Qmin
        self.line0 = line0
        self.costlinenum = -1
+       self.index = -1
     def addcost(self, log, costvector, linenum):
       self.costvector = costvector
       self.costdegree = len(costvector) - 1
@@ -253,6 +328,7 @@ def readcase_thrulines(log, all_data, lines):
                   Pd, Qd, Gs, Bs, Vbase, Vmax = float(thisline[2]), float(thisline[3]), float(thisline[4]), float(thisline[5]), float(thisline[9]), float(thisline[11])
         
                   buses[numbuses] = Bus(numbuses, nodeID, nodetype, Pd/baseMVA, Qd/baseMVA, Gs/baseMVA, Bs/baseMVA, Vbase,Vmax, Vmin, linenum-1)
+                  buses[numbuses].index = len(buses) - 1
 
                   if nodetype == 1 or nodetype == 2 or nodetype == 3:
                     sumPd += Pd
@@ -321,6 +397,7 @@ def readcase_thrulines(log, all_data, lines):
                 if nodeID in IDtoCountmap.keys():
                   idgen = IDtoCountmap[nodeID]
                   gens[gencount] = gen(gencount, nodeID, Pg, Qg, status, Pmax/baseMVA, Pmin/baseMVA, Qmax/baseMVA, Qmin/baseMVA, linenum-1)
+                  gens[gencount].index = len(gens) - 1
                   buses[idgen].addgenerator(log, gencount, gens[gencount])
 
                   if buses[idgen].nodetype == 2 or buses[idgen].nodetype == 3:  #but not 4
@@ -353,8 +430,9 @@ def readcase_thrulines(log, all_data, lines):
               branchcount = 0
               activebranches = 0
               branches = {}
+              branchdata = []
+              branchinfo = []
               linenum += 1
-              zerolimit = 0
               while lookingforendofbranch and linenum <= numlines:
                 line = lines[linenum-1]
                 thisline = line.split()
@@ -389,19 +467,33 @@ def readcase_thrulines(log, all_data, lines):
                 #   log.joint(' the status is ' + str(status) + '\n')
 
                 if status:
-                  branches[branchcount] = branch(log,branchcount, f, id_f, t, id_t, r, x, 
-                                                 bc, rateA/baseMVA, rateB/baseMVA, 
-                                                 rateC/baseMVA, ratio, angle, maxangle, 
-                                                 minangle, status, 2*sumPd/baseMVA, 
-                                                 linenum-1)
-                  zerolimit += (branches[branchcount].constrainedflow == 0)
+                  branchdata.append((r, x, bc, rateA/baseMVA, rateB/baseMVA, ratio,
+                                     angle, maxangle, minangle, status))
+                  branchinfo.append((branchcount, f, id_f, t, id_t, linenum-1))
                   activebranches += 1
-        
-
-                  buses[id_f].addfrombranch(log, branchcount)
-                  buses[id_t].addtobranch(log, branchcount)
 
                 linenum += 1
+
+              # Parameters of all active branches are stored, and their 
+              # admittances computed, at once
+              network = NetworkArrays()
+              network.addbranches(log, branchdata, 
+                                  [buses[info[2]].index for info in branchinfo],
+                                  [buses[info[4]].index for info in branchinfo],
+                                  2*sumPd/baseMVA)
+              network.addbranchids(log, [info[0] for info in branchinfo],
+                                   [info[1] for info in branchinfo],
+                                   [info[3] for info in branchinfo])
+              all_data['network'] = network
+
+              for index in range(activebranches):
+                count, f, id_f, t, id_t, branchline0 = branchinfo[index]
+                branches[count] = branch(network, index, count, f, id_f, t, id_t, 
+                                         branchline0)
+                buses[id_f].addfrombranch(log, count)
+                buses[id_t].addtobranch(log, count)
+
+              zerolimit = int(np.sum(network.constrainedflow == 0))
               all_data['branches']    = branches
               all_data['numbranches'] = all_data['branchcount'] = branchcount
               log.joint(" branchcount: " + str(branchcount) + " active " + str(activebranches) + "\n")
@@ -448,8 +540,68 @@ def readcase_thrulines(log, all_data, lines):
 
         linenum += 1
 
+    buildincidence(log, all_data)
+
     return 0
 
+
+# Builds, once, the bus-branch and bus-generator incidence matrices and the 
+# per-bus aggregated generation bounds and shunts. Buses, active branches and 
+# generators are numbered 0,1,... in the order of all_data['buses'], 
+# all_data['branches'] and all_data['gens'] (attribute 'index' of each 
+# object, and row of all_data['network']). Cf[i,j] = 1 (resp., Ct[i,j] = 1) iff bus 'i'
+# is the 'from' (resp., 'to') bus of branch 'j', and Cg[i,g] = 1 iff 
+# generator 'g' sits at bus 'i'
+
+def buildincidence(log, all_data):
+    buses        = all_data['buses']
+    branches     = all_data['branches']
+    gens         = all_data['gens']
+    IDtoCountmap = all_data['IDtoCountmap']
+
+    numbuses     = len(buses)
+    numbranches  = len(branches)
+    numgens      = len(gens)
+
+    network      = all_data['network']
+    network.addbuses(log, buses)
+
+    fidx = network.fidx
+    tidx = network.tidx
+    gidx = np.array([buses[IDtoCountmap[thisgen.nodeID]].index for thisgen in gens.values()], dtype = int)
+
+    ones = np.ones(numbranches)
+    Cf   = sp.csr_matrix((ones, (fidx, np.arange(numbranches))), shape = (numbuses, numbranches))
+    Ct   = sp.csr_matrix((ones, (tidx, np.arange(numbranches))), shape = (numbuses, numbranches))
+    Cg   = sp.csr_matrix((np.ones(numgens), (gidx, np.arange(numgens))), shape = (numbuses, numgens))
+
+    # Bounds are aggregated over generators with positive status only
+    status = np.array([thisgen.status for thisgen in gens.values()], dtype = float)
+    Pmax   = np.array([thisgen.Pmax for thisgen in gens.values()]) * status
+    Pmin   = np.array([thisgen.Pmin for thisgen in gens.values()]) * status
+    Qmax   = np.array([thisgen.Qmax for thisgen in gens.values()]) * status
+    Qmin   = np.array([thisgen.Qmin for thisgen in gens.values()]) * status
+
+    all_data['Cf']             = Cf
+    all_data['Ct']             = Ct
+    all_data['Cg']             = Cg
+    all_data['branch_fidx']    = fidx
+    all_data['branch_tidx']    = tidx
+    all_data['gen_busidx']     = gidx
+    all_data['busPmax']        = Cg @ Pmax
+    all_data['busPmin']        = Cg @ Pmin
+    all_data['busQmax']        = Cg @ Qmax
+    all_data['busQmin']        = Cg @ Qmin
+    all_data['busactivegens']  = Cg @ status
+    all_data['busGs']          = network.Gs
+    all_data['busBs']          = network.Bs
+    all_data['busQd']          = network.Qd
+    all_data['busnodetype']    = network.nodetype
+    all_data['busdegree']      = np.asarray((Cf + Ct).sum(axis = 1)).ravel()
+
+    log.joint(" incidence matrices built: " + str(Cf.nnz + Ct.nnz) + " branch and " 
+              + str(Cg.nnz) + " generator entries\n")
+
 def readvoltsfile(log, all_data):
     voltsfilename = all_data['voltsfilename']
     IDtoCountmap = all_data['IDtoCountmap']
@@ -0,0 +1,170 @@
+###############################################################################
+##                                                                           ##
+## This code was written and is being maintained by Matias Villagra,         ##
+## PhD Student in Operations Research @ Columbia, supervised by              ##
+## Daniel Bienstock.                                                         ##
+##                                                                           ##
+## For code readability, we make references to equations in:                 ##
+## [1] D. Bienstock, and M. Villagra, Accurate Linear Cutting-Plane          ##
+## Relaxations for ACOPF, arXiv:2312.04251v2, 2024                           ##
+##                                                                           ##
+## Please report any bugs or issues to: mjv2153@columbia.edu                 ##
+##                                                                           ##
+## Jul 2024                                                                  ##
+###############################################################################
+
+# Runs the violation kernels of the cut families over the current solution.
+# Kernels work row-wise, one row per time-period, so the work is split into
+# (family, chunk of time-periods) tasks which are run by a pool of threads
+# or processes. Processes read the solution arrays from shared memory. The
+# results are kept in all_data['kernels'], indexed by family, and read by
+# the separators in cuts_mtp_paper
+
+import atexit
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from cutpool import JABR, I2, LIMIT
+from cuts_mtp_paper import jabr_kernel, i2_kernel, limit_kernel
+
+KERNELS = {JABR: jabr_kernel, I2: i2_kernel, LIMIT: limit_kernel}
+
+
+# For every enabled family, the blocks of all_data['solarrays'] and the
+# static arrays passed to its kernel, in order
+
+def kernelargs(all_data):
+
+    args = {}
+
+    if all_data['jabrcuts']:
+        args[JABR]  = (('cbus', 'cbr', 'sbr'),
+                       (all_data['branch_fidx'], all_data['branch_tidx']))
+    if all_data['i2cuts']:
+        args[I2]    = (('Pf', 'Qf', 'cbus', 'i2'),
+                       (all_data['branch_fidx'], all_data['i2idx']))
+    if all_data['limitcuts']:
+        network     = all_data['network']
+        args[LIMIT] = (('Pf', 'Qf', 'Pt', 'Qt'),
+                       (network.limit, np.flatnonzero(network.constrainedflow)))
+
+    return args
+
+
+# Runs the kernel of a family on time-periods k0, ..., k1 - 1. A block is
+# either an array or, in a worker process, the (name, shape) of the shared
+# memory holding it
+
+def runtask(family,blocks,statics,k0,k1):
+
+    shms   = []
+    arrays = []
+
+    for block in blocks:
+        if isinstance(block, np.ndarray):
+            arrays.append(block[k0:k1])
+        else:
+            name, shape = block
+            shm = shared_memory.SharedMemory(name = name)
+            shms.append(shm)
+            arrays.append(np.ndarray(shape, dtype = float, buffer = shm.buf)[k0:k1])
+
+    try:
+        # Kernels return new arrays, so the shared memory can be closed
+        return KERNELS[family](*arrays, *statics)
+    finally:
+        del arrays
+        for shm in shms:
+            shm.close()
+
+
+# Creates the executor and, for a process pool, the shared memory of every
+# block; both are kept until the end of the run, see 'sepshutdown'
+
+def sepexecutor(log,all_data):
+
+    if 'sepexecutor' in all_data:
+        return all_data['sepexecutor']
+
+    workers = all_data['separation_workers']
+
+    if all_data['separation_pool'] == 'process':
+        executor  = ProcessPoolExecutor(max_workers = workers)
+        sharedmem = {}
+        for block, values in all_data['solarrays'].items():
+            shm = shared_memory.SharedMemory(create = True,
+                                             size = max(values.nbytes, 1))
+            sharedmem[block] = (shm, values.shape)
+    else:
+        executor  = ThreadPoolExecutor(max_workers = workers)
+        sharedmem = None
+
+    atexit.register(sepshutdown, all_data)
+
+    log.joint(' separation: ' + str(workers) + ' ' + all_data['separation_pool']
+              + ' workers\n')
+
+    all_data['sepexecutor'] = (executor, sharedmem)
+
+    return all_data['sepexecutor']
+
+
+# Shuts the executor down and releases the shared memory. Runs at exit, 
+# but processes started by multiprocessing, which skip atexit, must call it
+# themselves
+
+def sepshutdown(all_data):
+
+    if 'sepexecutor' not in all_data:
+        return None
+
+    executor, sharedmem = all_data.pop('sepexecutor')
+    executor.shutdown()
+
+    if sharedmem is not None:
+        for shm, shape in sharedmem.values():
+            shm.close()
+            shm.unlink()
+
+
+# Computes the kernels of every enabled family for the current solution,
+# see 'storesolution'
+
+def run_kernels(log,all_data):
+
+    T         = all_data['T']
+    solarrays = all_data['solarrays']
+    args      = kernelargs(all_data)
+    workers   = all_data['separation_workers']
+
+    if workers <= 1 or len(args) * T == 1:
+        all_data['kernels'] = {family: runtask(family,
+                                               [solarrays[b] for b in blocks],
+                                               statics, 0, T)
+                               for family, (blocks, statics) in args.items()}
+        return None
+
+    executor, sharedmem = sepexecutor(log,all_data)
+
+    if sharedmem is not None:
+        for block, (shm, shape) in sharedmem.items():
+            np.ndarray(shape, dtype = float, buffer = shm.buf)[:] = solarrays[block]
+
+    chunks  = np.array_split(np.arange(T), min(workers, T))
+    futures = {}
+
+    for family, (blocks, statics) in args.items():
+        if sharedmem is None:
+            blockargs = [solarrays[b] for b in blocks]
+        else:
+            blockargs = [(sharedmem[b][0].name, sharedmem[b][1]) for b in blocks]
+        futures[family] = [executor.submit(runtask, family, blockargs, statics,
+                                           int(chunk[0]), int(chunk[-1]) + 1)
+                           for chunk in chunks]
+
+    # Results are merged back in time-period order
+    all_data['kernels'] = {}
+    for family, tasks in futures.items():
+        results = [task.result() for task in tasks]
+        all_data['kernels'][family] = tuple(np.concatenate(parts, axis = 0)
+                                            for parts in zip(*results))